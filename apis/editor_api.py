@@ -1,6 +1,6 @@
 import uuid
-import json
 from typing import Dict, List, Optional
+from utils import BlockRegistry, ChangeLog, EventBus
 
 
 class EditorAPI:
@@ -13,7 +13,10 @@ class EditorAPI:
         update_render_window_func,
         update_render_window_single_func,
         set_code_blocks_func,
+        block_registry=None,
+        track_change_log=None,
         p5_player_instance=None,
+        event_bus=None,
     ):
         self.code_blocks = code_blocks
         self.selected_code_id = selected_code_id
@@ -22,7 +25,40 @@ class EditorAPI:
         self.update_render_window = update_render_window_func
         self.update_render_window_single = update_render_window_single_func
         self.set_code_blocks = set_code_blocks_func
+        # id → ブロックのインデックス（P5Playerから共有される）
+        self.block_registry = (
+            block_registry if block_registry is not None else BlockRegistry(code_blocks)
+        )
+        # トラックウィンドウへ送る変更の履歴（TrackAPIと共有）
+        self.track_change_log = (
+            track_change_log if track_change_log is not None else ChangeLog()
+        )
         self.p5_player_instance = p5_player_instance
+        # トラックウィンドウへのイベントの配信（P5Playerから共有される）
+        self.event_bus = event_bus if event_bus is not None else EventBus()
+
+    def _push_track_patch(self, patch):
+        """変更されたブロックのIDとフィールドだけをトラックウィンドウに通知"""
+        entry = self.track_change_log.record(patch)
+        self.event_bus.publish("track_patch", entry)
+
+    def _get_code(self, block):
+        """ブロックのコードを取得（保存先によっては必要な時に読み込む）"""
+        if self.p5_player_instance:
+            return self.p5_player_instance.get_block_code(block)
+        return block.get("code", "")
+
+    def _blocks_response(self):
+        """ブロック一覧と選択中のID（選択中のブロックにはコードを含める）"""
+        blocks = [
+            (
+                dict(block, code=self._get_code(block))
+                if block.get("id") == self.selected_code_id and "code" not in block
+                else block
+            )
+            for block in self.code_blocks
+        ]
+        return {"blocks": blocks, "selected_code_id": self.selected_code_id}
 
     def add_block(self):
         new_block = {
@@ -36,21 +72,22 @@ class EditorAPI:
             "  background(220);\n"
             "}",
         }
-        self.code_blocks.append(new_block)
+        self.block_registry.append(new_block)
         self.selected_code_id = new_block["id"]
         # 同期して保存
         self.set_code_blocks(self.code_blocks)
         self.save_blocks()
-        return {"blocks": self.code_blocks, "selected_code_id": self.selected_code_id}
+        return self._blocks_response()
 
     def add_block_to_track(self, index, lane_index=0):
         """ブロックをトラックに追加"""
         if 0 <= index < len(self.code_blocks):
             block = self.code_blocks[index]
-            if self.track_window:
-                self.track_window.evaluate_js(
-                    f"addTrackBlock({json.dumps(block)}, {lane_index})"
-                )
+            # トラック側の表示に必要なIDと名前のみを渡す
+            block_data = {"id": block["id"], "name": block.get("name", "")}
+            self.event_bus.publish(
+                "track_block_added", {"block": block_data, "lane_index": lane_index}
+            )
             return {"status": "success"}
         return {"status": "error", "message": "Invalid block index"}
 
@@ -117,46 +154,59 @@ class EditorAPI:
             # 選択のみでも同期しておく
             self.set_code_blocks(self.code_blocks)
             self.save_blocks()
-            return self.code_blocks[index]["code"]
+            return self._get_code(self.code_blocks[index])
         return ""
 
     def update_block(self, code):
         if self.selected_code_id is not None:
-            for block in self.code_blocks:
-                if block["id"] == self.selected_code_id:
-                    block["code"] = code
-                    # 同期して保存
-                    self.set_code_blocks(self.code_blocks)
-                    self.save_blocks()
-                    # エディタ用の単一iframeでコードを表示
-                    self.update_render_window_single(code)
-                    # トラックウィンドウに更新を通知
-                    if self.track_window:
-                        self.track_window.evaluate_js("loadTrackBlocks()")
-                    break
-        return {"blocks": self.code_blocks, "selected_code_id": self.selected_code_id}
+            block = self.block_registry.update_fields(self.selected_code_id, code=code)
+            if block is not None:
+                # 同期して保存
+                self.set_code_blocks(self.code_blocks)
+                self.save_blocks()
+                if self.p5_player_instance is not None:
+                    self.p5_player_instance.record_sketch_block(code, block["id"])
+                # エディタ用の単一iframeでコードを表示
+                self.update_render_window_single(code)
+                # トラックウィンドウに更新を通知
+                # コード本体は送らず、バージョンだけを通知
+                code_version = self.block_registry.bump_code_version(block["id"])
+                self._push_track_patch(
+                    {
+                        "op": "update_block",
+                        "block_id": block["id"],
+                        "fields": {"code_version": code_version},
+                    }
+                )
+        return self._blocks_response()
 
     def update_block_name(self, index, name):
         if 0 <= index < len(self.code_blocks):
-            self.code_blocks[index]["name"] = name
+            self.block_registry.update_fields(self.code_blocks[index]["id"], name=name)
             # 同期して保存
             self.set_code_blocks(self.code_blocks)
             self.save_blocks()
             # トラックウィンドウに更新を通知
-            if self.track_window:
-                self.track_window.evaluate_js("loadTrackBlocks()")
-        return {"blocks": self.code_blocks, "selected_code_id": self.selected_code_id}
+            self._push_track_patch(
+                {
+                    "op": "update_block",
+                    "block_id": self.code_blocks[index]["id"],
+                    "fields": {"name": name},
+                }
+            )
+        return self._blocks_response()
 
     def get_block_by_id(self, block_id):
         """IDでブロックを取得"""
-        for i, block in enumerate(self.code_blocks):
-            if block.get("id") == block_id:
-                return {"block": block, "index": i}
+        block = self.block_registry.get(block_id)
+        if block is not None:
+            return {"block": block, "index": self.block_registry.index_of(block_id)}
         return None
 
     def reorder_blocks(self, new_blocks, moved_block_id=None):
         # 新しいリストに差し替え
         self.code_blocks = new_blocks
+        self.block_registry.reorder(new_blocks)
 
         # 移動したブロックのIDが指定されている場合は、それを選択状態にする
         if moved_block_id is not None:
@@ -165,14 +215,12 @@ class EditorAPI:
         # 同期して保存
         self.set_code_blocks(self.code_blocks)
         self.save_blocks()
-        # トラックウィンドウに更新を通知
-        if self.track_window:
-            self.track_window.evaluate_js("loadTrackBlocks()")
-        return {"blocks": self.code_blocks, "selected_code_id": self.selected_code_id}
+        # トラックはIDで参照しているので並べ替えの通知は不要
+        return self._blocks_response()
 
     def get_all_blocks(self):
         """すべてのブロックと選択されたブロックIDを取得"""
-        return {"blocks": self.code_blocks, "selected_code_id": self.selected_code_id}
+        return self._blocks_response()
 
     def load_first_block(self):
         """最初のブロックを読み込む"""
@@ -182,11 +230,19 @@ class EditorAPI:
             self.set_code_blocks(self.code_blocks)
             self.save_blocks()
             return {
-                "code": self.code_blocks[0]["code"],
+                "code": self._get_code(self.code_blocks[0]),
                 "selected_code_id": self.selected_code_id,
             }
         return {"code": "// No blocks available", "selected_code_id": None}
 
+    def report_ui_ready(self, interactive_ms, asset_source):
+        """エディタウィンドウが操作できるようになるまでの時間を記録"""
+        if self.p5_player_instance is not None:
+            self.p5_player_instance.on_window_ready(
+                "editor", interactive_ms, asset_source
+            )
+        return {"status": "success"}
+
     def delete_block(self, index):
         if 0 <= index < len(self.code_blocks):
             # 削除するブロックのID
@@ -203,17 +259,16 @@ class EditorAPI:
                     self.selected_code_id = None
 
             # ブロックを削除
-            del self.code_blocks[index]
+            self.block_registry.delete(index)
+            # 削除したブロックを参照しているトラックブロックも削除
+            if self.p5_player_instance:
+                self.p5_player_instance.prune_track_references()
             # 同期して保存
             self.set_code_blocks(self.code_blocks)
             self.save_blocks()
 
             # トラックウィンドウに更新を通知
-            if self.track_window:
-                self.track_window.evaluate_js("loadTrackBlocks()")
+            self._push_track_patch({"op": "remove_block", "block_id": deleted_block_id})
 
-            return {
-                "blocks": self.code_blocks,
-                "selected_code_id": self.selected_code_id,
-            }
+            return self._blocks_response()
         return {"status": "error", "message": "Invalid block index"}
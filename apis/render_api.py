@@ -1,36 +1,147 @@
+from collections import deque
 from typing import Dict
+from utils import EventBus, FrameTelemetry, StartupTimer, SwitchLatencyTracker
 
 
 class RenderAPI:
-    def __init__(self, render_width, render_height, track_window, save_track_data_func):
+    def __init__(
+        self,
+        render_width,
+        render_height,
+        track_window,
+        save_track_data_func,
+        p5_player_instance=None,
+        frame_telemetry=None,
+        switch_latency=None,
+        startup_timer=None,
+        event_bus=None,
+    ):
         self.render_width = render_width
         self.render_height = render_height
         self.track_window = track_window
         self.save_track_data = save_track_data_func
+        self.p5_player_instance = p5_player_instance
+        # 先読みがブロック開始の何ms前に完了していたか（マイナスは間に合わなかった分）
+        self.prewarm_leads = deque(maxlen=1000)
+        # iframeでのアセットの読み込み時間（スケッチのキーごと）
+        self.asset_timings = deque(maxlen=5000)
+        # iframeごとのフレーム時間の集計
+        self.frame_telemetry = (
+            frame_telemetry if frame_telemetry is not None else FrameTelemetry()
+        )
+        # レーン切り替えの各段階の時刻（P5Playerから共有される）
+        self.switch_latency = (
+            switch_latency if switch_latency is not None else SwitchLatencyTracker()
+        )
+        # 起動の段階ごとの所要時間（P5Playerから共有される）
+        self.startup_timer = (
+            startup_timer if startup_timer is not None else StartupTimer()
+        )
+        # トラックウィンドウへのイベントの配信（P5Playerから共有される）
+        self.event_bus = event_bus if event_bus is not None else EventBus()
 
     def notify_ready(self):
-        # 初期化完了の通知（必要に応じて追加の処理を行う）
-        pass
+        # 初期化完了の通知（レンダーウィンドウの最初の描画の後に届く）
+        self.startup_timer.mark("first_render")
+        if self.p5_player_instance is not None:
+            self.p5_player_instance.on_render_ready()
+        return {"status": "success"}
+
+    def get_startup_report(self):
+        """起動の段階ごとの所要時間と、最初の描画までの時間を取得"""
+        return self.startup_timer.get_report()
 
     def on_render_window_resize(self, width, height):
         """レンダーウィンドウが手動でリサイズされた時の処理"""
         print(f"on_render_window_resize called: {width}x{height}")
         self.render_width = width
         self.render_height = height
+        if self.p5_player_instance is not None:
+            self.p5_player_instance.set_render_size(width, height)
         self.save_track_data()
 
-        if self.track_window:
-            print("Updating track window...")
-            self.track_window.evaluate_js(
-                f"""
-                document.getElementById('render-width').value = {width};
-                document.getElementById('render-height').value = {height};
-                currentRenderWidth = {width};
-                currentRenderHeight = {height};
-                console.log('Track window updated with size:', {width}, 'x', {height});
-            """
+        # リサイズ中に続くサイズは最新のものだけがトラックウィンドウに届く
+        self.event_bus.publish("render_size", {"width": width, "height": height})
+        return {"status": "success"}
+
+    def report_prewarm(self, lane_index, lead_ms):
+        """先読みしたiframeに切り替えた時の余裕時間を記録"""
+        self.prewarm_leads.append({"lane_index": lane_index, "lead_ms": lead_ms})
+        if lead_ms < 0:
+            print(f"Lane {lane_index + 1}: prewarm finished {-lead_ms:.1f}ms late")
+        return {"status": "success"}
+
+    def get_prewarm_report(self):
+        """先読みの余裕時間の集計を取得"""
+        leads = [entry["lead_ms"] for entry in self.prewarm_leads]
+        if not leads:
+            return {"count": 0, "late_count": 0, "entries": []}
+        return {
+            "count": len(leads),
+            "late_count": sum(1 for lead in leads if lead < 0),
+            "min_lead_ms": min(leads),
+            "avg_lead_ms": sum(leads) / len(leads),
+            "entries": list(self.prewarm_leads),
+        }
+
+    def report_asset_timings(self, sketch_key, entries):
+        """iframeがp5.jsのローダーで読み込んだアセットとその所要時間を記録"""
+        for entry in entries or []:
+            self.asset_timings.append(
+                {
+                    "sketch_key": sketch_key,
+                    "loader": entry.get("loader"),
+                    "url": entry.get("url"),
+                    "ms": entry.get("ms", 0),
+                    "ok": entry.get("ok", True),
+                }
             )
-        else:
-            print("Track window not available")
+        return {"status": "success"}
+
+    def get_asset_report(self):
+        """アセットごとの読み込み時間の集計を取得（遅い順）"""
+        by_url = {}
+        for entry in self.asset_timings:
+            stats = by_url.setdefault(
+                entry["url"],
+                {
+                    "url": entry["url"],
+                    "loader": entry["loader"],
+                    "count": 0,
+                    "failures": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "sketch_keys": [],
+                },
+            )
+            stats["count"] += 1
+            stats["total_ms"] += entry["ms"]
+            stats["max_ms"] = max(stats["max_ms"], entry["ms"])
+            if not entry["ok"]:
+                stats["failures"] += 1
+            if entry["sketch_key"] not in stats["sketch_keys"]:
+                stats["sketch_keys"].append(entry["sketch_key"])
+        assets = list(by_url.values())
+        for stats in assets:
+            stats["avg_ms"] = stats["total_ms"] / stats["count"]
+        assets.sort(key=lambda stats: stats["max_ms"], reverse=True)
+        return {"count": len(self.asset_timings), "assets": assets}
+
+    def report_frame_stats(self, batches):
+        """レーンのiframeで計測したフレーム時間をまとめて記録（1秒ごとに届く）"""
+        self.frame_telemetry.record(batches)
+        return {"status": "success"}
+
+    def get_frame_report(self):
+        """レーンごと・スケッチごとのFPSとフレーム時間の集計を取得"""
+        return self.frame_telemetry.get_report()
+
+    def report_switch_timings(self, timings):
+        """レンダーウィンドウで記録したレーン切り替えの各段階の時刻を記録"""
+        self.switch_latency.record(timings)
+        return {"status": "success"}
 
+    def report_render_health(self, sample):
+        """レンダーウィンドウの生きているスケッチの数とJSヒープの使用量を記録（5秒ごとに届く）"""
+        self.frame_telemetry.record_health(sample)
         return {"status": "success"}
@@ -1,8 +1,21 @@
+import os
+import time
 from typing import Dict, List
 from utils import (
-    create_clear_all_lanes_js,
-    create_clear_specific_lane_js,
-    create_clear_single_iframe_js,
+    BlockRegistry,
+    ChangeLog,
+    PlaybackEngine,
+    build_timeline,
+    export_show,
+    extract_asset_refs,
+    monotonic_to_shared_ms,
+    is_valid_p5_version,
+    is_image_variant_supported,
+    VARIANT_FORMATS,
+    RENDER_MODES,
+    EventBus,
+    TriggerHub,
+    TempoFollower,
 )
 
 
@@ -19,9 +32,14 @@ class TrackAPI:
         editor_window,
         track_window,
         save_track_data_func,
-        update_render_window_func,
+        begin_render_transaction_func,
         update_click_to_play_func=None,
+        block_registry=None,
+        track_change_log=None,
         p5_player_instance=None,
+        event_bus=None,
+        trigger_hub=None,
+        tempo_follower=None,
     ):
         self.track_blocks = track_blocks
         self.track_bpm = track_bpm
@@ -33,59 +51,145 @@ class TrackAPI:
         self.editor_window = editor_window
         self.track_window = track_window
         self.save_track_data = save_track_data_func
-        self.update_render_window = update_render_window_func
+        self.begin_render_transaction = begin_render_transaction_func
         self.update_click_to_play = update_click_to_play_func
+        # id → ブロックのインデックス（P5Playerから共有される）
+        self.block_registry = (
+            block_registry if block_registry is not None else BlockRegistry(code_blocks)
+        )
+        # トラックウィンドウへ送る変更の履歴（EditorAPIと共有）
+        self.track_change_log = (
+            track_change_log if track_change_log is not None else ChangeLog()
+        )
         self.p5_player_instance = p5_player_instance
+        # トラックウィンドウへのイベントの配信（P5Playerから共有される）
+        self.event_bus = event_bus if event_bus is not None else EventBus()
+        # クリック・ホットキー・OSCのトリガー（P5Playerから共有される）
+        self.trigger_hub = trigger_hub if trigger_hub is not None else TriggerHub()
+        # トラックウィンドウで選択中のブロック（トリガーで再生を開始する位置）
+        self.selected_track_indexes = []
+        # トリガーで開始した再生の最初の切り替えを待っている (トリガーID, ディレイ)
+        self._pending_trigger = None
+        # 再生時に使うコード（block_id → (コードのバージョン, コード)）
+        self.playback_code_cache = {}
+        # 先読みするアセット（block_id → (コードのバージョン, パスのリスト, loadImageを使うか)）
+        self.asset_refs_cache = {}
+        # 再生タイミングはPython側のエンジンが絶対時刻で管理する
+        self.playback_engine = PlaybackEngine(self._dispatch_playback_events)
+        # 外部のテンポに合わせる拍の時計（P5Playerから共有される）
+        self.tempo_follower = (
+            tempo_follower if tempo_follower is not None else TempoFollower()
+        )
+        # テンポや位相が補正されたら再生中のデッドラインを計算し直す
+        self.tempo_follower.add_listener(self.playback_engine.retime)
+
+    def _get_block_code(self, code_block):
+        """ブロックのコードを取得（保存先によっては必要な時に読み込む）"""
+        if self.p5_player_instance:
+            return self.p5_player_instance.get_block_code(code_block)
+        return code_block.get("code", "")
+
+    def _get_playback_code(self, block_id):
+        """
+        再生するブロックのコードを取得
+
+        コードのバージョンごとに1回だけ取得し、編集されてバージョンが
+        変わった場合のみ取得し直す
+        """
+        code_version = self.block_registry.code_version(block_id)
+        cached = self.playback_code_cache.get(block_id)
+        if cached is not None and cached[0] == code_version:
+            return cached[1]
+
+        code_block = self.block_registry.get(block_id)
+        code = self._get_block_code(code_block) if code_block is not None else ""
+        self.playback_code_cache[block_id] = (code_version, code)
+        if self.p5_player_instance is not None:
+            self.p5_player_instance.record_sketch_block(code, block_id)
+        return code
+
+    def _get_asset_refs(self, block_id):
+        """ブロックのコードから静的に読み取れるアセットのパスを取得"""
+        code_version = self.block_registry.code_version(block_id)
+        cached = self.asset_refs_cache.get(block_id)
+        if cached is not None and cached[0] == code_version:
+            return cached[1], cached[2]
+
+        code = self._get_playback_code(block_id)
+        refs = extract_asset_refs(code)
+        uses_load_image = "loadImage(" in code
+        self.asset_refs_cache[block_id] = (code_version, refs, uses_load_image)
+        return refs, uses_load_image
+
+    def _get_asset_prefetcher(self):
+        return getattr(self.p5_player_instance, "asset_prefetcher", None)
+
+    def _begin_switch(self, lane_index, block, deadline_ms=None):
+        """レーン切り替えの所要時間の計測を開始（計測しない場合はNone）"""
+        tracker = getattr(self.p5_player_instance, "switch_latency", None)
+        if tracker is None:
+            return None
+        code_block = self.block_registry.get(block.get("block_id"))
+        name = code_block.get("name", "") if code_block else ""
+        return tracker.begin(lane_index, block.get("block_id"), name, deadline_ms)
+
+    def _resolve_track_lanes(self):
+        """
+        トラックブロック（参照データ）を現在のコードブロックデータで解決
+
+        コードは含めず、名前・長さ・コードのバージョンのみを返す
+        """
+        resolved_lanes = []
+        for lane_index, lane_blocks in enumerate(self.track_blocks):
+            resolved_blocks = []
+            for block_index, track_block in enumerate(lane_blocks):
+                try:
+                    # 対応するコードブロックを検索
+                    code_block = self.block_registry.get(track_block.get("block_id"))
+
+                    if code_block:
+                        # 現在のコードブロックデータで解決
+                        resolved_block = {
+                            "block_id": track_block.get("block_id"),
+                            "name": code_block.get("name", "Unknown Block"),
+                            "code_version": self.block_registry.code_version(
+                                track_block.get("block_id")
+                            ),
+                            "duration": track_block.get("duration", 1000),
+                            "bars": track_block.get("bars", 8),
+                        }
+                        resolved_blocks.append(resolved_block)
+                    else:
+                        # 対応するコードブロックが見つからない場合は削除対象
+                        print(
+                            f"Warning: Code block with id {track_block.get('block_id')} not found, skipping"
+                        )
+                except Exception as e:
+                    print(
+                        f"Error processing block {block_index} in lane {lane_index}: {e}"
+                    )
+                    continue
+
+            resolved_lanes.append(resolved_blocks)
+        return resolved_lanes
 
     def get_track_blocks(self):
         """トラックブロックの一覧を取得（現在のコードブロックデータで解決）"""
         try:
-            # 最新のコードブロックデータを取得
-            if self.p5_player_instance:
-                self.code_blocks = self.p5_player_instance.code_blocks
-
-            # トラックブロックを現在のコードブロックデータで解決
-            resolved_lanes = []
-            for lane_index, lane_blocks in enumerate(self.track_blocks):
-                resolved_blocks = []
-                for block_index, track_block in enumerate(lane_blocks):
-                    try:
-                        # 対応するコードブロックを検索
-                        code_block = None
-                        for cb in self.code_blocks:
-                            if cb.get("id") == track_block.get("block_id"):
-                                code_block = cb
-                                break
-
-                        if code_block:
-                            # 現在のコードブロックデータで解決
-                            resolved_block = {
-                                "block_id": track_block.get("block_id"),
-                                "name": code_block.get("name", "Unknown Block"),
-                                "code": code_block.get("code", ""),
-                                "duration": track_block.get("duration", 1000),
-                                "bars": track_block.get("bars", 8),
-                            }
-                            resolved_blocks.append(resolved_block)
-                        else:
-                            # 対応するコードブロックが見つからない場合は削除対象
-                            print(
-                                f"Warning: Code block with id {track_block.get('block_id')} not found, skipping"
-                            )
-                    except Exception as e:
-                        print(
-                            f"Error processing block {block_index} in lane {lane_index}: {e}"
-                        )
-                        continue
-
-                resolved_lanes.append(resolved_blocks)
+            # 解決中に届いたパッチも適用されるよう、先にバージョンを取得
+            version = self.track_change_log.version
+            resolved_lanes = self._resolve_track_lanes()
 
             result = {
+                "version": version,
                 "track_blocks": resolved_lanes,
                 "bpm": self.track_bpm,
                 "delay": self.track_delay,
+                "prewarm_lead_ms": self._get_prewarm_lead_ms(),
                 "render_width": self.render_width,
                 "render_height": self.render_height,
+                "p5_version": self._get_p5_version(),
+                "render_mode": self._get_render_mode(),
             }
 
             return result
@@ -101,6 +205,17 @@ class TrackAPI:
                 "render_height": 1000,
             }
 
+    def get_track_changes(self, since_version):
+        """指定バージョン以降の変更を取得（履歴にない場合は全体の再同期を指示）"""
+        patches = self.track_change_log.since(since_version)
+        if patches is None:
+            return {"resync": True, "version": self.track_change_log.version}
+        return {
+            "resync": False,
+            "version": self.track_change_log.version,
+            "patches": patches,
+        }
+
     def save_track_blocks(self, blocks):
         """トラックブロックを保存（参照データのみ）"""
         # 最新のコードブロックデータを取得
@@ -153,6 +268,91 @@ class TrackAPI:
             print(f"Error saving delay: {e}")
             return {"status": "error", "message": str(e)}
 
+    def _get_prewarm_lead_ms(self):
+        if self.p5_player_instance is not None:
+            return self.p5_player_instance.prewarm_lead_ms
+        return 1000
+
+    def update_prewarm_lead(self, lead_ms):
+        """ブロック開始の何ms前に先読みを始めるかを更新"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            self.p5_player_instance.prewarm_lead_ms = max(0, int(lead_ms))
+            self.save_track_data()
+            return {"status": "success"}
+        except Exception as e:
+            print(f"Error saving prewarm lead time: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def _get_p5_version(self):
+        if self.p5_player_instance is not None:
+            return self.p5_player_instance.p5_version
+        return None
+
+    def update_p5_version(self, version):
+        """このプロジェクトで使用するp5.jsのバージョンを更新"""
+        if not is_valid_p5_version(version):
+            return {"status": "error", "message": f"Invalid p5.js version: {version}"}
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            self.p5_player_instance.update_p5_version(version)
+            return {"status": "success", "p5_version": version}
+        except Exception as e:
+            print(f"Error updating p5.js version: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def _get_render_mode(self):
+        if self.p5_player_instance is not None:
+            return self.p5_player_instance.render_mode
+        return "iframe"
+
+    def update_render_mode(self, mode):
+        """レーンをiframeで描画するか、1つのドキュメントで共有するp5.jsのインスタンスで描画するかを更新"""
+        if mode not in RENDER_MODES:
+            return {"status": "error", "message": f"Unsupported render mode: {mode}"}
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            self.p5_player_instance.update_render_mode(mode)
+            return {"status": "success", "render_mode": mode}
+        except Exception as e:
+            print(f"Error updating render mode: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def update_live_frame_budget(self, budget):
+        """レンダーウィンドウに同時に存在できるスケッチの上限を更新（すぐに反映）"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            budget = max(2, int(budget))
+            self.p5_player_instance.update_live_frame_budget(budget)
+            if self.render_window:
+                self.begin_render_transaction().set_frame_budget(budget).commit()
+            return {"status": "success", "live_frame_budget": budget}
+        except Exception as e:
+            print(f"Error updating live frame budget: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def update_image_variants(self, enabled, fmt=None):
+        """loadImageの画像をレンダーサイズに縮小して読み込むかどうかを更新"""
+        if fmt is not None and fmt not in VARIANT_FORMATS:
+            return {"status": "error", "message": f"Unsupported image format: {fmt}"}
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            self.p5_player_instance.update_image_variants(enabled, fmt)
+            return {
+                "status": "success",
+                "image_variants": self.p5_player_instance.image_variants,
+                "image_variant_format": self.p5_player_instance.image_variant_format,
+                "supported": is_image_variant_supported(),
+            }
+        except Exception as e:
+            print(f"Error updating image variants: {e}")
+            return {"status": "error", "message": str(e)}
+
     def hide_all_windows(self):
         """全てのウィンドウを隠す"""
         if self.render_window:
@@ -200,10 +400,213 @@ class TrackAPI:
         self.save_track_data()
         return {"status": "success", "track_blocks": self.track_blocks}
 
+    def start_track_playback(self, start_indexes=None, requested_ns=None):
+        """
+        Python側の再生エンジンでトラックの再生を開始
+
+        Args:
+            start_indexes: レーンごとの再生開始ブロックのインデックス
+            requested_ns: 再生開始の基準にするtime.monotonic_nsの時刻（トリガーの時刻など）
+        """
+        if not self.render_window:
+            return {"status": "error", "message": "Render window not available"}
+        try:
+            prewarm_lead_ms = 0
+            prefetch_horizon_ms = 0
+            if self.p5_player_instance:
+                prewarm_lead_ms = self.p5_player_instance.prewarm_lead_ms
+            prefetcher = self._get_asset_prefetcher()
+            if prefetcher is not None:
+                prefetch_horizon_ms = self.p5_player_instance.prefetch_horizon_ms
+                prefetcher.start_run(prefetch_horizon_ms)
+            timeline = build_timeline(
+                self._resolve_track_lanes(),
+                start_indexes,
+                prewarm_lead_ms,
+                prefetch_horizon_ms,
+            )
+            self.playback_engine.start(
+                timeline, self.track_delay, requested_ns, self._get_tempo_sync()
+            )
+            return {"status": "success"}
+        except Exception as e:
+            print(f"Error starting playback: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def _get_tempo_sync(self):
+        """外部のテンポに合わせて再生する場合の拍の時計とタイムラインの1拍の長さ"""
+        config = self.tempo_follower.config
+        if not config["enabled"] or not self.tempo_follower.has_phase:
+            return None
+        # ブロックの長さ（ms）は track_bpm で計算されているので、その1拍を単位にする
+        beat_ms = 60000 / self.track_bpm
+        return (self.tempo_follower, beat_ms, config["quantize_beats"])
+
+    def stop_track_playback(self):
+        """再生エンジンを停止（未発火の切り替えを破棄）"""
+        self._pending_trigger = None
+        self.playback_engine.stop()
+        prefetcher = self._get_asset_prefetcher()
+        if prefetcher is not None:
+            prefetcher.release_all()
+        return {"status": "success"}
+
+    def get_playback_report(self):
+        """各切り替えがデッドラインから何ms遅れたかのレポートを取得"""
+        return {"status": "success", "report": self.playback_engine.get_report()}
+
+    def _dispatch_playback_events(self, events):
+        """再生エンジンから呼ばれ、同時刻のイベントを1つのトランザクションで反映"""
+        transaction = self.begin_render_transaction()
+        notifications = []
+        for event in events:
+            kind = event["kind"]
+            lane_index = event["lane_index"]
+            if kind == "prefetch":
+                # アセットの読み込みは別スレッドで行うので予約だけする
+                refs, uses_load_image = self._get_asset_refs(event["block"]["block_id"])
+                image_query = ""
+                if uses_load_image:
+                    image_query = self.p5_player_instance.get_image_query()
+                self._get_asset_prefetcher().prefetch(
+                    (lane_index, event["block_index"]), refs, image_query
+                )
+            elif kind == "release":
+                self._get_asset_prefetcher().release((lane_index, event["block_index"]))
+            elif kind == "prewarm":
+                transaction.prewarm_lane(
+                    lane_index, self._get_playback_code(event["block"]["block_id"])
+                )
+            elif kind == "start":
+                block = event["block"]
+                switch_id = self._begin_switch(
+                    lane_index, block, monotonic_to_shared_ms(event["deadline_ns"])
+                )
+                pending_trigger = self._pending_trigger
+                if pending_trigger is not None and switch_id is not None:
+                    # トリガーから最初の切り替えまでの時間を集計する
+                    self._pending_trigger = None
+                    self.trigger_hub.record_switch(
+                        pending_trigger[0], switch_id, pending_trigger[1]
+                    )
+                transaction.switch_lane(
+                    lane_index, self._get_playback_code(block["block_id"]), switch_id
+                )
+                notifications.append(
+                    (
+                        "engine_block_started",
+                        {"lane_index": lane_index, "block_index": event["block_index"]},
+                    )
+                )
+            elif kind == "end":
+                transaction.clear_lane(lane_index)
+                notifications.append(
+                    ("engine_lane_finished", {"lane_index": lane_index})
+                )
+            elif kind == "finished":
+                notifications.append(("engine_finished", {}))
+
+        if self.render_window:
+            transaction.commit()
+        # トラックウィンドウは表示のみなのでレンダーウィンドウの後に通知
+        for topic, payload in notifications:
+            self.event_bus.publish(topic, payload)
+
+    def handle_trigger(self, trigger):
+        """
+        トリガー（クリック・ホットキー・OSC）で再生を開始・停止（TriggerHubのスレッドから呼ばれる）
+
+        トラックウィンドウを経由せずに再生エンジンを直接操作し、ウィンドウには表示の
+        更新だけを通知する。再生はトリガーを受けた時刻からディレイの後に始まる。
+
+        Returns:
+            実際に行った操作（"start" / "stop"、何もしなかった場合は None）
+        """
+        action = trigger["action"]
+        if action == "toggle":
+            action = "stop" if self.playback_engine.is_playing else "start"
+
+        if action == "stop":
+            if not self.playback_engine.is_playing:
+                return None
+            self.stop_track_playback()
+            self.clear_all_lanes()
+            self.event_bus.publish("playback_stopped")
+            return "stop"
+
+        if self.playback_engine.is_playing:
+            return None
+        if not any(self.track_blocks):
+            print("Trigger ignored: no blocks in any lane")
+            return None
+        start_indexes = list(self.selected_track_indexes)
+        # 最初の切り替えの通知より先にウィンドウを再生中の表示にする
+        self.event_bus.publish("playback_started", {"start_indexes": start_indexes})
+        self._pending_trigger = (trigger["trigger_id"], self.track_delay)
+        result = self.start_track_playback(start_indexes, trigger["t_ns"])
+        if result["status"] != "success":
+            self._pending_trigger = None
+            self.event_bus.publish("playback_stopped")
+            return None
+        self.clear_single_iframe()
+        return "start"
+
+    def update_selected_track_indexes(self, indexes):
+        """トラックウィンドウで選択中のブロックを更新（トリガーで再生を開始する位置）"""
+        self.selected_track_indexes = list(indexes or [])
+        return {"status": "success"}
+
+    def get_trigger_config(self):
+        """トリガーの設定を取得"""
+        return {"status": "success", "config": self.trigger_hub.config}
+
+    def update_trigger_config(self, config):
+        """
+        トリガーの設定を更新（指定したキーのみ）
+
+        Args:
+            config: debounce_ms / buttons / region / hotkey / osc_enabled / osc_port
+        """
+        try:
+            if self.p5_player_instance is not None:
+                updated = self.p5_player_instance.update_trigger_config(config)
+            else:
+                updated = self.trigger_hub.configure(config)
+            return {"status": "success", "config": updated}
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_trigger_report(self):
+        """トリガーの件数と、トリガーからレーンの切り替えまでの時間の集計を取得"""
+        return {"status": "success", "report": self.trigger_hub.get_report()}
+
+    def get_tempo_sync_config(self):
+        """テンポ同期の設定を取得"""
+        return {"status": "success", "config": self.tempo_follower.config}
+
+    def update_tempo_sync_config(self, config):
+        """
+        テンポ同期の設定を更新（指定したキーのみ、次の再生開始から反映）
+
+        Args:
+            config: enabled / quantize_beats
+        """
+        try:
+            if self.p5_player_instance is not None:
+                updated = self.p5_player_instance.update_tempo_sync_config(config)
+            else:
+                updated = self.tempo_follower.configure(config)
+            return {"status": "success", "config": updated}
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_tempo_report(self):
+        """推定したテンポと位相の誤差の推移を取得"""
+        return {"status": "success", "report": self.tempo_follower.get_report()}
+
     def stop_playback(self):
         """トラックの再生を停止"""
-        if self.track_window:
-            self.track_window.evaluate_js("stopPlayback()")
+        self.event_bus.publish("playback_stop")
         return {"status": "success"}
 
     def get_click_to_play_state(self):
@@ -227,6 +630,8 @@ class TrackAPI:
         """レンダーウィンドウのサイズを更新"""
         self.render_width = width
         self.render_height = height
+        if self.p5_player_instance is not None:
+            self.p5_player_instance.set_render_size(width, height)
 
         # レンダーウィンドウのサイズを変更
         if self.render_window:
@@ -253,21 +658,19 @@ class TrackAPI:
         """複数レーンの同時再生"""
         if self.render_window:
             try:
-                # アクティブなレーンのインデックスを取得
-                active_lane_indices = [
-                    lane_info.get("lane_index", 0) for lane_info in lane_data
-                ]
-
-                # 全レーンのiframeを一旦クリア
-                js_code = create_clear_all_lanes_js()
-                self.render_window.evaluate_js(js_code)
-
-                # アクティブなレーンのコードを個別に実行
+                # 全レーンのクリアと各レーンの切り替えを1回の呼び出しで反映
+                transaction = self.begin_render_transaction()
+                transaction.clear_all_lanes()
                 for lane_info in lane_data:
                     lane_index = lane_info.get("lane_index", 0)
                     code = lane_info.get("code", "")
+                    switch_id = None
+                    if not code and lane_info.get("block_id"):
+                        code = self._get_playback_code(lane_info["block_id"])
+                        switch_id = self._begin_switch(lane_index, lane_info)
                     if code:
-                        self.update_render_window(code, lane_index)
+                        transaction.switch_lane(lane_index, code, switch_id)
+                transaction.commit()
 
                 return {"status": "success", "lanes_played": len(lane_data)}
             except Exception as e:
@@ -279,8 +682,7 @@ class TrackAPI:
         """全レーンのiframeをクリア"""
         if self.render_window:
             try:
-                js_code = create_clear_all_lanes_js()
-                self.render_window.evaluate_js(js_code)
+                self.begin_render_transaction().clear_all_lanes().commit()
                 return {"status": "success"}
             except Exception as e:
                 print(f"Error clearing lanes: {e}")
@@ -291,8 +693,7 @@ class TrackAPI:
         """特定のレーンのiframeをクリア"""
         if self.render_window:
             try:
-                js_code = create_clear_specific_lane_js(lane_index)
-                self.render_window.evaluate_js(js_code)
+                self.begin_render_transaction().clear_lane(lane_index).commit()
                 return {"status": "success"}
             except Exception as e:
                 print(f"Error clearing lane {lane_index + 1}: {e}")
@@ -303,8 +704,7 @@ class TrackAPI:
         """エディタの単一iframeをクリア"""
         if self.render_window:
             try:
-                js_code = create_clear_single_iframe_js()
-                self.render_window.evaluate_js(js_code)
+                self.begin_render_transaction().clear_single_iframe().commit()
                 return {"status": "success"}
             except Exception as e:
                 print(f"Error clearing single iframe: {e}")
@@ -315,9 +715,189 @@ class TrackAPI:
         """特定のレーンのiframeのみを更新（他のレーンに影響しない）"""
         if self.render_window:
             try:
-                self.update_render_window(code, lane_index)
+                self.begin_render_transaction().switch_lane(lane_index, code).commit()
                 return {"status": "success"}
             except Exception as e:
                 print(f"Error updating single lane {lane_index + 1}: {e}")
                 return {"status": "error", "message": str(e)}
         return {"status": "error", "message": "Render window not available"}
+
+    def prefetch_lane_block(self, lane_index, code):
+        """レーンの次のブロックを事前に読み込み、開始時は表示の切り替えのみにする"""
+        if self.render_window:
+            try:
+                self.begin_render_transaction().prewarm_lane(lane_index, code).commit()
+                return {"status": "success"}
+            except Exception as e:
+                print(f"Error prefetching lane {lane_index + 1}: {e}")
+                return {"status": "error", "message": str(e)}
+        return {"status": "error", "message": "Render window not available"}
+
+    def get_prewarm_report(self):
+        """先読みがブロック開始の何ms前に完了していたかのレポートを取得"""
+        render_api = getattr(self.p5_player_instance, "render_api", None)
+        if render_api is None:
+            return {"status": "error", "message": "Render API not available"}
+        return {"status": "success", "report": render_api.get_prewarm_report()}
+
+    def _get_block_names_by_sketch_key(self):
+        """
+        スケッチのキーからブロック名を引く辞書を作成
+
+        再生・編集した時に記録した対応だけを使い、ライブラリのコードは読み込まない
+        """
+        block_names = {}
+        for sketch_key, block_id in list(
+            self.p5_player_instance.sketch_block_ids.items()
+        ):
+            block = self.block_registry.get(block_id)
+            if block is not None:
+                block_names[sketch_key] = block.get("name", "")
+        return block_names
+
+    def get_asset_report(self):
+        """ブロックごとに、読み込んだアセットとその所要時間のレポートを取得"""
+        render_api = getattr(self.p5_player_instance, "render_api", None)
+        if render_api is None:
+            return {"status": "error", "message": "Render API not available"}
+        report = render_api.get_asset_report()
+
+        block_names = self._get_block_names_by_sketch_key()
+        for stats in report["assets"]:
+            stats["blocks"] = [
+                block_names.get(sketch_key, sketch_key[:8])
+                for sketch_key in stats["sketch_keys"]
+            ]
+        return {"status": "success", "report": report}
+
+    def update_prefetch_horizon(self, horizon_ms):
+        """ブロック開始の何ms前にアセットを読み込むかを更新（0で無効）"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            self.p5_player_instance.prefetch_horizon_ms = max(0, int(horizon_ms))
+            self.save_track_data()
+            return {"status": "success"}
+        except Exception as e:
+            print(f"Error saving prefetch horizon: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def get_prefetch_report(self):
+        """再生ごとのアセット先読みの件数と画像サーバーのヒット率を取得"""
+        prefetcher = self._get_asset_prefetcher()
+        if prefetcher is None:
+            return {"status": "error", "message": "Asset prefetcher not available"}
+        return {"status": "success", "report": prefetcher.get_report()}
+
+    def get_frame_report(self):
+        """レーンごと・ブロックごとのFPS、フレーム時間、フレーム落ちの集計を取得"""
+        render_api = getattr(self.p5_player_instance, "render_api", None)
+        if render_api is None:
+            return {"status": "error", "message": "Render API not available"}
+        report = render_api.get_frame_report()
+
+        block_names = self._get_block_names_by_sketch_key()
+        report["blocks"] = [
+            dict(stats, sketch_key=sketch_key, name=block_names.get(sketch_key, ""))
+            for sketch_key, stats in report.pop("sketches").items()
+        ]
+        # フレーム落ちの多いブロックから表示する
+        report["blocks"].sort(key=lambda stats: stats["dropped"], reverse=True)
+        return {"status": "success", "report": report}
+
+    def get_switch_latency_report(self):
+        """ブロックごとの、切り替えのデッドラインから最初の描画までの内訳を取得"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        return {
+            "status": "success",
+            "report": self.p5_player_instance.switch_latency.get_report(),
+        }
+
+    def export_switch_latency_csv(self):
+        """切り替えごとの各段階の所要時間をCSVファイルに書き出す"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+            session_dir = self.p5_player_instance.SESSION_DIR
+            os.makedirs(session_dir, exist_ok=True)
+            path = os.path.join(
+                session_dir, time.strftime("switch-latency-%Y%m%d-%H%M%S.csv")
+            )
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(self.p5_player_instance.switch_latency.to_csv())
+            return {"status": "success", "path": path}
+        except Exception as e:
+            print(f"Error exporting switch latency: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def export_show(self, loop=False):
+        """トラックをPython側なしで再生できる1つのHTMLに書き出す"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        try:
+
+            def get_code(block_id):
+                if self.block_registry.get(block_id) is None:
+                    return None
+                return self._get_playback_code(block_id)
+
+            path = os.path.join(
+                self.p5_player_instance.SHOW_DIR,
+                time.strftime("show-%Y%m%d-%H%M%S.html"),
+            )
+            stats = export_show(
+                path,
+                self.p5_player_instance.get_track_data_snapshot(),
+                get_code,
+                loop=loop,
+            )
+            print(
+                f"Exported show to {path} "
+                f"({stats['sketches']} sketches, {stats['assets']} assets)"
+            )
+            return {"status": "success", "stats": stats}
+        except Exception as e:
+            print(f"Error exporting show: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def get_compile_cache_stats(self):
+        """コンパイルキャッシュのヒット/ミス統計を取得"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        return {
+            "status": "success",
+            "stats": self.p5_player_instance.compile_cache.stats(),
+        }
+
+    def get_image_cache_stats(self):
+        """画像サーバーのメモリキャッシュの統計を取得"""
+        image_server = getattr(self.p5_player_instance, "image_server", None)
+        if image_server is None:
+            return {"status": "error", "message": "Image server not available"}
+        return {
+            "status": "success",
+            "stats": image_server.file_cache.stats(),
+            "variant_stats": image_server.variant_cache.stats(),
+        }
+
+    def get_event_stats(self):
+        """トラックウィンドウへのイベントの配信回数と遅延の統計を取得"""
+        return {"status": "success", "stats": self.event_bus.stats()}
+
+    def get_persistence_stats(self):
+        """データ保存の回数と所要時間の統計を取得"""
+        if self.p5_player_instance is None:
+            return {"status": "error", "message": "P5Player instance not available"}
+        return {
+            "status": "success",
+            "stats": self.p5_player_instance.persistence.stats(),
+        }
+
+    def report_ui_ready(self, interactive_ms, asset_source):
+        """トラックウィンドウが操作できるようになるまでの時間を記録"""
+        if self.p5_player_instance is not None:
+            self.p5_player_instance.on_window_ready(
+                "track", interactive_ms, asset_source
+            )
+        return {"status": "success"}
@@ -0,0 +1,4 @@
+from .stub_window import RecordingWindow
+from .synthetic import make_library, make_track
+
+__all__ = ["RecordingWindow", "make_library", "make_track"]
@@ -0,0 +1,304 @@
+"""
+APIクラスのベンチマーク（GUIなしで実行できる）
+
+    python -m bench.run_bench --quick
+    python -m bench.run_bench --output bench/baseline.json
+    python -m bench.run_bench --compare bench/baseline.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from p5_player import P5Player
+from utils import SqliteBlockStore
+from utils.playback_engine import percentile
+
+from .stub_window import RecordingWindow
+from .synthetic import make_library, make_track
+
+DEFAULT_BLOCK_COUNTS = (100, 1000, 10000, 50000)
+DEFAULT_LANE_COUNTS = (1, 8, 64)
+QUICK_BLOCK_COUNTS = (100, 1000)
+QUICK_LANE_COUNTS = (1, 8)
+
+
+def measure(operation, repeat, windows, after_each=None):
+    """
+    操作を繰り返し実行して所要時間とevaluate_jsで送ったバイト数を計測
+
+    最初の1回はウォームアップとして集計に含めない
+    """
+    durations = []
+    js_stats = {}
+    for iteration in range(repeat + 1):
+        for window in windows.values():
+            window.reset()
+        started = time.perf_counter_ns()
+        operation(iteration)
+        elapsed_ms = (time.perf_counter_ns() - started) / 1_000_000
+        if after_each is not None:
+            after_each()
+        if iteration == 0:
+            continue
+        durations.append(elapsed_ms)
+        js_stats = {name: window.stats() for name, window in windows.items()}
+
+    durations.sort()
+    return {
+        "median_ms": percentile(durations, 0.50),
+        "p95_ms": percentile(durations, 0.95),
+        "min_ms": durations[0],
+        "evaluate_js_calls": sum(s["evaluate_js_calls"] for s in js_stats.values()),
+        "evaluate_js_bytes": sum(s["evaluate_js_bytes"] for s in js_stats.values()),
+        "windows": js_stats,
+    }
+
+
+def run_case(block_count, lane_count, blocks_per_lane, repeat):
+    """1つのライブラリ・トラックの組み合わせで全ての操作を計測"""
+    work_dir = tempfile.mkdtemp(prefix="p5_player_bench_")
+    original_dir = os.getcwd()
+    # P5Playerはdata/以下に保存するので、作業ディレクトリごと一時ディレクトリにする
+    os.chdir(work_dir)
+    player = None
+    results = []
+    try:
+        player = P5Player()
+        player.code_blocks = make_library(block_count)
+        player.block_registry.reset(player.code_blocks)
+        player.selected_code_id = player.code_blocks[0]["id"]
+        player.track_blocks = make_track(
+            player.code_blocks, lane_count, blocks_per_lane
+        )
+
+        windows = {
+            "render": RecordingWindow("render"),
+            "editor": RecordingWindow("editor"),
+            "track": RecordingWindow("track"),
+        }
+        player.render_window = windows["render"]
+        player.editor_window = windows["editor"]
+        player.track_window = windows["track"]
+        editor_api, render_api, track_api = player.create_apis()
+        player.attach_windows(editor_api, render_api, track_api)
+        player.persistence.start()
+
+        resolved_lanes = track_api.get_track_blocks()["track_blocks"]
+        lane_data = [
+            {"lane_index": lane_index, "block_id": lane[0]["block_id"]}
+            for lane_index, lane in enumerate(player.track_blocks)
+            if lane
+        ]
+        codes = [
+            player.code_blocks[0]["code"] + "\n// edit A\n",
+            player.code_blocks[0]["code"] + "\n// edit B\n",
+        ]
+
+        def reorder(iteration):
+            blocks = editor_api.code_blocks
+            editor_api.reorder_blocks(blocks[1:] + blocks[:1], blocks[0]["id"])
+
+        def play_instance(iteration):
+            # 1つのドキュメントで共有するp5.jsのインスタンスとして描画するモード
+            player.render_mode = "instance"
+            try:
+                track_api.play_multiple_lanes(lane_data)
+            finally:
+                player.render_mode = "iframe"
+
+        def persist_json(iteration):
+            player.persistence.mark_dirty(player.DATA_FILE)
+            player.persistence.mark_dirty(player.TRACK_FILE)
+            player.persistence.flush()
+
+        sqlite_store = SqliteBlockStore(os.path.join("data", "bench.db"))
+        started = time.perf_counter_ns()
+        sqlite_store.save_blocks(player.get_blocks_snapshot())
+        sqlite_initial_ms = (time.perf_counter_ns() - started) / 1_000_000
+
+        def persist_sqlite(iteration):
+            # 1ブロックだけ変更して保存（変わっていない行は書き込まない）
+            player.code_blocks[iteration % len(player.code_blocks)]["code"] += " "
+            sqlite_store.save_blocks(player.get_blocks_snapshot())
+
+        operations = [
+            ("get_track_blocks", lambda i: track_api.get_track_blocks()),
+            (
+                "save_track_blocks",
+                lambda i: track_api.save_track_blocks(resolved_lanes),
+            ),
+            ("play_multiple_lanes", lambda i: track_api.play_multiple_lanes(lane_data)),
+            ("play_multiple_lanes_instance", play_instance),
+            ("update_block", lambda i: editor_api.update_block(codes[i % 2])),
+            ("reorder_blocks", reorder),
+            ("persist_json", persist_json),
+            ("persist_sqlite", persist_sqlite),
+        ]
+
+        # APIのログ出力は計測の邪魔になるので捨てる
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name, operation in operations:
+                # 保存待ちのデータは計測の外で書き出しておく
+                after_each = (
+                    None if name.startswith("persist") else player.persistence.flush
+                )
+                result = measure(operation, repeat, windows, after_each)
+                results.append(
+                    dict(result, blocks=block_count, lanes=lane_count, op=name)
+                )
+
+        results.append(
+            {
+                "blocks": block_count,
+                "lanes": lane_count,
+                "op": "persist_sqlite_initial",
+                "median_ms": sqlite_initial_ms,
+                "p95_ms": sqlite_initial_ms,
+                "min_ms": sqlite_initial_ms,
+                "evaluate_js_calls": 0,
+                "evaluate_js_bytes": 0,
+                "windows": {},
+            }
+        )
+        sqlite_store.close()
+    finally:
+        if player is not None:
+            player.persistence.close()
+            player.frame_telemetry.close()
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    ベースラインと比較して遅くなった・送信量が増えた操作を取得
+
+    Returns:
+        回帰した操作の説明のリスト
+    """
+    baseline_by_key = {
+        (entry["blocks"], entry["lanes"], entry["op"]): entry
+        for entry in baseline.get("results", [])
+    }
+    regressions = []
+    for entry in results:
+        base = baseline_by_key.get((entry["blocks"], entry["lanes"], entry["op"]))
+        if base is None:
+            continue
+        label = f"{entry['op']} (blocks={entry['blocks']}, lanes={entry['lanes']})"
+        if (
+            entry["median_ms"] > base["median_ms"] * (1 + threshold)
+            and entry["median_ms"] - base["median_ms"] > min_delta_ms
+        ):
+            regressions.append(
+                f"{label}: {base['median_ms']:.2f}ms -> {entry['median_ms']:.2f}ms"
+            )
+        if entry["evaluate_js_bytes"] > base["evaluate_js_bytes"] * (1 + threshold):
+            regressions.append(
+                f"{label}: evaluate_js {base['evaluate_js_bytes']}B"
+                f" -> {entry['evaluate_js_bytes']}B"
+            )
+    return regressions
+
+
+def parse_counts(value):
+    return tuple(int(count) for count in value.split(",") if count)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="APIクラスのベンチマーク")
+    parser.add_argument(
+        "--blocks", type=parse_counts, help="ブロック数（カンマ区切り）"
+    )
+    parser.add_argument("--lanes", type=parse_counts, help="レーン数（カンマ区切り）")
+    parser.add_argument("--blocks-per-lane", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="小さいサイズのみ計測")
+    parser.add_argument(
+        "--output", help="結果のJSONの保存先（ベースラインとして使える）"
+    )
+    parser.add_argument("--compare", help="比較するベースラインのJSON")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="回帰とみなす増加の割合"
+    )
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=0.5, help="回帰とみなす最小の差（ms）"
+    )
+    args = parser.parse_args(argv)
+
+    block_counts = args.blocks or (
+        QUICK_BLOCK_COUNTS if args.quick else DEFAULT_BLOCK_COUNTS
+    )
+    lane_counts = args.lanes or (
+        QUICK_LANE_COUNTS if args.quick else DEFAULT_LANE_COUNTS
+    )
+
+    results = []
+    print(
+        f"{'blocks':>7} {'lanes':>5} {'op':<28} {'median':>10} {'p95':>10} {'js':>5} {'js bytes':>10}"
+    )
+    for block_count in block_counts:
+        for lane_count in lane_counts:
+            for entry in run_case(
+                block_count, lane_count, args.blocks_per_lane, args.repeat
+            ):
+                results.append(entry)
+                print(
+                    f"{entry['blocks']:>7} {entry['lanes']:>5} {entry['op']:<28}"
+                    f" {entry['median_ms']:>8.2f}ms {entry['p95_ms']:>8.2f}ms"
+                    f" {entry['evaluate_js_calls']:>5} {entry['evaluate_js_bytes']:>10}"
+                )
+
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "blocks_per_lane": args.blocks_per_lane,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
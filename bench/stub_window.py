@@ -0,0 +1,39 @@
+class RecordingWindow:
+    """
+    pywebviewのウィンドウの代わりに使うスタブ
+
+    APIクラスがウィンドウに対して行うのは evaluate_js / resize / show / hide だけなので、
+    これらの呼び出し回数とevaluate_jsで送ったスクリプトのバイト数を記録する。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """記録をクリア"""
+        self.evaluate_js_calls = 0
+        self.evaluate_js_bytes = 0
+        self.other_calls = 0
+
+    def evaluate_js(self, script):
+        self.evaluate_js_calls += 1
+        self.evaluate_js_bytes += len(script.encode("utf-8"))
+        return None
+
+    def resize(self, width, height):
+        self.other_calls += 1
+
+    def show(self):
+        self.other_calls += 1
+
+    def hide(self):
+        self.other_calls += 1
+
+    def stats(self):
+        """記録した呼び出しの統計を取得"""
+        return {
+            "evaluate_js_calls": self.evaluate_js_calls,
+            "evaluate_js_bytes": self.evaluate_js_bytes,
+            "other_calls": self.other_calls,
+        }
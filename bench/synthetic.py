@@ -0,0 +1,87 @@
+import random
+import uuid
+
+# 合成するスケッチの雛形（ブロックごとに値を変えて、コンパイルキャッシュが効かないようにする）
+SKETCH_TEMPLATE = """let img;
+let angle = {angle};
+
+function preload() {{
+  {preload}
+}}
+
+function setup() {{
+  createCanvas(windowWidth, windowHeight);
+  noStroke();
+}}
+
+function draw() {{
+  clear();
+  angle += {speed};
+  for (let i = 0; i < {count}; i++) {{
+    fill({r}, {g}, {b}, 180);
+    const x = width / 2 + cos(angle + i) * {radius};
+    const y = height / 2 + sin(angle + i) * {radius};
+    ellipse(x, y, {size}, {size});
+  }}
+}}
+"""
+
+
+def make_code(rng: random.Random, index: int) -> str:
+    """合成したp5.jsのコードを生成（一部のブロックは画像を読み込む）"""
+    preload = (
+        f'img = loadImage("images/bench_{index % 50}.png");' if index % 4 == 0 else ""
+    )
+    return SKETCH_TEMPLATE.format(
+        angle=rng.random(),
+        preload=preload,
+        speed=round(rng.uniform(0.001, 0.05), 4),
+        count=rng.randint(5, 200),
+        r=rng.randint(0, 255),
+        g=rng.randint(0, 255),
+        b=rng.randint(0, 255),
+        radius=rng.randint(50, 400),
+        size=rng.randint(4, 40),
+    )
+
+
+def make_library(block_count: int, seed: int = 0):
+    """
+    合成したコードブロックのリストを生成
+
+    Returns:
+        code_blocks.jsonと同じ形式のブロックのリスト
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"Block {index + 1}",
+            "code": make_code(rng, index),
+        }
+        for index in range(block_count)
+    ]
+
+
+def make_track(blocks, lane_count: int, blocks_per_lane: int = 32, seed: int = 0):
+    """
+    ライブラリのブロックを参照するトラック（レーンごとのトラックブロック）を生成
+
+    Returns:
+        track_data.jsonのtrack_blocksと同じ形式のリスト
+    """
+    rng = random.Random(seed)
+    lanes = []
+    for _ in range(lane_count):
+        lane = []
+        for _ in range(blocks_per_lane):
+            bars = rng.choice((4, 8, 16))
+            lane.append(
+                {
+                    "block_id": rng.choice(blocks)["id"],
+                    "duration": bars * 2000,
+                    "bars": bars,
+                }
+            )
+        lanes.append(lane)
+    return lanes
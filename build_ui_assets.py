@@ -0,0 +1,39 @@
+"""
+エディタ・トラックウィンドウのUIのアセットをvendor/ui/にビルドする
+
+    python build_ui_assets.py
+    python build_ui_assets.py --tailwind ./tailwindcss-macos-arm64
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+from utils import UI_ASSETS_DIR, build_ui_assets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="エディタ・トラックウィンドウのUIのアセットをビルドする"
+    )
+    parser.add_argument("--output-dir", default=UI_ASSETS_DIR)
+    parser.add_argument(
+        "--tailwind",
+        help="TailwindのCLIのパス（省略時はPATHのtailwindcssかnpxを使う）",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = build_ui_assets(
+            args.output_dir, [args.tailwind] if args.tailwind else None
+        )
+    except (RuntimeError, OSError, subprocess.CalledProcessError) as e:
+        print(f"Failed to build UI assets: {e}")
+        return 1
+    print(json.dumps(manifest, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+トラックを単体で再生できるHTMLに書き出す
+
+    python export_show.py show.html
+    python export_show.py show.html --storage sqlite --loop
+"""
+
+import argparse
+import json
+import sys
+
+from utils import export_show, open_block_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="トラックを単体で再生できるHTMLに書き出す"
+    )
+    parser.add_argument("output", help="書き出すHTMLのパス")
+    parser.add_argument("--storage", default="json", choices=("json", "sqlite"))
+    parser.add_argument("--data-file", default="data/code_blocks.json")
+    parser.add_argument("--track-file", default="data/track_data.json")
+    parser.add_argument("--db-file", default="data/p5_player.db")
+    parser.add_argument("--images-dir", default="images")
+    parser.add_argument(
+        "--loop", action="store_true", help="最後まで再生したら繰り返す"
+    )
+    args = parser.parse_args(argv)
+
+    store = open_block_store(
+        args.storage, args.data_file, args.track_file, args.db_file
+    )
+    try:
+        track_data = store.load_track_data() or {}
+        blocks, _ = store.load_blocks()
+        blocks_by_id = {block.get("id"): block for block in blocks}
+
+        def get_code(block_id):
+            if block_id not in blocks_by_id:
+                return None
+            return store.get_code(block_id)
+
+        stats = export_show(
+            args.output, track_data, get_code, args.images_dir, args.loop
+        )
+    finally:
+        store.close()
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,156 +1,443 @@
 import os
-import webview
-import json
+import threading
+import time
+from collections import OrderedDict
+
+# 起動時間の計測の基準（以降のモジュールの読み込みも含める）
+_STARTED_AT = time.perf_counter()
+
 from apis import EditorAPI, RenderAPI, TrackAPI
 from utils import (
-    start_image_server,
+    TEMPLATE_VERSION,
+    DEFAULT_LIVE_FRAME_BUDGET,
+    escape_sketch_code,
     create_smooth_lane_switch_js,
     create_base_html,
     create_single_iframe_js,
-    MouseListenerManager,
+    create_prewarm_lane_js,
+    create_asset_resolver_js,
+    create_frame_telemetry_js,
+    create_instance_asset_resolver_js,
+    create_instance_lane_switch_js,
+    create_instance_prewarm_lane_js,
+    find_instance_mode_blocker,
+    RENDER_MODES,
+    extract_asset_refs,
+    RenderTransaction,
+    WriteBehindWriter,
+    JsonBlockStore,
+    BlockRegistry,
+    ChangeLog,
+    open_block_store,
+    CompileCache,
+    AssetPrefetcher,
+    FrameTelemetry,
+    SwitchLatencyTracker,
+    DEFAULT_P5_VERSION,
+    get_p5_runtime_url,
+    ensure_p5_runtime,
+    StartupTimer,
+    get_view_url,
+    EventBus,
+    EVENT_TOPICS,
+    TriggerHub,
+    OscListener,
+    TempoFollower,
 )
 
 
 class P5Player:
     def __init__(self):
+        # 起動の段階ごとの所要時間（最初の描画までの時間を目標と比較する）
+        self.startup_timer = StartupTimer(started_at=_STARTED_AT)
+        self.startup_timer.add_phase("imports", _STARTED_AT, time.perf_counter())
+        self.STARTUP_LOG_FILE = "data/sessions/startup.jsonl"
+        # レンダーウィンドウが最初に描画されたら設定される
+        self.render_ready = threading.Event()
+        # コードブロックを読み込むバックグラウンドのスレッド
+        self.block_loader = None
         self.render_window = None
         self.editor_window = None
         self.track_window = None
         self.code_blocks = []
+        # id → ブロックのインデックス（EditorAPIとTrackAPIで共有）
+        self.block_registry = BlockRegistry(self.code_blocks)
+        # トラックウィンドウへ差分で送る変更の履歴
+        self.track_change_log = ChangeLog()
+        # Pythonからトラックウィンドウへのイベントの配信（ティックごとにまとめて届ける）
+        self.event_bus = EventBus()
         self.selected_code_id = None
         self.track_blocks = []
         self.track_bpm = 120
         self.track_delay = 0
+        self.prewarm_lead_ms = 1000
+        # ブロック開始の何ms前にアセットを画像サーバーのメモリに読み込むか
+        self.prefetch_horizon_ms = 5000
         self.render_width = 1000
         self.render_height = 1000
+        self.p5_version = DEFAULT_P5_VERSION
+        # loadImageの画像をレンダーウィンドウのサイズに縮小・再エンコードして読み込む
+        self.image_variants = False
+        self.image_variant_format = "webp"
+        # Retinaディスプレイでも粗くならないようにレンダーサイズの何倍で要求するか
+        self.image_variant_density = 2
+        # "instance"にすると、スケッチをiframeではなく1つのドキュメントで共有する
+        # p5.jsのインスタンスとして描画する（書き換えられないスケッチはiframeのまま）
+        self.render_mode = "iframe"
+        # レンダーウィンドウに同時に存在できるスケッチ（iframe・インスタンス）の上限
+        # （超えた分は表示されていないものから古い順に破棄する）
+        self.live_frame_budget = DEFAULT_LIVE_FRAME_BUDGET
         self.DATA_FILE = "data/code_blocks.json"
         self.TRACK_FILE = "data/track_data.json"
+        self.COMPILE_CACHE_FILE = "data/compile_cache.json"
+        self.DB_FILE = "data/p5_player.db"
+        self.SESSION_DIR = "data/sessions"
+        self.SHOW_DIR = "data/shows"
+        # 保存先（"sqlite"にするとコードを必要な時だけ読み込むSQLiteのストアを使う）
+        self.storage_backend = os.environ.get("P5_PLAYER_STORAGE", "json")
+        self.block_store = JsonBlockStore(self.DATA_FILE, self.TRACK_FILE)
+        # 保存はバックグラウンドでまとめて行う（一時ファイル経由で置き換え）
+        self.persistence = WriteBehindWriter()
+        self.persistence.register(
+            self.DATA_FILE,
+            self.get_blocks_snapshot,
+            lambda data: self.block_store.save_blocks(data),
+        )
+        self.persistence.register(
+            self.TRACK_FILE,
+            self.get_track_data_snapshot,
+            lambda data: self.block_store.save_track_data(data),
+        )
         self.click_to_play_enabled = False
         self.image_server_port = 8080
+        self.image_server = None
+        self.asset_prefetcher = None
         self.mouse_listener_manager = None
+        self.render_api = None
+        # レンダーウィンドウのフレーム時間の集計（セッションごとにファイルにも保存）
+        self.frame_telemetry = FrameTelemetry(session_dir=self.SESSION_DIR)
+        # レーン切り替えの各段階の所要時間
+        self.switch_latency = SwitchLatencyTracker()
+        # クリック・ホットキー・OSCのトリガーを再生エンジンに渡す（設定はトラックデータに保存）
+        self.trigger_hub = TriggerHub(switch_latency=self.switch_latency)
+        # 外部のテンポ（OSCの拍・テンポ）に合わせる拍の時計
+        self.tempo_follower = TempoFollower()
+        # OSCのトリガー・拍を受信するリスナー（設定で有効にした場合のみ）
+        self.osc_listener = None
+        # レーンごとに先読み済みのスケッチのキー
+        self.prewarmed_lanes = {}
+        # スケッチのキー → ブロックのID（再生・編集した時に記録し、レポートでブロック名を引く）
+        self.sketch_block_ids = OrderedDict()
+        self.MAX_SKETCH_BLOCK_IDS = 4096
         self.initial_html = create_base_html()
+        # コンパイル済みスケッチのキャッシュ（persist_compile_cacheがTrueなら再起動後も有効）
+        self.persist_compile_cache = True
+        self.compile_cache = CompileCache(
+            persist_path=self.COMPILE_CACHE_FILE if self.persist_compile_cache else None
+        )
+
+    def open_block_store(self):
+        """設定に応じた保存先を開く（SQLiteの場合は初回にJSONから移行）"""
+        # dataフォルダが存在しない場合は作成
+        os.makedirs("data", exist_ok=True)
+        try:
+            self.block_store = open_block_store(
+                self.storage_backend, self.DATA_FILE, self.TRACK_FILE, self.DB_FILE
+            )
+        except Exception as e:
+            print("Error opening block store, falling back to JSON:", e)
+            self.block_store = JsonBlockStore(self.DATA_FILE, self.TRACK_FILE)
 
     def load_blocks(self):
         """コードブロックを読み込み"""
         # dataフォルダが存在しない場合は作成
         os.makedirs("data", exist_ok=True)
-        if not os.path.exists(self.DATA_FILE):
-            return
-
         try:
-            with open(self.DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.code_blocks = data.get("blocks", [])
-                self.selected_code_id = data.get("selected_code_id", None)
+            self.code_blocks, self.selected_code_id = self.block_store.load_blocks()
         except Exception as e:
             print("Error loading data:", e)
             self.code_blocks = []
             self.selected_code_id = None
+        self.block_registry.reset(self.code_blocks)
+
+    def get_block_code(self, block):
+        """ブロックのコードを取得（未読み込みなら保存先から取得）"""
+        if "code" in block:
+            return block["code"]
+        return self.block_store.get_code(block.get("id"))
+
+    def get_blocks_snapshot(self):
+        """保存するコードブロックのデータ（書き出しのスレッドで呼ばれる）"""
+        return {
+            "blocks": self.block_registry.snapshot(),
+            "selected_code_id": self.selected_code_id,
+        }
 
     def save_blocks(self):
-        """コードブロックを保存"""
-        # dataフォルダが存在しない場合は作成
-        os.makedirs("data", exist_ok=True)
-        try:
-            with open(self.DATA_FILE, "w", encoding="utf-8") as f:
-                blocks = {
-                    "blocks": self.code_blocks,
-                    "selected_code_id": self.selected_code_id,
-                }
-                json.dump(blocks, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print("Error saving data:", e)
+        """コードブロックを保存（実際の書き込みはバックグラウンドで行われる）"""
+        self.persistence.mark_dirty(self.DATA_FILE)
 
     def load_track_data(self):
         """トラックデータを読み込み"""
         # dataフォルダが存在しない場合は作成
         os.makedirs("data", exist_ok=True)
-        if os.path.exists(self.TRACK_FILE):
-            with open(self.TRACK_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.track_blocks = data.get("track_blocks", [])
-                if not self.track_blocks or not isinstance(self.track_blocks, list):
-                    self.track_blocks = [[]]
-
-                self.track_bpm = data.get("bpm", 120)
-                self.track_delay = data.get("delay", 0)
-                self.render_width = data.get("render_width", 1000)
-                self.render_height = data.get("render_height", 1000)
+        data = self.block_store.load_track_data()
+        if data is not None:
+            self.track_blocks = data.get("track_blocks", [])
+            if not self.track_blocks or not isinstance(self.track_blocks, list):
+                self.track_blocks = [[]]
+
+            self.track_bpm = data.get("bpm", 120)
+            self.track_delay = data.get("delay", 0)
+            self.prewarm_lead_ms = data.get("prewarm_lead_ms", 1000)
+            self.prefetch_horizon_ms = data.get("prefetch_horizon_ms", 5000)
+            self.render_width = data.get("render_width", 1000)
+            self.render_height = data.get("render_height", 1000)
+            self.p5_version = data.get("p5_version", DEFAULT_P5_VERSION)
+            self.image_variants = data.get("image_variants", False)
+            self.image_variant_format = data.get("image_variant_format", "webp")
+            self.render_mode = data.get("render_mode", "iframe")
+            if self.render_mode not in RENDER_MODES:
+                self.render_mode = "iframe"
+            self.live_frame_budget = data.get(
+                "live_frame_budget", DEFAULT_LIVE_FRAME_BUDGET
+            )
+            if (
+                not isinstance(self.live_frame_budget, int)
+                or isinstance(self.live_frame_budget, bool)
+                or self.live_frame_budget < 2
+            ):
+                print(f"Ignoring invalid live frame budget: {self.live_frame_budget}")
+                self.live_frame_budget = DEFAULT_LIVE_FRAME_BUDGET
+            try:
+                self.trigger_hub.configure(data.get("trigger") or {})
+            except ValueError as e:
+                print(f"Ignoring invalid trigger settings: {e}")
+            try:
+                self.tempo_follower.configure(data.get("tempo_sync") or {})
+            except ValueError as e:
+                print(f"Ignoring invalid tempo sync settings: {e}")
 
         else:
             self.track_blocks = [[]]  # デフォルトで1つの空のレーン
             self.track_bpm = 120
             self.track_delay = 0
+            self.prewarm_lead_ms = 1000
             self.render_width = 1000
             self.render_height = 1000
+            self.p5_version = DEFAULT_P5_VERSION
 
         # 最終確認：最低1つのレーンが存在することを保証
         if not self.track_blocks or len(self.track_blocks) == 0:
             print("No lanes found, creating default lane")
             self.track_blocks = [[]]
 
-    def save_track_data(self):
-        """トラックデータを保存"""
-        # dataフォルダが存在しない場合は作成
-        os.makedirs("data", exist_ok=True)
-        try:
-            data_to_save = {
-                "bpm": self.track_bpm,
-                "delay": self.track_delay,
-                "track_blocks": self.track_blocks,
-                "render_width": self.render_width,
-                "render_height": self.render_height,
-            }
-
-            with open(self.TRACK_FILE, "w", encoding="utf-8") as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=2)
+    def get_track_data_snapshot(self):
+        """保存するトラックデータ"""
+        return {
+            "bpm": self.track_bpm,
+            "delay": self.track_delay,
+            "prewarm_lead_ms": self.prewarm_lead_ms,
+            "prefetch_horizon_ms": self.prefetch_horizon_ms,
+            "track_blocks": [list(lane) for lane in self.track_blocks],
+            "render_width": self.render_width,
+            "render_height": self.render_height,
+            "p5_version": self.p5_version,
+            "image_variants": self.image_variants,
+            "image_variant_format": self.image_variant_format,
+            "render_mode": self.render_mode,
+            "live_frame_budget": self.live_frame_budget,
+            "trigger": self.trigger_hub.config,
+            "tempo_sync": self.tempo_follower.config,
+        }
 
-        except Exception as e:
-            print("Error saving track data:", e)
+    def save_track_data(self):
+        """トラックデータを保存（実際の書き込みはバックグラウンドで行われる）"""
+        self.persistence.mark_dirty(self.TRACK_FILE)
+
+    def get_p5_url(self):
+        """iframeで読み込むp5.jsのURL（ローカル配置済みで画像サーバーが起動していれば画像サーバー経由）"""
+        port = self.image_server_port if self.image_server is not None else None
+        return get_p5_runtime_url(self.p5_version, port)
+
+    def get_image_query(self):
+        """loadImageのURLに付けるクエリ（画像の縮小が無効なら空文字）"""
+        if not self.image_variants:
+            return ""
+        width = int(self.render_width * self.image_variant_density)
+        height = int(self.render_height * self.image_variant_density)
+        return f"?w={width}&h={height}&fmt={self.image_variant_format}"
+
+    def compile_sketch(self, code: str, kind: str, build_func):
+        """エスケープ済みコードからJavaScriptを生成（キャッシュ済みならそれを返す）"""
+        p5_url = self.get_p5_url()
+        # 画像を読み込まないスケッチはレンダーサイズが変わってもキャッシュを使い回す
+        image_query = self.get_image_query() if "loadImage(" in code else ""
+        key = CompileCache.make_key(
+            kind, code, self.image_server_port, p5_url, image_query, TEMPLATE_VERSION
+        )
+        return self.compile_cache.get_or_compile(
+            key,
+            lambda: build_func(
+                escape_sketch_code(code, self.image_server_port, image_query),
+                p5_url,
+                # p5.jsの各ローダーのパスを画像サーバーのURLに解決するスクリプトと
+                # フレーム時間を計測するスクリプト
+                create_asset_resolver_js(
+                    self.image_server_port,
+                    image_query,
+                    extract_asset_refs(code),
+                    self.get_sketch_key(code),
+                )
+                + create_frame_telemetry_js(self.get_sketch_key(code)),
+            ),
+        )
+
+    def get_sketch_key(self, code: str):
+        """先読み済みのスケッチを識別するためのキー"""
+        return CompileCache.make_key("sketch", code)
+
+    def record_sketch_block(self, code: str, block_id):
+        """
+        スケッチのキーとブロックの対応を記録（レポートでライブラリ全体を読み直さないため）
+
+        Returns:
+            スケッチのキー
+        """
+        sketch_key = self.get_sketch_key(code)
+        self.sketch_block_ids[sketch_key] = block_id
+        self.sketch_block_ids.move_to_end(sketch_key)
+        while len(self.sketch_block_ids) > self.MAX_SKETCH_BLOCK_IDS:
+            self.sketch_block_ids.popitem(last=False)
+        return sketch_key
+
+    def compile_lane_switch(self, code: str, lane_index: int):
+        """レーン切り替え用のJavaScriptを取得"""
+        return self.compile_sketch(
+            code,
+            f"lane:{lane_index}",
+            lambda escaped_code, p5_url, asset_prelude: create_smooth_lane_switch_js(
+                lane_index, escaped_code, p5_url, asset_prelude
+            ),
+        )
+
+    def compile_prewarm(self, code: str, lane_index: int):
+        """先読み用のJavaScriptを取得"""
+        sketch_key = self.get_sketch_key(code)
+        return self.compile_sketch(
+            code,
+            f"prewarm:{lane_index}",
+            lambda escaped_code, p5_url, asset_prelude: create_prewarm_lane_js(
+                lane_index, escaped_code, p5_url, sketch_key, asset_prelude
+            ),
+        )
+
+    def can_use_instance_mode(self, code: str):
+        """インスタンスモードで描画するかどうか（書き換えられないスケッチはiframeで描画）"""
+        return (
+            self.render_mode == "instance" and find_instance_mode_blocker(code) is None
+        )
+
+    def compile_instance(self, code: str, kind: str, build_func):
+        """インスタンスモードのスクリプトを生成（キャッシュ済みならそれを返す）"""
+        p5_url = self.get_p5_url()
+        image_query = self.get_image_query() if "loadImage(" in code else ""
+        key = CompileCache.make_key(
+            kind, code, self.image_server_port, p5_url, image_query, TEMPLATE_VERSION
+        )
+        sketch_key = self.get_sketch_key(code)
+        return self.compile_cache.get_or_compile(
+            key,
+            lambda: build_func(
+                sketch_key,
+                code,
+                p5_url,
+                create_instance_asset_resolver_js(
+                    self.image_server_port,
+                    image_query,
+                    extract_asset_refs(code),
+                    sketch_key,
+                ),
+            ),
+        )
+
+    def compile_instance_lane_switch(self, code: str, lane_index: int):
+        """インスタンスモードのレーン切り替え用のJavaScriptを取得"""
+        return self.compile_instance(
+            code,
+            f"instance-lane:{lane_index}",
+            lambda *args: create_instance_lane_switch_js(lane_index, *args),
+        )
+
+    def compile_instance_prewarm(self, code: str, lane_index: int):
+        """インスタンスモードの先読み用のJavaScriptを取得"""
+        return self.compile_instance(
+            code,
+            f"instance-prewarm:{lane_index}",
+            lambda *args: create_instance_prewarm_lane_js(lane_index, *args),
+        )
+
+    def compile_single(self, code: str):
+        """エディタからの単一コード実行用のJavaScriptを取得"""
+        return self.compile_sketch(code, "single", create_single_iframe_js)
+
+    def begin_render_transaction(self):
+        """レンダーウィンドウへの操作をまとめるトランザクションを開始"""
+        return RenderTransaction(self.render_window, self)
 
     def update_render_window(self, code: str, lane_index=0):
         """iframeごと作り直してp5.jsスケッチを安全に再注入（レーン対応）"""
         if self.render_window:
-            # バッククォートとバックスラッシュをエスケープ
-            escaped_code = code.replace("\\", "\\\\")
-            escaped_code = escaped_code.replace("`", "\\`")
-            escaped_code = escaped_code.replace("$", "\\$")
-            # ダブルクォートとシングルクォートの両方に対応
-            escaped_code = escaped_code.replace(
-                'loadImage("images',
-                f'loadImage("http://localhost:{self.image_server_port}',
-            )
-            escaped_code = escaped_code.replace(
-                "loadImage('images",
-                f"loadImage('http://localhost:{self.image_server_port}",
-            )
-
-            js_code = create_smooth_lane_switch_js(lane_index, escaped_code)
-            self.render_window.evaluate_js(js_code)
+            self.begin_render_transaction().switch_lane(lane_index, code).commit()
 
     def update_render_window_single(self, code: str):
         """エディタからの単一コード実行用（全レーンをクリアして単一iframeで表示）"""
         if self.render_window:
-            # バッククォートとバックスラッシュをエスケープ
-            escaped_code = code.replace("\\", "\\\\")
-            escaped_code = escaped_code.replace("`", "\\`")
-            escaped_code = escaped_code.replace("$", "\\$")
-            # ダブルクォートとシングルクォートの両方に対応
-            escaped_code = escaped_code.replace(
-                'loadImage("images',
-                f'loadImage("http://localhost:{self.image_server_port}',
-            )
-            escaped_code = escaped_code.replace(
-                "loadImage('images",
-                f"loadImage('http://localhost:{self.image_server_port}",
-            )
-
-            js_code = create_single_iframe_js(escaped_code)
-            self.render_window.evaluate_js(js_code)
+            self.prewarmed_lanes.clear()
+            self.begin_render_transaction().show_single(code).commit()
 
     def set_code_blocks(self, new_blocks):
         """コードブロックを設定"""
         self.code_blocks = new_blocks
+        # 差分で更新済みでなければインデックスを作り直す
+        if self.block_registry.blocks is not new_blocks:
+            self.block_registry.reset(new_blocks)
+
+    def prune_track_references(self):
+        """存在しないブロックを参照しているトラックブロックを削除（削除があれば保存）"""
+        removed = self.block_registry.prune_track_lanes(self.track_blocks)
+        if removed:
+            print(f"Removed {removed} track blocks referring to missing code blocks")
+            self.save_track_data()
+        return removed
+
+    def set_render_size(self, width, height):
+        """レンダーウィンドウのサイズを記録（保存と画像の縮小サイズに使う）"""
+        self.render_width = width
+        self.render_height = height
+
+    def update_image_variants(self, enabled, fmt=None):
+        """画像の縮小・再エンコードの有効/無効と形式を変更"""
+        self.image_variants = bool(enabled)
+        if fmt:
+            self.image_variant_format = fmt
+        self.save_track_data()
+
+    def update_render_mode(self, mode):
+        """レンダーモード（"iframe" / "instance"）を変更（次の切り替えから反映）"""
+        self.render_mode = mode
+        self.save_track_data()
+
+    def update_live_frame_budget(self, budget):
+        """同時に存在できるスケッチの上限を変更"""
+        self.live_frame_budget = budget
+        self.save_track_data()
+
+    def update_p5_version(self, version):
+        """使用するp5.jsのバージョンを変更（ローカルになければ取得してから切り替える）"""
+        ensure_p5_runtime(version)
+        self.p5_version = version
+        self.save_track_data()
 
     def update_click_to_play_enabled(self, enabled):
         """クリック再生の有効/無効を更新"""
@@ -158,111 +445,310 @@ class P5Player:
         if self.mouse_listener_manager:
             self.mouse_listener_manager.update_click_to_play_state(enabled)
 
+    def update_trigger_config(self, config):
+        """
+        トリガーの設定を変更（OSCのポートが変わった場合はリスナーを開き直す）
+
+        Returns:
+            変更後の設定（不正な値があればValueErrorを送出）
+        """
+        updated = self.trigger_hub.configure(config)
+        self.apply_osc_config()
+        self.save_track_data()
+        return updated
+
+    def update_tempo_sync_config(self, config):
+        """
+        テンポ同期の設定を変更（有効にした場合はOSCのリスナーを開始する）
+
+        Returns:
+            変更後の設定（不正な値があればValueErrorを送出）
+        """
+        updated = self.tempo_follower.configure(config)
+        self.apply_osc_config()
+        self.save_track_data()
+        return updated
+
+    def handle_osc(self, address, args, received_ns):
+        """OSCのメッセージを拍の時計かトリガーに振り分ける（受信のスレッドで呼ばれる）"""
+        if self.tempo_follower.config["enabled"] and self.tempo_follower.handle_osc(
+            address, args, received_ns
+        ):
+            return
+        self.trigger_hub.handle_osc(address, args, received_ns)
+
+    def apply_osc_config(self):
+        """トリガー・テンポ同期の設定に合わせてOSCのリスナーを開始・停止"""
+        config = self.trigger_hub.config
+        enabled = config["osc_enabled"] or self.tempo_follower.config["enabled"]
+        listener = self.osc_listener
+        if listener is not None and (
+            not enabled or listener.port != config["osc_port"]
+        ):
+            listener.close()
+            self.osc_listener = listener = None
+        if listener is None and enabled:
+            listener = OscListener(self.handle_osc, config["osc_port"])
+            try:
+                listener.start()
+                self.osc_listener = listener
+                print(f"Listening for OSC on udp://127.0.0.1:{listener.port}")
+            except OSError as e:
+                print(f"Failed to open OSC port {config['osc_port']}: {e}")
+
+    def on_render_ready(self):
+        """レンダーウィンドウが最初に描画された時の処理（残りのウィンドウの作成を始める）"""
+        self.render_ready.set()
+
+    def on_window_ready(self, window, interactive_ms, asset_source):
+        """
+        エディタ・トラックウィンドウが操作できるようになった時の処理
+
+        両方のウィンドウが揃ったら起動の所要時間を表示して記録する
+        """
+        self.startup_timer.record_window_ready(window, interactive_ms, asset_source)
+        windows = self.startup_timer.get_report()["windows"]
+        if window in ("editor", "track") and {"editor", "track"} <= windows.keys():
+            print(self.startup_timer.format_report())
+            self.startup_timer.append_to(self.STARTUP_LOG_FILE)
+
+    def create_render_api(self):
+        """レンダーウィンドウのAPIを作成（他のウィンドウより先に作成できる）"""
+        self.render_api = RenderAPI(
+            render_width=self.render_width,
+            render_height=self.render_height,
+            track_window=None,  # 後で設定
+            save_track_data_func=self.save_track_data,
+            p5_player_instance=self,
+            frame_telemetry=self.frame_telemetry,
+            switch_latency=self.switch_latency,
+            startup_timer=self.startup_timer,
+            event_bus=self.event_bus,
+        )
+        return self.render_api
+
+    def create_apis(self):
+        """
+        APIクラスのインスタンスを作成（依存関係を注入）
+
+        ウィンドウは後からattach_windowsで設定する（RenderAPIは作成済みならそれを使う）
+
+        Returns:
+            (EditorAPI, RenderAPI, TrackAPI) のタプル
+        """
+        editor_api = EditorAPI(
+            code_blocks=self.code_blocks,
+            selected_code_id=self.selected_code_id,
+            track_window=None,  # 後で設定
+            save_blocks_func=self.save_blocks,
+            update_render_window_func=self.update_render_window,
+            update_render_window_single_func=self.update_render_window_single,
+            set_code_blocks_func=self.set_code_blocks,
+            block_registry=self.block_registry,
+            track_change_log=self.track_change_log,
+            p5_player_instance=self,  # P5Playerインスタンスを渡す
+            event_bus=self.event_bus,
+        )
+
+        render_api = (
+            self.render_api if self.render_api is not None else self.create_render_api()
+        )
+
+        track_api = TrackAPI(
+            track_blocks=self.track_blocks,
+            track_bpm=self.track_bpm,
+            track_delay=self.track_delay,
+            code_blocks=self.code_blocks,
+            render_width=self.render_width,
+            render_height=self.render_height,
+            render_window=None,  # 後で設定
+            editor_window=None,  # 後で設定
+            track_window=None,  # 後で設定
+            save_track_data_func=self.save_track_data,
+            begin_render_transaction_func=self.begin_render_transaction,
+            update_click_to_play_func=self.update_click_to_play_enabled,
+            block_registry=self.block_registry,
+            track_change_log=self.track_change_log,
+            p5_player_instance=self,  # P5Playerインスタンスを渡す
+            event_bus=self.event_bus,
+            trigger_hub=self.trigger_hub,
+            tempo_follower=self.tempo_follower,
+        )
+        return editor_api, render_api, track_api
+
+    def attach_windows(self, editor_api, render_api, track_api):
+        """ウィンドウ参照をAPIクラスに設定"""
+        editor_api.track_window = self.track_window
+        render_api.track_window = self.render_window
+        track_api.render_window = self.render_window
+        track_api.editor_window = self.editor_window
+        track_api.track_window = self.track_window
+        # トラックウィンドウは全てのトピックを購読する
+        self.event_bus.attach("track", self.track_window, EVENT_TOPICS)
+
+    def load_library(self):
+        """コードブロックとコンパイルキャッシュを読み込む（バックグラウンドのスレッドで実行）"""
+        try:
+            with self.startup_timer.phase("load_blocks"):
+                self.load_blocks()
+            with self.startup_timer.phase("load_compile_cache"):
+                self.compile_cache.load()
+        except Exception as e:
+            print(f"Error loading block library: {e}")
+
+    def start_block_loader(self):
+        """コードブロックの読み込みをバックグラウンドで開始"""
+        self.block_loader = threading.Thread(
+            target=self.load_library, name="BlockLoader", daemon=True
+        )
+        self.block_loader.start()
+
     def run(self):
-        """アプリケーションを起動"""
+        """
+        アプリケーションを起動
+
+        最初にレンダーウィンドウだけを表示し、コードブロックはその間にバックグラウンドで
+        読み込む。エディタ・トラックウィンドウと入力のリスナーは、レンダーウィンドウの
+        最初の描画の後にfinish_startupで作成する。
+        """
+        # GUIなしでAPIクラスを使う場合（ベンチマークなど）はpywebviewと画像サーバーを読み込まない
+        import webview
+        from utils import start_image_server
+
         try:
             print("Starting p5_player...")
 
-            # 永続化されたデータを読み込み
-            self.load_blocks()
-            self.load_track_data()
+            # 永続化されたデータを読み込み（コードブロックはバックグラウンドで読み込む）
+            with self.startup_timer.phase("open_store"):
+                self.open_block_store()
+            self.start_block_loader()
+            with self.startup_timer.phase("load_track_data"):
+                self.load_track_data()
 
             # 画像サーバーを起動
-            image_server = start_image_server(self.image_server_port)
+            with self.startup_timer.phase("image_server"):
+                self.image_server = start_image_server(self.image_server_port)
+                if self.image_server is not None:
+                    self.asset_prefetcher = AssetPrefetcher(
+                        self.image_server.file_cache,
+                        variant_cache=self.image_server.variant_cache,
+                    )
+            # p5.jsをローカルに用意（初回のみダウンロード、以降はオフラインで動作）
+            # ベースのHTMLとコンパイルのキャッシュのURLが途中で変わらないよう完了を待つ
+            with self.startup_timer.phase("p5_runtime"):
+                ensure_p5_runtime(self.p5_version)
 
-            # 最初のブロックがある場合は初期化時にscriptタグを追加
-            if self.code_blocks:
-                self.selected_code_id = self.code_blocks[0]["id"]
+            print("Creating render window...")
+            with self.startup_timer.phase("render_window"):
+                self.initial_html = create_base_html(
+                    self.get_p5_url(), self.live_frame_budget
+                )
+                render_api = self.create_render_api()
+                self.render_window = webview.create_window(
+                    "Transparent Always on Top p5.js",
+                    html=self.initial_html,
+                    js_api=render_api,
+                    width=self.render_width,
+                    height=self.render_height,
+                    x=0,
+                    y=250,
+                    frameless=True,
+                    transparent=True,
+                    on_top=True,
+                )
+            webview.settings["OPEN_DEVTOOLS_IN_DEBUG"] = False
+            self.startup_timer.mark("gui_start")
+            webview.start(self.finish_startup, debug=True)
+
+            # 終了時に未保存のデータを書き出す
+            if self.osc_listener is not None:
+                self.osc_listener.close()
+            self.trigger_hub.close()
+            self.event_bus.close()
+            self.persistence.close()
+            self.frame_telemetry.close()
+            self.block_store.close()
+            # 終了時にコンパイルキャッシュを保存（次回起動時のウォームスタート用）
+            self.compile_cache.save()
 
-            # APIクラスのインスタンス化（依存関係を注入）
-            editor_api = EditorAPI(
-                code_blocks=self.code_blocks,
-                selected_code_id=self.selected_code_id,
-                track_window=None,  # 後で設定
-                save_blocks_func=self.save_blocks,
-                update_render_window_func=self.update_render_window,
-                update_render_window_single_func=self.update_render_window_single,
-                set_code_blocks_func=self.set_code_blocks,
-                p5_player_instance=self,  # P5Playerインスタンスを渡す
-            )
+        except Exception as e:
+            print(f"Error during startup: {e}")
+            import traceback
 
-            render_api = RenderAPI(
-                render_width=self.render_width,
-                render_height=self.render_height,
-                track_window=None,  # 後で設定
-                save_track_data_func=self.save_track_data,
-            )
+            traceback.print_exc()
 
-            track_api = TrackAPI(
-                track_blocks=self.track_blocks,
-                track_bpm=self.track_bpm,
-                track_delay=self.track_delay,
-                code_blocks=self.code_blocks,
-                render_width=self.render_width,
-                render_height=self.render_height,
-                render_window=None,  # 後で設定
-                editor_window=None,  # 後で設定
-                track_window=None,  # 後で設定
-                save_track_data_func=self.save_track_data,
-                update_render_window_func=self.update_render_window,
-                update_click_to_play_func=self.update_click_to_play_enabled,
-                p5_player_instance=self,  # P5Playerインスタンスを渡す
-            )
+    def finish_startup(self, render_ready_timeout=5.0):
+        """
+        レンダーウィンドウの表示後に残りのウィンドウと入力のリスナーを作成
+        （webview.startから別スレッドで呼ばれる）
 
-            print("Creating render window...")
-            self.render_window = webview.create_window(
-                "Transparent Always on Top p5.js",
-                html=self.initial_html,
-                js_api=render_api,
-                width=self.render_width,
-                height=self.render_height,
-                x=0,
-                y=250,
-                frameless=True,
-                transparent=True,
-                on_top=True,
-            )
+        Args:
+            render_ready_timeout: レンダーウィンドウの最初の描画を待つ最大の秒数
+        """
+        import webview
+        from utils import MouseListenerManager
 
-            print("Creating editor window...")
-            self.editor_window = webview.create_window(
-                "Code Editor",
-                "view/editor/index.html",
-                js_api=editor_api,
-                width=1000,
-                height=1000,
-                x=1000,
-                y=250,
-                on_top=True,
-            )
+        try:
+            if not self.render_ready.wait(render_ready_timeout):
+                print("Render window did not report ready, continuing startup")
 
-            print("Creating track window...")
-            self.track_window = webview.create_window(
-                "Track Window",
-                "view/track/index.html",
-                js_api=track_api,
-                width=2000,
-                height=350,
-                x=0,
-                y=0,
-                on_top=True,
-            )
+            with self.startup_timer.phase("wait_block_loader"):
+                if self.block_loader is not None:
+                    self.block_loader.join()
+            # 削除済みのブロックへの参照は起動時に一度だけ取り除く
+            self.prune_track_references()
+            self.persistence.start()
 
-            # ウィンドウ参照をAPIクラスに設定
-            editor_api.track_window = self.track_window
-            render_api.track_window = self.render_window
-            track_api.render_window = self.render_window
-            track_api.editor_window = self.editor_window
-            track_api.track_window = self.track_window
+            # 最初のブロックがある場合は初期化時にscriptタグを追加
+            if self.code_blocks:
+                self.selected_code_id = self.code_blocks[0]["id"]
 
-            # マウスリスナーマネージャーを初期化して起動
-            self.mouse_listener_manager = MouseListenerManager(
-                self.track_window, self.click_to_play_enabled
-            )
-            self.mouse_listener_manager.start_listeners(
-                self.render_window, self.editor_window
-            )
-            webview.settings["OPEN_DEVTOOLS_IN_DEBUG"] = False
-            webview.start(debug=True)
+            editor_api, render_api, track_api = self.create_apis()
+            # 画像サーバーから配信して、ビルド済みのUIのアセットをキャッシュ付きで読み込む
+            view_port = self.image_server_port if self.image_server else None
+
+            with self.startup_timer.phase("editor_track_windows"):
+                print("Creating editor window...")
+                self.editor_window = webview.create_window(
+                    "Code Editor",
+                    get_view_url("editor/index.html", view_port),
+                    js_api=editor_api,
+                    width=1000,
+                    height=1000,
+                    x=1000,
+                    y=250,
+                    on_top=True,
+                )
+
+                print("Creating track window...")
+                self.track_window = webview.create_window(
+                    "Track Window",
+                    get_view_url("track/index.html", view_port),
+                    js_api=track_api,
+                    width=2000,
+                    height=350,
+                    x=0,
+                    y=0,
+                    on_top=True,
+                )
+
+                self.attach_windows(editor_api, render_api, track_api)
+                self.event_bus.start()
+
+            # マウスリスナーマネージャーを初期化して起動（pynputはここで初めて読み込む）
+            with self.startup_timer.phase("input_listeners"):
+                self.trigger_hub.start(track_api.handle_trigger)
+                self.apply_osc_config()
+                self.mouse_listener_manager = MouseListenerManager(
+                    self.track_window,
+                    self.click_to_play_enabled,
+                    self.event_bus,
+                    trigger_hub=self.trigger_hub,
+                )
+                self.mouse_listener_manager.start_listeners(
+                    self.render_window, self.editor_window
+                )
+            self.startup_timer.mark("ready")
 
         except Exception as e:
             print(f"Error during startup: {e}")
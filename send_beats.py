@@ -0,0 +1,49 @@
+"""
+ローカルのUDPポートに一定のテンポでOSCの拍を送る（テンポ同期の動作確認用）
+
+    python send_beats.py --bpm 128
+    python send_beats.py --bpm 96 --jitter-ms 8 --tempo --bars 16
+"""
+
+import argparse
+import sys
+
+from utils import DEFAULT_OSC_PORT, send_loopback_beats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="ローカルのUDPポートに一定のテンポでOSCの拍を送る"
+    )
+    parser.add_argument("--bpm", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=DEFAULT_OSC_PORT)
+    parser.add_argument("--bars", type=int, default=32, help="送信する小節の数")
+    parser.add_argument("--beats-per-bar", type=int, default=4)
+    parser.add_argument(
+        "--jitter-ms",
+        type=float,
+        default=0.0,
+        help="各拍の送信時刻に加える揺れの最大値（ms）",
+    )
+    parser.add_argument(
+        "--tempo", action="store_true", help="小節の頭で /p5/tempo も送る"
+    )
+    args = parser.parse_args(argv)
+
+    print(f"Sending {args.bars} bars at {args.bpm} BPM to udp://127.0.0.1:{args.port}")
+    try:
+        send_loopback_beats(
+            args.bpm,
+            args.bars * args.beats_per_bar,
+            port=args.port,
+            beats_per_bar=args.beats_per_bar,
+            jitter_ms=args.jitter_ms,
+            send_tempo=args.tempo,
+        )
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from utils.osc import OscListener, build_osc_message, parse_osc_packet
+
+
+def _bundle(*messages, sizes=None):
+    data = b"#bundle\0" + b"\0" * 8
+    for index, message in enumerate(messages):
+        size = len(message) if sizes is None else sizes[index]
+        data += struct.pack(">i", size) + message
+    return data
+
+
+def test_round_trip_arguments():
+    packet = build_osc_message("/p5/play", 1, 2.5, "x", True, False)
+    assert parse_osc_packet(packet) == [("/p5/play", [1, 2.5, "x", True, False])]
+
+
+def test_message_without_type_tags():
+    assert parse_osc_packet(b"/p5/stop\0\0\0\0") == [("/p5/stop", [])]
+
+
+def test_unknown_type_tag_stops_reading_arguments():
+    packet = b"/a\0\0" + b",ibi\0\0\0\0" + struct.pack(">i", 7) + b"\0" * 8
+    assert parse_osc_packet(packet) == [("/a", [7])]
+
+
+def test_bundle_is_expanded():
+    first = build_osc_message("/p5/beat", 1)
+    second = build_osc_message("/p5/tempo", 120.0)
+    assert parse_osc_packet(_bundle(first, second)) == [
+        ("/p5/beat", [1]),
+        ("/p5/tempo", [120.0]),
+    ]
+
+
+@pytest.mark.parametrize(
+    "packet",
+    [
+        b"p5/play\0",  # アドレスが/で始まらない
+        b"/p5/play",  # NUL終端がない
+        b"/a\0\0,i\0\0\0\0",  # 引数が足りない
+        b"/a\0\0,s\0\0abc",  # 文字列のNUL終端がない
+    ],
+)
+def test_malformed_message_raises(packet):
+    with pytest.raises((ValueError, struct.error)):
+        parse_osc_packet(packet)
+
+
+@pytest.mark.parametrize("size", [0, -4, 1000])
+def test_malformed_bundle_raises(size):
+    message = build_osc_message("/p5/play")
+    with pytest.raises(ValueError):
+        parse_osc_packet(_bundle(message, sizes=[size]))
+
+
+def test_listener_skips_malformed_packets():
+    received = []
+    done = threading.Event()
+
+    def handler(address, args, received_ns):
+        received.append((address, args))
+        done.set()
+
+    listener = OscListener(handler, port=0)
+    listener.start()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"garbage", (listener.host, listener.port))
+            sock.sendto(build_osc_message("/p5/start"), (listener.host, listener.port))
+        assert done.wait(2.0)
+    finally:
+        listener.close()
+    assert received == [("/p5/start", [])]
+    assert listener.error_count == 1
@@ -0,0 +1,65 @@
+from utils.playback_engine import build_timeline
+
+MS = 1_000_000
+
+
+def _ordered(timeline):
+    # 再生エンジンと同じく、同じオフセットのイベントは追加した順に発火する
+    return [event for _, event in sorted(timeline, key=lambda item: item[0])]
+
+
+def _lane(*durations):
+    return [
+        {"block_id": f"b{index}", "duration": d} for index, d in enumerate(durations)
+    ]
+
+
+def test_start_offsets_follow_durations():
+    timeline = build_timeline([_lane(1000, 500, 250)])
+    starts = [
+        (offset, e["block_index"]) for offset, e in timeline if e["kind"] == "start"
+    ]
+    assert starts == [(0, 0), (1000 * MS, 1), (1500 * MS, 2)]
+    assert max(offset for offset, _ in timeline) == 1750 * MS
+
+
+def test_start_index_skips_earlier_blocks():
+    timeline = build_timeline([_lane(1000, 500), _lane(300)], start_indexes=[1, 5])
+    starts = [
+        (e["lane_index"], e["block_index"]) for _, e in timeline if e["kind"] == "start"
+    ]
+    assert starts == [(0, 1), (1, 0)]
+
+
+def test_prewarm_lead_longer_than_block_stays_after_previous_start():
+    timeline = build_timeline([_lane(200, 200, 200)], prewarm_lead_ms=1000)
+    prewarms = {
+        e["block_index"]: offset for offset, e in timeline if e["kind"] == "prewarm"
+    }
+    # 先読みはレーンごとに1つなので、直前のブロックが始まってから行う
+    assert prewarms == {1: 0, 2: 200 * MS}
+
+    order = [
+        (e["kind"], e.get("block_index"))
+        for e in _ordered(timeline)
+        if e["kind"] in ("start", "prewarm")
+    ]
+    assert order == [
+        ("start", 0),
+        ("prewarm", 1),
+        ("start", 1),
+        ("prewarm", 2),
+        ("start", 2),
+    ]
+
+
+def test_prefetch_is_clamped_to_start_and_released_after_block():
+    timeline = build_timeline([_lane(1000, 1000)], prefetch_horizon_ms=5000)
+    prefetches = [offset for offset, e in timeline if e["kind"] == "prefetch"]
+    releases = [offset for offset, e in timeline if e["kind"] == "release"]
+    assert prefetches == [0, 0]
+    assert releases == [1000 * MS, 2000 * MS]
+
+
+def test_empty_lanes_have_no_events():
+    assert build_timeline([[], []]) == []
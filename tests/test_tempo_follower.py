@@ -0,0 +1,87 @@
+import pytest
+
+from utils.tempo_follower import TempoFollower, normalize_tempo_sync_config
+
+MS = 1_000_000
+PERIOD_120 = 500 * MS
+
+
+def _send_beats(follower, start_ns, period_ns, count, jitter_ns=0, bar=4):
+    for index in range(count):
+        jitter = jitter_ns if index % 2 else -jitter_ns
+        follower.on_beat(start_ns + index * period_ns + jitter, index % bar + 1)
+    return start_ns + (count - 1) * period_ns
+
+
+def test_locks_to_jittered_beats():
+    follower = TempoFollower()
+    last_ns = _send_beats(follower, 0, PERIOD_120, 16, jitter_ns=3 * MS)
+    assert follower.is_locked(last_ns)
+    assert follower.bpm == pytest.approx(120, abs=1)
+    assert follower.outlier_count == 0
+    # 拍の番号1の拍が小節の頭になる
+    assert follower.bar_origin % 4 == 0
+    assert follower.ns_to_beat(last_ns) == pytest.approx(15, abs=0.05)
+
+
+def test_measures_period_from_first_interval():
+    follower = TempoFollower(bpm=120)
+    last_ns = _send_beats(follower, 0, 400 * MS, 3)
+    assert follower.bpm == pytest.approx(150)
+    assert follower.is_locked(last_ns)
+
+
+def test_unlocks_when_beats_stop():
+    follower = TempoFollower()
+    last_ns = _send_beats(follower, 0, PERIOD_120, 8)
+    assert follower.is_locked(last_ns + 3 * PERIOD_120)
+    assert not follower.is_locked(last_ns + 5 * PERIOD_120)
+
+
+def test_single_outlier_does_not_move_the_clock():
+    follower = TempoFollower()
+    last_ns = _send_beats(follower, 0, PERIOD_120, 8)
+    state = follower._state
+    follower.on_beat(last_ns + PERIOD_120 // 2)
+    assert follower.outlier_count == 1
+    assert follower.resync_count == 0
+    assert follower._state == state
+
+
+def test_resyncs_after_consecutive_outliers():
+    follower = TempoFollower()
+    last_ns = _send_beats(follower, 0, PERIOD_120, 8)
+    # 位相が半拍ずれた拍が続く
+    shifted_ns = last_ns + PERIOD_120 // 2
+    last_ns = _send_beats(follower, shifted_ns, PERIOD_120, 9)
+    assert follower.outlier_count == 3
+    assert follower.resync_count == 1
+    assert follower.is_locked(last_ns)
+    assert follower.bpm == pytest.approx(120)
+    assert follower.beat_to_ns(follower.ns_to_beat(last_ns)) == pytest.approx(last_ns)
+
+
+def test_tempo_message_keeps_beat_position():
+    follower = TempoFollower()
+    last_ns = _send_beats(follower, 0, PERIOD_120, 4)
+    beat = follower.ns_to_beat(last_ns + 100 * MS)
+    follower.on_tempo(90, last_ns + 100 * MS)
+    assert follower.bpm == pytest.approx(90)
+    assert follower.ns_to_beat(last_ns + 100 * MS) == pytest.approx(beat)
+    follower.on_tempo(1000, last_ns)
+    assert follower.bpm == pytest.approx(90)
+
+
+def test_clock_requires_a_beat():
+    follower = TempoFollower()
+    assert not follower.has_phase
+    with pytest.raises(RuntimeError):
+        follower.beat_to_ns(0)
+
+
+@pytest.mark.parametrize(
+    "config", [{"unknown": True}, {"quantize_beats": -1}, {"quantize_beats": 1.5}]
+)
+def test_normalize_rejects_invalid_settings(config):
+    with pytest.raises(ValueError):
+        normalize_tempo_sync_config(config)
@@ -0,0 +1,79 @@
+import pytest
+
+from utils.trigger_hub import TriggerHub, normalize_trigger_config
+
+MS = 1_000_000
+
+
+def _make_hub(**config):
+    hub = TriggerHub(config)
+    handled = []
+    hub.handler = lambda trigger: handled.append(trigger) or trigger["action"]
+    return hub, handled
+
+
+def test_debounce_window_is_shared_across_sources():
+    hub, handled = _make_hub(debounce_ms=100)
+    hub._process("osc", "start", 0, {})
+    hub._process("hotkey", "toggle", 99 * MS, {})
+    hub._process("click", "toggle", 100 * MS, {"button": "left", "x": 0, "y": 0})
+    assert [trigger["source"] for trigger in handled] == ["osc", "click"]
+    assert hub.counts == {"offered": 3, "filtered": 0, "debounced": 1, "accepted": 2}
+
+
+def test_debounce_measures_from_last_accepted_trigger():
+    hub, handled = _make_hub(debounce_ms=100)
+    # 無視されたトリガーでは待ち時間を延ばさない
+    for t_ms in (0, 60, 120, 180):
+        hub._process("osc", "toggle", t_ms * MS, {})
+    assert [trigger["t_ns"] for trigger in handled] == [0, 120 * MS]
+
+
+def test_zero_debounce_accepts_every_trigger():
+    hub, handled = _make_hub(debounce_ms=0)
+    for _ in range(3):
+        hub._process("osc", "toggle", 5 * MS, {})
+    assert len(handled) == 3
+
+
+def test_click_filtered_by_button_and_region():
+    hub, handled = _make_hub(debounce_ms=0, region=[10, 10, 100, 50])
+    hub._process("click", "toggle", 0, {"button": "right", "x": 20, "y": 20})
+    hub._process("click", "toggle", 0, {"button": "left", "x": 110, "y": 20})
+    hub._process("click", "toggle", 0, {"button": "left", "x": 109, "y": 59})
+    assert len(handled) == 1
+    assert hub.counts["filtered"] == 2
+
+
+def test_released_osc_button_is_ignored():
+    hub, _ = _make_hub(osc_enabled=True)
+    assert hub.handle_osc("/p5/play", [0], 0)
+    assert hub.handle_osc("/p5/play", [1.0], 0)
+    assert not hub.handle_osc("/p5/beat", [1], 0)
+    assert hub._queue.qsize() == 1
+
+
+def test_normalize_fills_defaults():
+    config = normalize_trigger_config({"hotkey": " F9 "})
+    assert config["hotkey"] == "f9"
+    assert config["debounce_ms"] == 250
+    assert config["region"] is None
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"unknown": 1},
+        {"debounce_ms": -1},
+        {"debounce_ms": "10"},
+        {"buttons": "left"},
+        {"region": [0, 0, 0, 10]},
+        {"region": [0, 0, 10]},
+        {"hotkey": 1},
+        {"osc_port": 80},
+        {"osc_port": 9000.5},
+    ],
+)
+def test_normalize_rejects_invalid_settings(config):
+    with pytest.raises(ValueError):
+        normalize_trigger_config(config)
@@ -1,24 +1,170 @@
-from .image_server import start_image_server, ImageRequestHandler
 from .render_utils import (
+    TEMPLATE_VERSION,
+    DEFAULT_LIVE_FRAME_BUDGET,
+    escape_sketch_code,
     create_smooth_lane_switch_js,
     create_clear_all_lanes_js,
     create_clear_specific_lane_js,
     create_clear_single_iframe_js,
+    create_set_frame_budget_js,
     create_resize_handler_js,
     create_base_html,
     create_single_iframe_js,
+    create_prewarm_lane_js,
+    create_asset_resolver_js,
+    create_frame_telemetry_js,
+    create_instance_asset_resolver_js,
+    create_instance_lane_switch_js,
+    create_instance_prewarm_lane_js,
+)
+from .instance_mode import (
+    RENDER_MODES,
+    P5_SKETCH_HOOKS,
+    find_instance_mode_blocker,
+)
+from .assets import P5_ASSET_LOADERS, extract_asset_refs
+from .compile_cache import CompileCache
+from .file_cache import FileCache
+from .asset_prefetcher import AssetPrefetcher
+from .frame_telemetry import FrameTelemetry
+from .switch_latency import (
+    SwitchLatencyTracker,
+    monotonic_to_shared_ms,
+    shared_clock_ms,
+)
+from .image_variants import (
+    VARIANT_FORMATS,
+    ImageVariantCache,
+    is_image_variant_supported,
+)
+from .render_transaction import RenderTransaction
+from .persistence import WriteBehindWriter, atomic_write_json
+from .block_registry import BlockRegistry
+from .change_log import ChangeLog
+from .block_store import JsonBlockStore, SqliteBlockStore, open_block_store
+from .playback_engine import PlaybackEngine, build_timeline
+from .p5_runtime import (
+    DEFAULT_P5_VERSION,
+    is_valid_p5_version,
+    get_p5_runtime_url,
+    ensure_p5_runtime,
+)
+from .show_exporter import build_show_html, export_show
+from .startup_timer import StartupTimer, TIME_TO_FIRST_RENDER_TARGET_MS
+from .event_bus import EventBus, EVENT_TOPICS
+from .osc import (
+    DEFAULT_OSC_PORT,
+    OscListener,
+    build_osc_message,
+    parse_osc_packet,
+    send_osc_message,
+)
+from .trigger_hub import (
+    DEFAULT_TRIGGER_CONFIG,
+    TRIGGER_OSC_ADDRESSES,
+    TriggerHub,
+    normalize_trigger_config,
+)
+from .tempo_follower import (
+    DEFAULT_TEMPO_SYNC_CONFIG,
+    TEMPO_OSC_ADDRESSES,
+    TempoFollower,
+    normalize_tempo_sync_config,
+    send_loopback_beats,
+)
+from .ui_assets import (
+    UI_ASSETS_DIR,
+    build_ui_assets,
+    find_tailwind_command,
+    get_view_url,
 )
-from .mouse_listener import MouseListenerManager
 
 __all__ = [
     "start_image_server",
     "ImageRequestHandler",
+    "TEMPLATE_VERSION",
+    "DEFAULT_LIVE_FRAME_BUDGET",
+    "escape_sketch_code",
     "create_smooth_lane_switch_js",
     "create_clear_all_lanes_js",
     "create_clear_specific_lane_js",
     "create_clear_single_iframe_js",
+    "create_set_frame_budget_js",
     "create_resize_handler_js",
     "create_base_html",
     "create_single_iframe_js",
+    "create_prewarm_lane_js",
+    "create_asset_resolver_js",
+    "create_frame_telemetry_js",
+    "create_instance_asset_resolver_js",
+    "create_instance_lane_switch_js",
+    "create_instance_prewarm_lane_js",
+    "RENDER_MODES",
+    "P5_SKETCH_HOOKS",
+    "find_instance_mode_blocker",
+    "P5_ASSET_LOADERS",
+    "extract_asset_refs",
     "MouseListenerManager",
+    "CompileCache",
+    "FileCache",
+    "AssetPrefetcher",
+    "FrameTelemetry",
+    "SwitchLatencyTracker",
+    "monotonic_to_shared_ms",
+    "shared_clock_ms",
+    "VARIANT_FORMATS",
+    "ImageVariantCache",
+    "is_image_variant_supported",
+    "RenderTransaction",
+    "WriteBehindWriter",
+    "atomic_write_json",
+    "BlockRegistry",
+    "ChangeLog",
+    "JsonBlockStore",
+    "SqliteBlockStore",
+    "open_block_store",
+    "PlaybackEngine",
+    "build_timeline",
+    "DEFAULT_P5_VERSION",
+    "is_valid_p5_version",
+    "get_p5_runtime_url",
+    "ensure_p5_runtime",
+    "build_show_html",
+    "export_show",
+    "StartupTimer",
+    "TIME_TO_FIRST_RENDER_TARGET_MS",
+    "EventBus",
+    "EVENT_TOPICS",
+    "DEFAULT_OSC_PORT",
+    "OscListener",
+    "build_osc_message",
+    "parse_osc_packet",
+    "send_osc_message",
+    "DEFAULT_TRIGGER_CONFIG",
+    "TRIGGER_OSC_ADDRESSES",
+    "TriggerHub",
+    "normalize_trigger_config",
+    "DEFAULT_TEMPO_SYNC_CONFIG",
+    "TEMPO_OSC_ADDRESSES",
+    "TempoFollower",
+    "normalize_tempo_sync_config",
+    "send_loopback_beats",
+    "UI_ASSETS_DIR",
+    "build_ui_assets",
+    "find_tailwind_command",
+    "get_view_url",
 ]
+
+
+def __getattr__(name):
+    # pynputはGUI環境でのみ必要なので、使われるまで読み込まない
+    if name == "MouseListenerManager":
+        from .mouse_listener import MouseListenerManager
+
+        return MouseListenerManager
+    # http.serverの読み込みは起動時間の大きな割合を占めるので、サーバーを起動するまで読み込まない
+    if name in ("start_image_server", "ImageRequestHandler"):
+        from . import image_server
+
+        return getattr(image_server, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
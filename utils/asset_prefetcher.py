@@ -0,0 +1,226 @@
+import os
+import posixpath
+import queue
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+from .image_variants import SOURCE_EXTENSIONS, parse_variant_params
+
+
+class AssetPrefetcher:
+    """
+    再生予定のブロックが使うアセットを、開始前に画像サーバーのメモリキャッシュへ読み込む
+
+    再生エンジンの prefetch イベントでブロックのアセットをキャッシュに固定（pin）し、
+    release イベントで解放する。同じファイルを複数のブロックが使う場合は
+    固定の数で管理するので、最後のブロックが終わるまでは解放されない。
+    ファイルの読み込みは専用のスレッドで行い、再生エンジンを待たせない。
+    """
+
+    def __init__(
+        self,
+        file_cache,
+        variant_cache=None,
+        root_dir="images",
+        budget_bytes=48 * 1024 * 1024,
+        max_runs=20,
+    ):
+        self.file_cache = file_cache
+        self.variant_cache = variant_cache
+        self.root_dir = root_dir
+        self.budget_bytes = budget_bytes
+        # ブロック（トークン）→ 固定したファイルのパスのリスト
+        self._pinned = {}
+        # パス → 固定しているブロックの数（予算は同じファイルを1回だけ数える）
+        self._path_refs = {}
+        self._path_sizes = {}
+        self._pinned_bytes = 0
+        self._commands = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.run = None
+        self.runs = deque(maxlen=max_runs)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def start_run(self, horizon_ms):
+        """再生の開始時に呼び、前回の固定を解放して集計をやり直す"""
+        self._ensure_thread()
+        self._commands.put(("start_run", horizon_ms))
+
+    def prefetch(self, token, paths, image_query=""):
+        """
+        アセットの読み込みを予約
+
+        Args:
+            token: release()で解放する時に使うキー（レーンとブロックの位置など）
+            paths: 画像サーバー上のパスのリスト（extract_asset_refsの結果）
+            image_query: loadImageの画像に付けるクエリ（縮小版を読み込む）
+        """
+        if not paths:
+            return
+        self._ensure_thread()
+        self._commands.put(("prefetch", token, list(paths), image_query))
+
+    def release(self, token):
+        """prefetch()で読み込んだアセットを解放"""
+        self._ensure_thread()
+        self._commands.put(("release", token))
+
+    def release_all(self):
+        """全ての固定を解放（再生の停止時など）"""
+        self._ensure_thread()
+        self._commands.put(("release_all",))
+
+    def _run(self):
+        while True:
+            command = self._commands.get()
+            try:
+                if command[0] == "start_run":
+                    self._release_all()
+                    self._start_run(command[1])
+                elif command[0] == "prefetch":
+                    self._prefetch(*command[1:])
+                elif command[0] == "release":
+                    self._release(command[1])
+                elif command[0] == "release_all":
+                    self._release_all()
+            except Exception as e:
+                print(f"Error in asset prefetcher: {e}")
+
+    def _start_run(self, horizon_ms):
+        stats = self.file_cache.stats()
+        with self._lock:
+            if self.run is not None:
+                self.runs.append(self._finish_run_locked())
+            self.run = {
+                "started_at": time.time(),
+                "horizon_ms": horizon_ms,
+                "budget_bytes": self.budget_bytes,
+                "prefetched_files": 0,
+                "prefetched_bytes": 0,
+                "peak_pinned_bytes": 0,
+                "over_budget": 0,
+                "not_cacheable": 0,
+                "missing": 0,
+                "prefetch_ms": 0.0,
+                "_hits": stats["hits"],
+                "_misses": stats["misses"],
+            }
+
+    def _finish_run_locked(self):
+        report = {k: v for k, v in self.run.items() if not k.startswith("_")}
+        stats = self.file_cache.stats()
+        hits = stats["hits"] - self.run["_hits"]
+        misses = stats["misses"] - self.run["_misses"]
+        report["hits"] = hits
+        report["misses"] = misses
+        report["hit_rate"] = (hits / (hits + misses)) if hits + misses else 0.0
+        return report
+
+    def _resolve_path(self, path, image_query):
+        """画像サーバーが実際に返すファイルのパスを取得（存在しなければNone）"""
+        words = [
+            word
+            for word in posixpath.normpath(urllib.parse.unquote(path)).split("/")
+            if word and word not in (".", "..")
+        ]
+        source_path = os.path.join(self.root_dir, *words)
+        try:
+            stat_result = os.stat(source_path)
+        except OSError:
+            return None
+
+        # 縮小版を読み込む画像は、変換済みのファイルを先に作っておく
+        extension = os.path.splitext(source_path)[1].lower()
+        if image_query and self.variant_cache and extension in SOURCE_EXTENSIONS:
+            query = urllib.parse.parse_qs(image_query.lstrip("?"))
+            variant_params = parse_variant_params(query)
+            if variant_params is not None:
+                variant = self.variant_cache.get_variant(
+                    source_path, stat_result, *variant_params
+                )
+                if variant is not None:
+                    return variant[0]
+        return source_path
+
+    def _prefetch(self, token, paths, image_query):
+        started = time.perf_counter()
+        pinned = []
+        for path in paths:
+            resolved = self._resolve_path(path, image_query)
+            if resolved is None:
+                self._count("missing")
+                continue
+            if resolved in pinned:
+                continue
+            if resolved in self._path_refs:
+                # 他のブロックのために読み込み済み
+                self._path_refs[resolved] += 1
+                pinned.append(resolved)
+                continue
+            try:
+                size = os.path.getsize(resolved)
+            except OSError:
+                self._count("missing")
+                continue
+            if size > self.file_cache.max_file_bytes:
+                self._count("not_cacheable")
+                continue
+            if self._pinned_bytes + size > self.budget_bytes:
+                self._count("over_budget")
+                continue
+            size = self.file_cache.pin(resolved)
+            if size is None:
+                self._count("missing")
+                continue
+            pinned.append(resolved)
+            self._path_refs[resolved] = 1
+            self._path_sizes[resolved] = size
+            self._pinned_bytes += size
+            with self._lock:
+                if self.run is not None:
+                    self.run["prefetched_files"] += 1
+                    self.run["prefetched_bytes"] += size
+                    self.run["peak_pinned_bytes"] = max(
+                        self.run["peak_pinned_bytes"], self._pinned_bytes
+                    )
+
+        self._pinned.setdefault(token, []).extend(pinned)
+        with self._lock:
+            if self.run is not None:
+                self.run["prefetch_ms"] += (time.perf_counter() - started) * 1000
+
+    def _count(self, key):
+        with self._lock:
+            if self.run is not None:
+                self.run[key] += 1
+
+    def _release(self, token):
+        for path in self._pinned.pop(token, []):
+            self._path_refs[path] -= 1
+            if self._path_refs[path] > 0:
+                continue
+            del self._path_refs[path]
+            self._pinned_bytes -= self._path_sizes.pop(path)
+            self.file_cache.unpin(path)
+
+    def _release_all(self):
+        for token in list(self._pinned):
+            self._release(token)
+
+    def get_report(self):
+        """再生ごとの先読みの件数とキャッシュのヒット率を取得"""
+        with self._lock:
+            current = self._finish_run_locked() if self.run is not None else None
+            return {
+                "current": current,
+                "previous": list(self.runs),
+                "pinned_bytes": self._pinned_bytes,
+            }
@@ -0,0 +1,70 @@
+import re
+
+# アセットを読み込むp5.jsの関数（引数の文字列リテラルをアセットのパスとして扱う）
+P5_ASSET_LOADERS = (
+    "loadImage",
+    "loadJSON",
+    "loadStrings",
+    "loadFont",
+    "loadShader",
+    "loadModel",
+    "loadTable",
+    "loadXML",
+    "loadBytes",
+)
+
+# ローダーの呼び出しの先頭2つまでの文字列リテラルの引数（loadShaderは2つのパスを取る）
+_LOADER_CALL_PATTERN = re.compile(
+    r"\b(?:" + "|".join(P5_ASSET_LOADERS) + r")\s*\(\s*"
+    r"(?P<q1>[\"'`])(?P<first>(?:(?!(?P=q1))[^\\\n])+)(?P=q1)"
+    r"(?:\s*,\s*(?P<q2>[\"'`])(?P<second>(?:(?!(?P=q2))[^\\\n])+)(?P=q2))?"
+)
+
+
+def is_local_asset_path(path: str) -> bool:
+    """画像サーバーから配信する相対パスかどうか（URLやdata:などは対象外）"""
+    return (
+        bool(path)
+        and not path.startswith("//")
+        and not re.match(r"^[a-z]+:", path, re.I)
+    )
+
+
+def to_server_path(path: str) -> str:
+    """
+    スケッチ内の相対パスを画像サーバー上のパスに変換
+
+    画像サーバーはimages/をルートとして配信するので、先頭の"images/"は取り除く
+    """
+    path = re.sub(r"^\.?/", "", path)
+    if path.startswith("images/"):
+        path = path[len("images/") :]
+    return path
+
+
+def extract_asset_refs(code: str):
+    """
+    コードからp5.jsのローダーに渡されている文字列リテラルのパスを抽出
+
+    変数や式で組み立てたパスは抽出できないので、それらは実行時の
+    アセット解決（create_asset_resolver_js）で扱う
+
+    Returns:
+        画像サーバー上のパスのリスト（重複なし、出現順）
+    """
+    refs = []
+    for match in _LOADER_CALL_PATTERN.finditer(code):
+        for quote, path in (
+            (match.group("q1"), match.group("first")),
+            (match.group("q2"), match.group("second")),
+        ):
+            if path is None or (quote == "`" and "${" in path):
+                continue
+            path = path.strip()
+            # loadJSON(path, "json") などの形式の指定は除外
+            if "." not in path or not is_local_asset_path(path):
+                continue
+            server_path = to_server_path(path)
+            if server_path not in refs:
+                refs.append(server_path)
+    return refs
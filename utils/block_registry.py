@@ -0,0 +1,122 @@
+import threading
+
+
+class BlockRegistry:
+    """
+    コードブロックのリストに対する id → ブロック / id → 位置 のインデックス
+
+    EditorAPIとTrackAPIで共有し、追加・削除・並べ替えのたびに差分だけ更新する。
+    ブロックの検索はリストの長さに関係なくO(1)で行える。
+    """
+
+    def __init__(self, blocks=None):
+        self._lock = threading.RLock()
+        self.blocks = []
+        self._by_id = {}
+        self._positions = {}
+        # コードが変更されるたびに増えるブロックごとのバージョン
+        self._code_versions = {}
+        self.reset(blocks if blocks is not None else [])
+
+    def reset(self, blocks):
+        """リスト全体を差し替えてインデックスを作り直す"""
+        with self._lock:
+            self.blocks = blocks
+            self._by_id = {}
+            self._positions = {}
+            self._reindex_from(0)
+
+    def _reindex_from(self, start):
+        for position in range(start, len(self.blocks)):
+            block = self.blocks[position]
+            block_id = block.get("id")
+            self._by_id[block_id] = block
+            self._positions[block_id] = position
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, block_id):
+        return block_id in self._by_id
+
+    def get(self, block_id):
+        """IDでブロックを取得（見つからなければNone）"""
+        return self._by_id.get(block_id)
+
+    def index_of(self, block_id):
+        """IDでリスト内の位置を取得（見つからなければNone）"""
+        return self._positions.get(block_id)
+
+    def append(self, block):
+        """ブロックを末尾に追加"""
+        with self._lock:
+            self.blocks.append(block)
+            self._by_id[block.get("id")] = block
+            self._positions[block.get("id")] = len(self.blocks) - 1
+
+    def delete(self, index):
+        """指定位置のブロックを削除（以降のブロックの位置だけ更新）"""
+        with self._lock:
+            block = self.blocks.pop(index)
+            self._by_id.pop(block.get("id"), None)
+            self._positions.pop(block.get("id"), None)
+            self._code_versions.pop(block.get("id"), None)
+            self._reindex_from(index)
+            return block
+
+    def update_fields(self, block_id, **fields):
+        """
+        ブロックの項目を変更（snapshotと同じロックの中で行う）
+
+        Returns:
+            変更したブロック（見つからなければNone）
+        """
+        with self._lock:
+            block = self._by_id.get(block_id)
+            if block is not None:
+                block.update(fields)
+            return block
+
+    def snapshot(self):
+        """
+        保存用にブロックのリストを複製して取得
+
+        書き出しのスレッドでJSONにする間もエディタの変更が続くので、
+        ブロックごとの辞書もロックの中で複製する（値は文字列などの変更されない値）
+        """
+        with self._lock:
+            return [dict(block) for block in self.blocks]
+
+    def reorder(self, new_blocks):
+        """並べ替え後のリストに差し替え（エディタから届いた新しいリストで作り直す）"""
+        self.reset(new_blocks)
+
+    def code_version(self, block_id):
+        """ブロックのコードのバージョンを取得"""
+        return self._code_versions.get(block_id, 0)
+
+    def bump_code_version(self, block_id):
+        """ブロックのコードが変更されたことを記録し、新しいバージョンを返す"""
+        with self._lock:
+            version = self._code_versions.get(block_id, 0) + 1
+            self._code_versions[block_id] = version
+            return version
+
+    def prune_track_lanes(self, track_blocks):
+        """
+        存在しないブロックを参照しているトラックブロックをレーンから削除
+
+        レーンのリストはその場で書き換えるので、同じリストを参照している
+        TrackAPIやP5Playerにもそのまま反映される。
+
+        Returns:
+            削除したトラックブロックの数
+        """
+        removed = 0
+        with self._lock:
+            for lane in track_blocks:
+                kept = [block for block in lane if block.get("block_id") in self._by_id]
+                if len(kept) != len(lane):
+                    removed += len(lane) - len(kept)
+                    lane[:] = kept
+        return removed
@@ -0,0 +1,277 @@
+import json
+import os
+import sqlite3
+import threading
+
+from .persistence import atomic_write_json
+
+
+class JsonBlockStore:
+    """
+    コードブロックとトラックデータをJSONファイルに保存するストア（従来の形式）
+
+    起動時にすべてのブロックのコードを読み込むので、get_code()はメモリから返す。
+    """
+
+    lazy_code = False
+
+    def __init__(self, data_file, track_file):
+        self.data_file = data_file
+        self.track_file = track_file
+        self._codes = {}
+
+    def load_blocks(self):
+        """
+        コードブロックを読み込み
+
+        Returns:
+            (ブロックのリスト, 選択中のブロックID) のタプル
+        """
+        if not os.path.exists(self.data_file):
+            return [], None
+        with open(self.data_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        blocks = data.get("blocks", [])
+        self._codes = {block.get("id"): block.get("code", "") for block in blocks}
+        return blocks, data.get("selected_code_id", None)
+
+    def get_code(self, block_id):
+        """ブロックのコードを取得"""
+        return self._codes.get(block_id, "")
+
+    def save_blocks(self, data):
+        """コードブロックを保存（dataはcode_blocks.jsonと同じ形式）"""
+        self._codes = {
+            block.get("id"): block.get("code", "") for block in data.get("blocks", [])
+        }
+        atomic_write_json(self.data_file, data)
+
+    def load_track_data(self):
+        """トラックデータを読み込み（ファイルがなければNone）"""
+        if not os.path.exists(self.track_file):
+            return None
+        with open(self.track_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_track_data(self, data):
+        """トラックデータを保存（dataはtrack_data.jsonと同じ形式）"""
+        atomic_write_json(self.track_file, data)
+
+    def close(self):
+        pass
+
+
+class SqliteBlockStore:
+    """
+    コードブロックとトラックデータをSQLiteに保存するストア
+
+    一覧の読み込みではIDと名前だけを取得し、コードはget_code()で必要になった時に
+    1件ずつ取得する。ブロック数が多くても起動時間とメモリ使用量が増えない。
+    """
+
+    lazy_code = True
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # APIのスレッドと保存スレッドの両方から使うのでロックで直列化する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blocks (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    position INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS blocks_position ON blocks (position);
+                CREATE TABLE IF NOT EXISTS block_code (
+                    id TEXT PRIMARY KEY,
+                    code TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS track_lanes (
+                    lane_index INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    block_id TEXT,
+                    duration INTEGER NOT NULL,
+                    bars INTEGER NOT NULL,
+                    PRIMARY KEY (lane_index, position)
+                );
+                CREATE INDEX IF NOT EXISTS track_lanes_block_id
+                    ON track_lanes (block_id);
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """)
+
+    def _get_setting(self, key, default=None):
+        row = self._conn.execute(
+            "SELECT value FROM settings WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_setting(self, key, value):
+        self._conn.execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    def migrate_from_json(self, data_file, track_file):
+        """
+        既存のJSONファイルから一度だけデータを取り込む
+
+        Returns:
+            取り込みを行った場合はTrue
+        """
+        with self._lock:
+            if self._get_setting("migrated_from_json", False):
+                return False
+
+        json_store = JsonBlockStore(data_file, track_file)
+        blocks, selected_code_id = json_store.load_blocks()
+        track_data = json_store.load_track_data()
+
+        self.save_blocks({"blocks": blocks, "selected_code_id": selected_code_id})
+        if track_data is not None:
+            self.save_track_data(track_data)
+        with self._lock, self._conn:
+            self._set_setting("migrated_from_json", True)
+        print(f"Migrated {len(blocks)} blocks from {data_file} to {self.db_path}")
+        return True
+
+    def load_blocks(self):
+        """
+        コードブロックの一覧（IDと名前のみ）を読み込み
+
+        Returns:
+            (ブロックのリスト, 選択中のブロックID) のタプル
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name FROM blocks ORDER BY position"
+            ).fetchall()
+            selected_code_id = self._get_setting("selected_code_id")
+        return [{"id": row[0], "name": row[1]} for row in rows], selected_code_id
+
+    def get_code(self, block_id):
+        """ブロックのコードを取得"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT code FROM block_code WHERE id = ?", (block_id,)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def save_blocks(self, data):
+        """
+        コードブロックを保存（dataはcode_blocks.jsonと同じ形式）
+
+        codeを持たないブロック（未読み込み）はコードを書き換えない。
+        名前・位置・コードが変わっていない行は更新しない。
+        """
+        blocks = data.get("blocks", [])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO blocks (id, name, position) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "name = excluded.name, position = excluded.position "
+                "WHERE name IS NOT excluded.name OR position IS NOT excluded.position",
+                [
+                    (block["id"], block.get("name", ""), position)
+                    for position, block in enumerate(blocks)
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO block_code (id, code) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET code = excluded.code "
+                "WHERE code IS NOT excluded.code",
+                [(block["id"], block["code"]) for block in blocks if "code" in block],
+            )
+
+            # 一覧から消えたブロックを削除
+            block_ids = {block["id"] for block in blocks}
+            removed = [
+                (row[0],)
+                for row in self._conn.execute("SELECT id FROM blocks")
+                if row[0] not in block_ids
+            ]
+            self._conn.executemany("DELETE FROM blocks WHERE id = ?", removed)
+            self._conn.executemany("DELETE FROM block_code WHERE id = ?", removed)
+            self._set_setting("selected_code_id", data.get("selected_code_id"))
+
+    def load_track_data(self):
+        """トラックデータを読み込み（保存されていなければNone）"""
+        with self._lock:
+            data = self._get_setting("track_settings")
+            if data is None:
+                return None
+            lanes = [[] for _ in range(self._get_setting("lane_count", 1))]
+            for lane_index, block_id, duration, bars in self._conn.execute(
+                "SELECT lane_index, block_id, duration, bars FROM track_lanes "
+                "ORDER BY lane_index, position"
+            ):
+                while len(lanes) <= lane_index:
+                    lanes.append([])
+                lanes[lane_index].append(
+                    {"block_id": block_id, "duration": duration, "bars": bars}
+                )
+        data["track_blocks"] = lanes
+        return data
+
+    def save_track_data(self, data):
+        """トラックデータを保存（dataはtrack_data.jsonと同じ形式）"""
+        lanes = data.get("track_blocks", [])
+        settings = {key: value for key, value in data.items() if key != "track_blocks"}
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM track_lanes")
+            self._conn.executemany(
+                "INSERT INTO track_lanes "
+                "(lane_index, position, block_id, duration, bars) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        lane_index,
+                        position,
+                        block.get("block_id"),
+                        block.get("duration", 1000),
+                        block.get("bars", 8),
+                    )
+                    for lane_index, lane in enumerate(lanes)
+                    for position, block in enumerate(lane)
+                ],
+            )
+            self._set_setting("lane_count", len(lanes))
+            self._set_setting("track_settings", settings)
+
+    def close(self):
+        """データベースを閉じる"""
+        with self._lock:
+            self._conn.close()
+
+
+def open_block_store(backend, data_file, track_file, db_path):
+    """
+    設定に応じたストアを作成
+
+    Args:
+        backend: "json" または "sqlite"
+        data_file: code_blocks.jsonのパス
+        track_file: track_data.jsonのパス
+        db_path: SQLiteのデータベースのパス
+
+    Returns:
+        JsonBlockStore または SqliteBlockStore
+    """
+    if backend == "sqlite":
+        store = SqliteBlockStore(db_path)
+        store.migrate_from_json(data_file, track_file)
+        return store
+    return JsonBlockStore(data_file, track_file)
@@ -0,0 +1,41 @@
+import threading
+from collections import deque
+
+
+class ChangeLog:
+    """
+    トラックウィンドウへ送る変更（パッチ）の履歴
+
+    変更のたびにバージョンを1つ進め、パッチにバージョンを付けて保持する。
+    受け取り側は自分のバージョンの続きだけを適用し、抜けがあれば
+    since()で不足分を取得する（履歴から消えていれば全体を再同期する）。
+    """
+
+    def __init__(self, max_entries=1000):
+        self.version = 0
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, patch):
+        """パッチを記録し、バージョンを付けたパッチを返す"""
+        with self._lock:
+            self.version += 1
+            entry = dict(patch, version=self.version)
+            self._entries.append(entry)
+            return entry
+
+    def since(self, version):
+        """
+        指定バージョンより後のパッチを取得
+
+        Returns:
+            パッチのリスト。履歴から消えていて差分を返せない場合は None
+        """
+        with self._lock:
+            if version == self.version:
+                return []
+            if version > self.version:
+                return None
+            if not self._entries or self._entries[0]["version"] > version + 1:
+                return None
+            return [entry for entry in self._entries if entry["version"] > version]
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .persistence import atomic_write_json
+
+
+class CompileCache:
+    """
+    スケッチのコンパイル結果（エスケープ済みコードから生成したJavaScript）を
+    保持するLRUキャッシュ
+
+    キーは (コード, 画像サーバーのポート, テンプレートのバージョン, ...) のハッシュで、
+    同じブロックを何度切り替えても文字列処理は初回の1回だけになる。
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, persist_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        # 変更のたびに増える番号（保存中に変更されたかの判定に使う）
+        self._generation = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """キーを構成する要素からハッシュキーを生成"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """キャッシュから取得（見つからなければNone）"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: str):
+        """キャッシュに登録し、上限を超えた分は古いものから破棄"""
+        with self._lock:
+            old_value = self._entries.pop(key, None)
+            if old_value is not None:
+                self._total_bytes -= len(old_value)
+            self._entries[key] = value
+            self._total_bytes += len(value)
+            self._dirty = True
+            self._generation += 1
+            self._evict_locked()
+
+    def get_or_compile(self, key, compile_func):
+        """キャッシュにあればそれを返し、なければcompile_funcで生成して登録"""
+        value = self.get(key)
+        if value is None:
+            value = compile_func()
+            self.put(key, value)
+        return value
+
+    def _evict_locked(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._dirty = True
+            self._generation += 1
+
+    def stats(self):
+        """ヒット/ミスなどの統計を取得"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def load(self):
+        """永続化されたキャッシュを読み込み（ウォームスタート用）"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                for key, value in data.get("entries", []):
+                    self._entries[key] = value
+                    self._total_bytes += len(value)
+                self._evict_locked()
+                self._dirty = False
+        except Exception as e:
+            print("Error loading compile cache:", e)
+
+    def save(self):
+        """
+        キャッシュをファイルに保存（変更がなければ何もしない）
+
+        一時ファイル経由で置き換えるので、書き込み途中で終了しても前回のファイルは壊れない。
+        保存に失敗した場合は変更ありのままにして、次回の保存で再試行する。
+        """
+        if not self.persist_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = list(self._entries.items())
+            generation = self._generation
+        try:
+            atomic_write_json(self.persist_path, {"entries": entries}, indent=None)
+        except Exception as e:
+            print("Error saving compile cache:", e)
+            return
+        with self._lock:
+            # 保存中に追加された分は次回の保存で書き出す
+            if self._generation == generation:
+                self._dirty = False
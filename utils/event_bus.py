@@ -0,0 +1,205 @@
+import json
+import threading
+import time
+from collections import deque
+
+from .playback_engine import percentile
+from .switch_latency import shared_clock_ms
+
+# トピック → (ペイロードに必要なキー, 同じティック内では最新の値だけを送るか)
+# JavaScript側は window.__p5Events.on(トピック, ハンドラー) で受け取る（view/events.js）
+EVENT_TOPICS = {
+    # レンダーウィンドウのサイズが変わった
+    "render_size": (("width", "height"), True),
+    # ブロックの変更（ChangeLogのエントリ）
+    "track_patch": (("op", "version"), False),
+    # エディタからトラックにブロックを追加
+    "track_block_added": (("block", "lane_index"), False),
+    # 再生エンジンの進行（表示のみ）
+    "engine_block_started": (("lane_index", "block_index"), False),
+    "engine_lane_finished": (("lane_index",), False),
+    "engine_finished": ((), False),
+    # トラックの再生を開始・停止する
+    "play_current_track": ((), False),
+    "playback_stop": ((), False),
+    # トリガー（クリック・ホットキー・OSC）で再生エンジンが開始・停止した（表示のみ）
+    "playback_started": (("start_indexes",), False),
+    "playback_stopped": ((), False),
+}
+
+
+class EventBus:
+    """
+    Pythonからウィンドウへのイベントの配信
+
+    publish()はペイロードを1回だけJSONにして、購読しているウィンドウごとのキューに
+    積むだけなので呼び出し側はブロックしない。バックグラウンドのスレッドが
+    tick_interval秒ごとにキューをまとめ、ウィンドウごとに1回のevaluate_jsで届ける。
+    JavaScript側は受け取った時刻との差を返すので、配信の遅延も集計できる。
+    """
+
+    def __init__(self, tick_interval=0.016, max_samples=1000):
+        self.tick_interval = tick_interval
+        # ウィンドウ名 → ウィンドウ / 購読しているトピック
+        self._windows = {}
+        self._topics = {}
+        # ウィンドウ名 → [トピック, JSON, 送信時刻] のリスト
+        self._queues = {}
+        self.published_count = 0
+        self.delivered_count = 0
+        self.coalesced_count = 0
+        self.batch_count = 0
+        self.error_count = 0
+        # トピック → 配信の遅延（ms）
+        self._latencies = {}
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def attach(self, name, window, topics):
+        """
+        ウィンドウを登録してトピックを購読
+
+        Args:
+            name: ウィンドウ名（統計の集計に使う）
+            window: evaluate_jsを持つウィンドウ（Noneなら登録しない）
+            topics: 購読するトピックのリスト
+        """
+        if window is None:
+            return
+        unknown = set(topics) - EVENT_TOPICS.keys()
+        if unknown:
+            raise ValueError(f"Unknown event topics: {sorted(unknown)}")
+        with self._lock:
+            self._windows[name] = window
+            self._topics[name] = set(topics)
+            self._queues.setdefault(name, [])
+
+    def start(self):
+        """バックグラウンドの配信スレッドを開始"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="EventBus", daemon=True
+            )
+            self._thread.start()
+
+    def publish(self, topic, payload=None):
+        """
+        イベントを購読しているウィンドウに送る（実際の配信は次のティックで行われる）
+
+        Args:
+            topic: EVENT_TOPICSのトピック
+            payload: JSONにできる辞書
+        """
+        spec = EVENT_TOPICS.get(topic)
+        if spec is None:
+            raise ValueError(f"Unknown event topic: {topic}")
+        required_keys, coalesce = spec
+        payload = payload if payload is not None else {}
+        missing = [key for key in required_keys if key not in payload]
+        if missing:
+            raise ValueError(f"Event {topic} is missing {missing}")
+
+        data = json.dumps(payload)
+        sent_at = shared_clock_ms()
+        with self._lock:
+            self.published_count += 1
+            for name, topics in self._topics.items():
+                if topic not in topics:
+                    continue
+                queue = self._queues[name]
+                if coalesce:
+                    # 状態を表すトピックは最新の値だけを送る
+                    kept = [event for event in queue if event[0] != topic]
+                    self.coalesced_count += len(queue) - len(kept)
+                    queue[:] = kept
+                queue.append((topic, data, sent_at))
+        if self._thread is None or self._closed:
+            # スレッドが動いていない場合はその場で届ける
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait()
+            if self._closed:
+                break
+            # 同じティックに来たイベントを1回の配信にまとめる
+            time.sleep(self.tick_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """キューに溜まったイベントをウィンドウごとに1回のevaluate_jsで届ける"""
+        with self._flush_lock:
+            with self._lock:
+                batches = [
+                    (name, self._windows[name], queue)
+                    for name, queue in self._queues.items()
+                    if queue
+                ]
+                for name, _, _ in batches:
+                    self._queues[name] = []
+
+            for name, window, queue in batches:
+                # ペイロードはpublish()でJSONにしたものをそのまま埋め込む
+                events = ",".join(
+                    f'{{"topic":{json.dumps(topic)},"sentAt":{sent_at!r},'
+                    f'"payload":{data}}}'
+                    for topic, data, sent_at in queue
+                )
+                try:
+                    latencies = window.evaluate_js(
+                        f"window.__p5Events.dispatch([{events}])"
+                    )
+                except Exception as e:
+                    print(f"Error delivering events to {name} window: {e}")
+                    with self._lock:
+                        self.error_count += 1
+                    continue
+                with self._lock:
+                    self.batch_count += 1
+                    self.delivered_count += len(queue)
+                    if isinstance(latencies, list):
+                        for (topic, _, _), latency in zip(queue, latencies):
+                            if isinstance(latency, (int, float)):
+                                self._latencies.setdefault(
+                                    topic, deque(maxlen=self._max_samples)
+                                ).append(latency)
+
+    def close(self):
+        """スレッドを止めて残りを届ける（終了時に呼ぶ）"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.tick_interval + 5)
+        self.flush()
+
+    def stats(self):
+        """配信の回数とトピックごとの遅延の統計を取得"""
+        with self._lock:
+            latencies = {
+                topic: sorted(samples) for topic, samples in self._latencies.items()
+            }
+            pending = sum(len(queue) for queue in self._queues.values())
+            return {
+                "published": self.published_count,
+                "delivered": self.delivered_count,
+                "coalesced": self.coalesced_count,
+                "batches": self.batch_count,
+                "errors": self.error_count,
+                "pending": pending,
+                "latency_ms": {
+                    topic: {
+                        "count": len(samples),
+                        "p50": percentile(samples, 0.50),
+                        "p95": percentile(samples, 0.95),
+                        "max": samples[-1] if samples else None,
+                    }
+                    for topic, samples in latencies.items()
+                },
+            }
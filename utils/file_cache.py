@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class FileCache:
+    """
+    画像サーバーで頻繁に読まれるファイルの内容を保持するLRUキャッシュ
+
+    取得のたびにos.statで更新日時とサイズを確認し、変わっていれば読み直す。
+    max_file_bytesより大きいファイルはキャッシュせず、呼び出し側でディスクから読む。
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_file_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # 先読みで固定されたファイル（パス → 固定している数）は追い出さない
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, stat_result=None, record_stats=True):
+        """
+        ファイルの内容を取得
+
+        Args:
+            path: ファイルのパス
+            stat_result: os.statの結果（省略時は取得する）
+            record_stats: ヒット/ミスとして数えるかどうか（先読みでは数えない）
+
+        Returns:
+            ファイルの内容（bytes）。大きすぎてキャッシュしない場合は None
+        """
+        if stat_result is None:
+            stat_result = os.stat(path)
+        if stat_result.st_size > self.max_file_bytes:
+            return None
+
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                if record_stats:
+                    self.hits += 1
+                return entry[1]
+            if record_stats:
+                self.misses += 1
+
+        with open(path, "rb") as f:
+            content = f.read()
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._total_bytes -= len(old[1])
+            self._entries[path] = (signature, content)
+            self._total_bytes += len(content)
+            self._evict_locked()
+        return content
+
+    def _evict_locked(self):
+        for path in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path in self._pins:
+                continue
+            _, evicted = self._entries.pop(path)
+            self._total_bytes -= len(evicted)
+            self.evictions += 1
+
+    def pin(self, path):
+        """
+        ファイルを読み込んでキャッシュに固定（unpinされるまで追い出さない）
+
+        Returns:
+            固定したファイルのサイズ。大きすぎる・存在しない場合は None
+        """
+        try:
+            content = self.get(path, record_stats=False)
+        except OSError:
+            return None
+        if content is None:
+            return None
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        return len(content)
+
+    def unpin(self, path):
+        """pinで固定したファイルを解放（通常のLRUに戻す）"""
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+                self._evict_locked()
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """ヒット/ミスなどの統計を取得"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "pinned": len(self._pins),
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from .playback_engine import percentile
+
+
+class FrameTelemetry:
+    """
+    レンダーウィンドウのiframeから届いたフレーム時間の集計
+
+    レーンごと・スケッチ（ブロック）ごとに直近max_framesフレームのフレーム時間を保持し、
+    FPSとパーセンタイル、フレーム落ちの数を返す。届いたバッチはそのまま
+    セッションファイル（JSON Lines）にも追記する。
+    """
+
+    def __init__(self, session_dir="data/sessions", max_frames=600):
+        self.session_dir = session_dir
+        self.max_frames = max_frames
+        self.session_path = None
+        self._session_file = None
+        # レーン / スケッチのキー → 集計中の値
+        self._lanes = {}
+        self._sketches = {}
+        # 生きているスケッチの数とJSヒープの使用量（5秒ごと、直近1時間分）
+        self._health = deque(maxlen=720)
+        self._first_health = None
+        self._lock = threading.Lock()
+
+    def _new_entry(self):
+        return {
+            "deltas": deque(maxlen=self.max_frames),
+            "dropped": deque(maxlen=self.max_frames),
+            "frame_rate": None,
+            "target_fps": None,
+            "total_frames": 0,
+            "total_dropped": 0,
+            "overflowed": 0,
+            "updated_at": None,
+        }
+
+    def record(self, batches):
+        """
+        iframeから届いたバッチを記録
+
+        Args:
+            batches: {lane, sketchKey, deltas, frameRate, targetFps, overflowed} のリスト
+                （laneは単一実行のiframeなら-1）
+        """
+        now = time.time()
+        with self._lock:
+            for batch in batches or []:
+                deltas = [float(delta) for delta in batch.get("deltas") or []]
+                target_fps = batch.get("targetFps") or 60
+                target_ms = 1000.0 / target_fps
+                # 目標の間隔の何フレーム分かかったかで、落ちたフレーム数を数える
+                dropped = [max(0, round(delta / target_ms) - 1) for delta in deltas]
+                for entry in (
+                    self._lanes.setdefault(batch.get("lane"), self._new_entry()),
+                    self._sketches.setdefault(
+                        batch.get("sketchKey"), self._new_entry()
+                    ),
+                ):
+                    entry["deltas"].extend(deltas)
+                    entry["dropped"].extend(dropped)
+                    entry["frame_rate"] = batch.get("frameRate")
+                    entry["target_fps"] = target_fps
+                    entry["total_frames"] += len(deltas)
+                    entry["total_dropped"] += sum(dropped)
+                    entry["overflowed"] += batch.get("overflowed", 0)
+                    entry["updated_at"] = now
+                self._write_session_locked(now, batch, sum(dropped))
+
+    def _write_session_locked(self, now, batch, dropped):
+        if self.session_dir is None:
+            return
+        try:
+            if self._session_file is None:
+                os.makedirs(self.session_dir, exist_ok=True)
+                self.session_path = os.path.join(
+                    self.session_dir,
+                    time.strftime("frames-%Y%m%d-%H%M%S.jsonl", time.localtime(now)),
+                )
+                self._session_file = open(self.session_path, "a", encoding="utf-8")
+            line = {
+                "time": now,
+                "lane": batch.get("lane"),
+                "sketch_key": batch.get("sketchKey"),
+                "frame_rate": batch.get("frameRate"),
+                "target_fps": batch.get("targetFps"),
+                "dropped": dropped,
+                "deltas": batch.get("deltas") or [],
+            }
+            self._session_file.write(json.dumps(line) + "\n")
+            self._session_file.flush()
+        except OSError as e:
+            print(f"Failed to write frame telemetry session: {e}")
+
+    def record_health(self, sample):
+        """
+        レンダーウィンドウの生きているスケッチの数とJSヒープの使用量を記録
+
+        Args:
+            sample: {liveFrames, iframes, instances, domIframes, budget, evicted,
+                usedHeapBytes, totalHeapBytes}（ヒープはChromium系のみ）
+        """
+        with self._lock:
+            entry = dict(sample, time=time.time())
+            if self._first_health is None:
+                self._first_health = entry
+            self._health.append(entry)
+
+    def _summarize_health_locked(self):
+        if not self._health:
+            return None
+        first = self._first_health
+        latest = self._health[-1]
+        sketches = latest.get("iframes", 0) + latest.get("instances", 0)
+        heap_growth = None
+        if "usedHeapBytes" in latest and "usedHeapBytes" in first:
+            heap_growth = latest["usedHeapBytes"] - first["usedHeapBytes"]
+        return {
+            "samples": len(self._health),
+            "first": first,
+            "latest": latest,
+            "peak_live_frames": max(
+                sample.get("liveFrames", 0) for sample in self._health
+            ),
+            "evicted": latest.get("evicted", 0),
+            # 長時間の再生でヒープが増え続けていないかの目安
+            "heap_growth_bytes": heap_growth,
+            # iframeとインスタンスモードのスケッチ1つあたりのヒープの目安
+            "bytes_per_sketch": (
+                latest["usedHeapBytes"] / sketches
+                if sketches and "usedHeapBytes" in latest
+                else None
+            ),
+        }
+
+    @staticmethod
+    def _summarize(entry):
+        deltas = sorted(entry["deltas"])
+        return {
+            "frames": len(deltas),
+            "fps": (1000.0 * len(deltas) / sum(deltas)) if sum(deltas) else None,
+            "frame_rate": entry["frame_rate"],
+            "target_fps": entry["target_fps"],
+            "p50_ms": percentile(deltas, 0.50),
+            "p95_ms": percentile(deltas, 0.95),
+            "p99_ms": percentile(deltas, 0.99),
+            "max_ms": deltas[-1] if deltas else None,
+            "dropped": sum(entry["dropped"]),
+            "total_frames": entry["total_frames"],
+            "total_dropped": entry["total_dropped"],
+            "overflowed": entry["overflowed"],
+            "updated_at": entry["updated_at"],
+        }
+
+    def get_report(self):
+        """レーンごと・スケッチごとの直近のフレーム時間の集計を取得"""
+        with self._lock:
+            return {
+                "session_path": self.session_path,
+                "lanes": {
+                    lane: self._summarize(entry) for lane, entry in self._lanes.items()
+                },
+                "sketches": {
+                    key: self._summarize(entry) for key, entry in self._sketches.items()
+                },
+                "health": self._summarize_health_locked(),
+            }
+
+    def close(self):
+        """セッションファイルを閉じる"""
+        with self._lock:
+            if self._session_file is not None:
+                self._session_file.close()
+                self._session_file = None
@@ -1,6 +1,25 @@
+import email.utils
 import os
+import re
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import urllib.parse
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from .file_cache import FileCache
+from .image_variants import ImageVariantCache, parse_variant_params
+from .p5_runtime import P5_RUNTIME_ROUTE, read_p5_runtime
+from .ui_assets import (
+    UI_ASSETS_DIR,
+    UI_ASSETS_ROUTE,
+    VIEW_DIR,
+    VIEW_ROUTE,
+    get_ui_asset_cache_control,
+)
+
+# 画像はファイル名が変わらず内容だけ変わることがあるので、毎回ETagで確認させる
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
 
 
 class ImageRequestHandler(SimpleHTTPRequestHandler):
@@ -13,13 +32,270 @@ class ImageRequestHandler(SimpleHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
         super().end_headers()
 
+    def do_GET(self):
+        if self.path.startswith(P5_RUNTIME_ROUTE):
+            self.send_p5_runtime(head_only=False)
+            return
+        if self.path.startswith((UI_ASSETS_ROUTE, VIEW_ROUTE)):
+            self.send_ui_file(head_only=False)
+            return
+        self.send_static_file(head_only=False)
+
+    def do_HEAD(self):
+        if self.path.startswith(P5_RUNTIME_ROUTE):
+            self.send_p5_runtime(head_only=True)
+            return
+        if self.path.startswith((UI_ASSETS_ROUTE, VIEW_ROUTE)):
+            self.send_ui_file(head_only=True)
+            return
+        self.send_static_file(head_only=True)
+
+    def is_not_modified(self, etag, mtime):
+        """If-None-Match / If-Modified-Since から304を返せるかどうか"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and mtime is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError):
+                return False
+            return int(mtime) <= since.timestamp()
+        return False
+
+    def parse_range(self, size, etag):
+        """
+        Rangeヘッダーを解析（単一の範囲のみ対応）
+
+        Returns:
+            (開始, 終了) のタプル。Rangeがないか解釈できない場合は None
+            （ファイル全体を返す）、開始がファイルの末尾以降の場合は "invalid"
+        """
+        range_header = self.headers.get("Range")
+        if not range_header:
+            return None
+        # If-Rangeが現在のETagと一致しない場合はファイル全体を返す
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range.strip() != etag:
+            return None
+
+        match = _RANGE_PATTERN.match(range_header.strip())
+        if not match:
+            return None
+        first, last = match.groups()
+        if first and last and int(last) < int(first):
+            # 終了が開始より前の範囲は不正な指定として無視する（RFC 9110）
+            return None
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            # bytes=-N は末尾のNバイト
+            start = max(0, size - int(last))
+            end = size - 1
+        else:
+            return None
+        if start > end or start >= size:
+            return "invalid"
+        return start, end
+
+    def send_static_file(self, head_only, path=None, cache_control=None):
+        """
+        images/以下のファイルを検証用ヘッダー付きで返す
+
+        ETag/Last-Modifiedによる304、Rangeによる部分取得に対応し、
+        小さいファイルはメモリ上のキャッシュから返す
+
+        Args:
+            head_only: ヘッダーのみ返すかどうか
+            path: 返すファイルのパス（省略時はimages/以下のリクエストされたファイル）
+            cache_control: Cache-Controlヘッダー（省略時はサーバーの設定）
+        """
+        is_image = path is None
+        if is_image:
+            path = self.translate_path(self.path)
+        elif os.path.isdir(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        if os.path.isdir(path):
+            # ディレクトリの一覧などは標準の処理に任せる
+            if head_only:
+                super().do_HEAD()
+            else:
+                super().do_GET()
+            return
+
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        # ?w=&h=&fmt= が指定されていれば縮小・再エンコードした画像を返す
+        content_type = None
+        variant_cache = getattr(self.server, "variant_cache", None)
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        variant_params = (
+            parse_variant_params(query) if variant_cache and is_image else None
+        )
+        if variant_params is not None:
+            variant = variant_cache.get_variant(path, stat_result, *variant_params)
+            if variant is not None:
+                try:
+                    stat_result = os.stat(variant[0])
+                    path, content_type = variant
+                except OSError:
+                    pass
+
+        size = stat_result.st_size
+        mtime = stat_result.st_mtime
+        etag = f'"{stat_result.st_mtime_ns:x}-{size:x}"'
+        last_modified = self.date_time_string(mtime)
+        if cache_control is None:
+            cache_control = getattr(self.server, "cache_control", DEFAULT_CACHE_CONTROL)
+
+        if self.is_not_modified(etag, mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+
+        byte_range = self.parse_range(size, etag)
+        if byte_range == "invalid":
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range if byte_range else (0, size - 1)
+        length = max(0, end - start + 1)
+        if byte_range:
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type or self.guess_type(path))
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        if head_only or length == 0:
+            return
+
+        try:
+            file_cache = getattr(self.server, "file_cache", None)
+            content = file_cache.get(path, stat_result) if file_cache else None
+            if content is not None:
+                self.wfile.write(content[start : end + 1])
+                return
+            # キャッシュしない大きいファイルはディスクから必要な範囲だけ読む
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(64 * 1024, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # 読み込み途中でiframeが破棄された場合など
+            pass
+
+    def send_ui_file(self, head_only):
+        """エディタ・トラックウィンドウのページ（/view/）とビルドしたUIのアセット（/ui/）を返す"""
+        if self.path.startswith(UI_ASSETS_ROUTE):
+            route, root = UI_ASSETS_ROUTE, UI_ASSETS_DIR
+        else:
+            route, root = VIEW_ROUTE, VIEW_DIR
+        relative_path = urllib.parse.unquote(
+            urllib.parse.urlsplit(self.path).path[len(route) :]
+        )
+        # images/と同じく、ルートの外を指す..は取り除く
+        parts = [
+            part for part in relative_path.split("/") if part not in ("", ".", "..")
+        ]
+        if not parts:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        if route == UI_ASSETS_ROUTE:
+            cache_control = get_ui_asset_cache_control("/".join(parts))
+        else:
+            # ページは編集されることがあるので毎回ETagで確認させる
+            cache_control = "no-cache"
+        self.send_static_file(
+            head_only, path=os.path.join(root, *parts), cache_control=cache_control
+        )
+
+    def send_p5_runtime(self, head_only):
+        """ローカルに配置したp5.jsを長期キャッシュ可能なヘッダー付きで返す"""
+        # /lib/p5/<version>/p5.min.js
+        parts = self.path.split("?", 1)[0][len(P5_RUNTIME_ROUTE) :].split("/")
+        runtime = None
+        if len(parts) == 2 and parts[1] == "p5.min.js":
+            runtime = read_p5_runtime(parts[0])
+        if runtime is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "p5.js runtime not found")
+            return
+
+        content, etag = runtime
+        # バージョンごとにURLが変わるので内容は不変として扱う
+        cache_control = "public, max-age=31536000, immutable"
+        if self.is_not_modified(etag, None):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/javascript; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(content)
+
+
+def start_image_server(
+    port=8080,
+    cache_control=DEFAULT_CACHE_CONTROL,
+    memory_cache_bytes=64 * 1024 * 1024,
+    variant_cache_dir="data/image_variants",
+    variant_cache_bytes=512 * 1024 * 1024,
+):
+    """
+    画像サーバーを起動
+
+    Args:
+        port: 待ち受けるポート
+        cache_control: 画像に付けるCache-Controlヘッダー
+        memory_cache_bytes: メモリ上にキャッシュするファイルの合計サイズの上限
+        variant_cache_dir: 縮小・再エンコードした画像を保存するディレクトリ
+        variant_cache_bytes: 縮小・再エンコードした画像の合計サイズの上限
 
-def start_image_server(port=8080):
-    """画像サーバーを起動"""
+    Returns:
+        起動したサーバー（失敗した場合は None）
+    """
     try:
         # 画像ディレクトリが存在しない場合は作成
         os.makedirs("images", exist_ok=True)
-        server = HTTPServer(("localhost", port), ImageRequestHandler)
+        # 複数のiframeからの同時リクエストを並行して処理する
+        server = ThreadingHTTPServer(("localhost", port), ImageRequestHandler)
+        server.cache_control = cache_control
+        server.file_cache = FileCache(max_bytes=memory_cache_bytes)
+        server.variant_cache = ImageVariantCache(
+            cache_dir=variant_cache_dir, max_bytes=variant_cache_bytes
+        )
         server_thread = threading.Thread(target=server.serve_forever, daemon=True)
         server_thread.start()
         print(f"Image server started on http://localhost:{port}")
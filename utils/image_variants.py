@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# fmtパラメータ → (Pillowの保存形式, 拡張子, Content-Type)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+}
+# 変換の対象にする元画像の拡張子
+SOURCE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
+MAX_VARIANT_SIZE = 8192
+# 元画像のハッシュを覚えておくファイルの数（画像を編集するたびに増えないよう古いものから忘れる）
+MAX_SOURCE_HASHES = 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _load_pil_image():
+    """Pillowを読み込む（起動を遅くしないよう、最初に必要になるまで読み込まない）"""
+    try:
+        from PIL import Image
+    except ImportError:  # Pillowがなければ変換せず元の画像を返す
+        return None
+    return Image
+
+
+def is_image_variant_supported() -> bool:
+    """画像の変換（Pillow）が利用できるかどうか"""
+    return _load_pil_image() is not None
+
+
+def parse_variant_params(query):
+    """
+    クエリパラメータから変換の指定を取得
+
+    Args:
+        query: urllib.parse.parse_qsの結果
+
+    Returns:
+        (幅, 高さ, 形式) のタプル。変換の指定がなければ None
+    """
+
+    def get_size(name):
+        try:
+            value = int(query.get(name, ["0"])[0])
+        except ValueError:
+            return None
+        return min(value, MAX_VARIANT_SIZE) if value > 0 else None
+
+    width = get_size("w")
+    height = get_size("h")
+    fmt = query.get("fmt", [None])[0]
+    if fmt is not None:
+        fmt = fmt.lower()
+        if fmt not in VARIANT_FORMATS:
+            fmt = None
+    if width is None and height is None and fmt is None:
+        return None
+    return width, height, fmt
+
+
+class ImageVariantCache:
+    """
+    レンダーウィンドウのサイズに合わせて縮小・再エンコードした画像のディスクキャッシュ
+
+    ファイル名は元画像の内容のハッシュと変換の指定から決まるので、元画像が
+    変わらない限り同じ変換は1回しか行わない。合計サイズがmax_bytesを超えたら
+    最後に使われた日時が古いものから削除する。
+    """
+
+    def __init__(self, cache_dir="data/image_variants", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        # (パス, 更新日時, サイズ) → 元画像の内容のハッシュ（最後に使われた順）
+        self._source_hashes = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file()
+        )
+
+    def _get_source_hash(self, path, stat_result):
+        signature = (path, stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            source_hash = self._source_hashes.get(signature)
+            if source_hash is not None:
+                self._source_hashes.move_to_end(signature)
+                return source_hash
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        source_hash = digest.hexdigest()
+        with self._lock:
+            self._source_hashes[signature] = source_hash
+            while len(self._source_hashes) > MAX_SOURCE_HASHES:
+                self._source_hashes.popitem(last=False)
+        return source_hash
+
+    def get_variant(self, source_path, stat_result, width, height, fmt):
+        """
+        変換済みの画像を取得（なければ作成）
+
+        Returns:
+            (変換済み画像のパス, Content-Type) のタプル。変換できない場合は None
+        """
+        if _load_pil_image() is None:
+            return None
+        extension = os.path.splitext(source_path)[1].lower()
+        if extension not in SOURCE_EXTENSIONS:
+            return None
+        if fmt is None:
+            fmt = "jpeg" if extension in (".jpg", ".jpeg") else "png"
+        pil_format, variant_extension, content_type = VARIANT_FORMATS[fmt]
+
+        source_hash = self._get_source_hash(source_path, stat_result)
+        key = hashlib.sha256(
+            f"{source_hash}:{width}:{height}:{pil_format}".encode("utf-8")
+        ).hexdigest()
+        variant_path = os.path.join(self.cache_dir, f"{key}.{variant_extension}")
+
+        # 同じ変換が同時に要求された場合は1回だけ変換する
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if os.path.exists(variant_path):
+                self.hits += 1
+                # 最後に使われた日時として記録（削除の順番に使う）
+                try:
+                    os.utime(
+                        variant_path, (time.time(), os.stat(variant_path).st_mtime)
+                    )
+                except OSError:
+                    pass
+            else:
+                self.misses += 1
+                if not self._create_variant(
+                    source_path, variant_path, width, height, pil_format
+                ):
+                    return None
+        return variant_path, content_type
+
+    def _create_variant(self, source_path, variant_path, width, height, pil_format):
+        Image = _load_pil_image()
+        try:
+            with Image.open(source_path) as image:
+                if getattr(image, "is_animated", False):
+                    # アニメーション画像はそのまま返す
+                    return False
+                image.load()
+                # 縦横比を保ったまま指定サイズに収まるよう縮小（拡大はしない）
+                image.thumbnail(
+                    (width or MAX_VARIANT_SIZE, height or MAX_VARIANT_SIZE),
+                    Image.LANCZOS,
+                )
+                if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+
+                fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        image.save(f, format=pil_format, quality=85)
+                    os.replace(tmp_path, variant_path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        except Exception as e:
+            print(f"Failed to create image variant for {source_path}: {e}")
+            return False
+
+        with self._lock:
+            self._total_bytes += os.path.getsize(variant_path)
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked(keep=variant_path)
+        return True
+
+    def _evict_locked(self, keep=None):
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.is_file()),
+            key=lambda entry: entry.stat().st_atime,
+        )
+        self._total_bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self):
+        """ヒット/ミスなどの統計を取得"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,48 @@
+import functools
+import re
+
+# レンダーモード（iframe: レーンごとにiframe / instance: 1つのドキュメントでp5.jsを共有）
+RENDER_MODES = ("iframe", "instance")
+
+# グローバルモードのスケッチで定義される関数（インスタンスモードではp5インスタンスに設定する）
+# レーンのiframeはpointer-events: noneでマウスやキーの入力を受けないので、
+# 入力のイベントハンドラーはインスタンスモードでも設定しない
+P5_SKETCH_HOOKS = ("preload", "setup", "draw", "windowResized")
+
+# 1つのドキュメントを共有すると他のレーンに影響する・動かなくなる書き方と、その理由
+_INSTANCE_MODE_BLOCKERS = (
+    (re.compile(r"""(["'])use strict\1"""), "strict mode"),
+    (re.compile(r"\bnew\s+p5\s*\("), "already uses instance mode"),
+    (
+        re.compile(r"\b(?:document|window|globalThis|parent|top|self)\s*[.\[]"),
+        "accesses the document directly",
+    ),
+    (re.compile(r"\beval\s*\(|\bnew\s+Function\s*\("), "evaluates code dynamically"),
+    (re.compile(r"\bimport\s*[(\s{*]"), "imports modules"),
+    (
+        re.compile(
+            r"\b(?:createCapture|createVideo|createAudio|createDiv|createP|createSpan"
+            r"|createImg|createA|createSlider|createButton|createCheckbox|createSelect"
+            r"|createRadio|createColorPicker|createInput|createFileInput|createElement"
+            r"|selectAll|select|removeElements)\s*\("
+        ),
+        "creates DOM elements",
+    ),
+)
+
+
+@functools.lru_cache(maxsize=512)
+def find_instance_mode_blocker(code: str):
+    """
+    スケッチをインスタンスモードで共有のドキュメントに描画できない理由を取得
+
+    コードを静的に調べるだけなので、構文エラーなど実行時に分かるものは
+    レンダーウィンドウ側でiframeに切り替える
+
+    Returns:
+        理由の文字列（インスタンスモードで描画できる場合は None）
+    """
+    for pattern, reason in _INSTANCE_MODE_BLOCKERS:
+        if pattern.search(code):
+            return reason
+    return None
@@ -3,8 +3,13 @@ from typing import Optional
 
 
 class MouseListenerManager:
-    def __init__(self, track_window, click_to_play_enabled):
+    def __init__(
+        self, track_window, click_to_play_enabled, event_bus=None, trigger_hub=None
+    ):
         self.track_window = track_window
+        self.event_bus = event_bus
+        # クリック・ホットキーのトリガーを渡す先（絞り込みとデバウンスもここで行う）
+        self.trigger_hub = trigger_hub
         self.click_to_play_enabled = click_to_play_enabled
         self.cmd_pressed = False
         self.ctrl_pressed = False
@@ -12,22 +17,31 @@ class MouseListenerManager:
         self.keyboard_listener = None
 
     def on_click(self, x, y, button, pressed):
-        """マウスクリックイベントハンドラー"""
-        if pressed:
-            print(f"Mouse clicked at ({x}, {y}) with {button}")
-
-            # トグルがONの時のみplayを発火
-            if self.click_to_play_enabled:
-                print(f"Click to play enabled! Triggering play...")
-                if self.track_window:
-                    # トラックウィンドウにplayコマンドを送信（delay処理はJavaScript側で行う）
-                    self.track_window.evaluate_js("playCurrentTrack()")
-            else:
-                print(f"Click to play disabled - ignoring click")
+        """マウスクリックイベントハンドラー（pynputのスレッドで呼ばれるので重い処理はしない）"""
+        # トグルがONの時のみplayを発火
+        if not pressed or not self.click_to_play_enabled:
+            return
+        if self.trigger_hub is not None:
+            # ボタン・範囲の絞り込みとデバウンスはTriggerHubのスレッドで行う
+            self.trigger_hub.offer(
+                "click", x=x, y=y, button=getattr(button, "name", str(button))
+            )
+        elif self.event_bus is not None:
+            # トラックウィンドウにplayコマンドを送信
+            self.event_bus.publish("play_current_track")
+        elif self.track_window:
+            self.track_window.evaluate_js("playCurrentTrack()")
 
     def on_key_press(self, key, render_window=None, editor_window=None):
         """キー押下イベントハンドラー"""
         try:
+            # 再生・停止のホットキー
+            if self.trigger_hub is not None:
+                key_name = getattr(key, "name", None) or getattr(key, "char", None)
+                if key_name and self.trigger_hub.matches_hotkey(key_name):
+                    self.trigger_hub.offer("hotkey", key=key_name)
+                    return
+
             # Ctrlキーの押下を検出
             if hasattr(key, "name") and key.name == "cmd":
                 self.cmd_pressed = True
@@ -0,0 +1,180 @@
+import socket
+import struct
+import threading
+import time
+
+# OSCを受け付けるアドレス（外部から操作されないようにローカルのみ）
+DEFAULT_OSC_HOST = "127.0.0.1"
+DEFAULT_OSC_PORT = 9000
+# UDPの1パケットの最大サイズ
+MAX_OSC_PACKET_SIZE = 65507
+# 停止の確認の間隔（秒）
+OSC_POLL_INTERVAL = 0.5
+
+
+def _read_osc_string(data, offset):
+    """OSCの文字列（NUL終端、4バイト境界まで埋める）を読み、値と次の位置を返す"""
+    end = data.index(b"\0", offset)
+    value = data[offset:end].decode("utf-8", errors="replace")
+    return value, (end + 4) & ~3
+
+
+def _pad_osc_string(value):
+    data = value.encode("utf-8") + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+
+def parse_osc_packet(data):
+    """
+    OSCのパケットからメッセージを取り出す（バンドルは中のメッセージを展開する）
+
+    引数は int32 / float32 / 文字列 / True / False のみ解釈し、
+    それ以外の型が出てきたら以降の引数は読まない
+
+    Args:
+        data: 受信したパケットのバイト列
+
+    Returns:
+        (アドレス, 引数のリスト) のリスト
+    """
+    if data.startswith(b"#bundle\0"):
+        messages = []
+        # "#bundle" の後の8バイトはタイムタグ（受信時にすぐ処理するので使わない）
+        offset = 16
+        while offset + 4 <= len(data):
+            (size,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            if size <= 0 or offset + size > len(data):
+                raise ValueError("Malformed OSC bundle")
+            messages.extend(parse_osc_packet(data[offset : offset + size]))
+            offset += size
+        return messages
+
+    address, offset = _read_osc_string(data, 0)
+    if not address.startswith("/"):
+        raise ValueError(f"Invalid OSC address: {address!r}")
+    args = []
+    if data[offset : offset + 1] == b",":
+        type_tags, offset = _read_osc_string(data, offset)
+        for tag in type_tags[1:]:
+            if tag == "i":
+                (value,) = struct.unpack_from(">i", data, offset)
+                offset += 4
+            elif tag == "f":
+                (value,) = struct.unpack_from(">f", data, offset)
+                offset += 4
+            elif tag == "s":
+                value, offset = _read_osc_string(data, offset)
+            elif tag in ("T", "F"):
+                value = tag == "T"
+            else:
+                break
+            args.append(value)
+    return [(address, args)]
+
+
+def build_osc_message(address, *args):
+    """
+    OSCのメッセージを作成（動作確認やループバックでの送信用）
+
+    Args:
+        address: "/"から始まるアドレス
+        *args: int / float / str / bool の引数
+
+    Returns:
+        送信できるバイト列
+    """
+    type_tags = ","
+    payload = b""
+    for arg in args:
+        if isinstance(arg, bool):
+            type_tags += "T" if arg else "F"
+        elif isinstance(arg, int):
+            type_tags += "i"
+            payload += struct.pack(">i", arg)
+        elif isinstance(arg, float):
+            type_tags += "f"
+            payload += struct.pack(">f", arg)
+        elif isinstance(arg, str):
+            type_tags += "s"
+            payload += _pad_osc_string(arg)
+        else:
+            raise TypeError(f"Unsupported OSC argument: {arg!r}")
+    return _pad_osc_string(address) + _pad_osc_string(type_tags) + payload
+
+
+def send_osc_message(address, *args, port=DEFAULT_OSC_PORT, host=DEFAULT_OSC_HOST):
+    """OSCのメッセージをUDPで1回送信"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(build_osc_message(address, *args), (host, port))
+
+
+class OscListener:
+    """
+    ローカルのUDPポートでOSCのメッセージを受信するスレッド
+
+    受信した時刻（time.monotonic_ns）はパケットを受け取った直後に記録し、
+    メッセージごとに handler(アドレス, 引数のリスト, 受信時刻) を呼ぶ。
+    handlerは受信のスレッドで呼ばれるので、重い処理はキューに渡すこと。
+    """
+
+    def __init__(self, handler, port=DEFAULT_OSC_PORT, host=DEFAULT_OSC_HOST):
+        self.handler = handler
+        self.port = port
+        self.host = host
+        self.received_count = 0
+        self.error_count = 0
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        """ソケットを開いて受信を開始（ポートを開けない場合はOSErrorを送出）"""
+        if self._thread is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind((self.host, self.port))
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(OSC_POLL_INTERVAL)
+        # port=0の場合はOSが割り当てたポートを使う
+        self.port = sock.getsockname()[1]
+        self._socket = sock
+        self._thread = threading.Thread(
+            target=self._run, name="OscListener", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        sock = self._socket
+        while self._socket is sock:
+            try:
+                data, _ = sock.recvfrom(MAX_OSC_PACKET_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                # close()でソケットが閉じられた
+                break
+            received_ns = time.monotonic_ns()
+            try:
+                messages = parse_osc_packet(data)
+            except (ValueError, struct.error) as e:
+                self.error_count += 1
+                print(f"Ignoring malformed OSC packet: {e}")
+                continue
+            for address, args in messages:
+                self.received_count += 1
+                try:
+                    self.handler(address, args, received_ns)
+                except Exception as e:
+                    print(f"Error handling OSC message {address}: {e}")
+
+    def close(self):
+        """受信を停止してソケットを閉じる"""
+        sock, self._socket = self._socket, None
+        if self._thread is not None:
+            self._thread.join(timeout=OSC_POLL_INTERVAL + 1.0)
+            self._thread = None
+        if sock is not None:
+            sock.close()
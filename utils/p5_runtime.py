@@ -0,0 +1,96 @@
+import hashlib
+import os
+import re
+import threading
+
+DEFAULT_P5_VERSION = "1.9.2"
+P5_RUNTIME_DIR = "vendor/p5"
+P5_RUNTIME_ROUTE = "/lib/p5/"
+P5_CDN_URL = "https://cdn.jsdelivr.net/npm/p5@{version}/lib/p5.min.js"
+
+_VERSION_PATTERN = re.compile(r"^\d+\.\d+\.\d+$")
+_runtime_cache = {}
+_runtime_lock = threading.Lock()
+
+
+def is_valid_p5_version(version) -> bool:
+    """p5.jsのバージョン文字列（例: 1.9.2）として妥当かどうか"""
+    return isinstance(version, str) and bool(_VERSION_PATTERN.match(version))
+
+
+def get_p5_runtime_path(version: str) -> str:
+    """ローカルに配置するp5.min.jsのパスを取得"""
+    return os.path.join(P5_RUNTIME_DIR, version, "p5.min.js")
+
+
+def get_p5_runtime_url(version: str, port: int = None) -> str:
+    """
+    iframeから参照するp5.jsのURLを取得
+
+    ローカルに配置済みで画像サーバーが起動していれば（portがNoneでなければ）
+    画像サーバー経由のURL、それ以外はCDNのURLを返す
+    """
+    if port is not None and os.path.exists(get_p5_runtime_path(version)):
+        return f"http://localhost:{port}{P5_RUNTIME_ROUTE}{version}/p5.min.js"
+    return P5_CDN_URL.format(version=version)
+
+
+def ensure_p5_runtime(version: str) -> bool:
+    """
+    指定バージョンのp5.min.jsがなければCDNから一度だけ取得して配置
+
+    URLが途中で変わらないよう、p5.jsのURLを使う前に呼び出して完了を待つこと
+    """
+    if not is_valid_p5_version(version):
+        print(f"Invalid p5.js version: {version}")
+        return False
+
+    path = get_p5_runtime_path(version)
+    if os.path.exists(path):
+        return True
+
+    try:
+        url = P5_CDN_URL.format(version=version)
+        print(f"Downloading p5.js {version} from {url}...")
+        # ダウンロードは初回だけなので、起動時にはsslなどを読み込まない
+        import urllib.request
+
+        with urllib.request.urlopen(url, timeout=30) as response:
+            content = response.read()
+        # 途中で失敗しても空のディレクトリや壊れたファイルが残らないよう、
+        # 取得できてからディレクトリを作り、一時ファイル経由で配置
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        print(f"p5.js {version} saved to {path}")
+        return True
+    except Exception as e:
+        print(f"Failed to download p5.js {version}: {e}")
+        return False
+
+
+def read_p5_runtime(version: str):
+    """
+    ローカルのp5.min.jsを読み込み（内容とETagをメモリにキャッシュ）
+
+    Returns:
+        (内容, ETag) のタプル。存在しない場合は None
+    """
+    if not is_valid_p5_version(version):
+        return None
+
+    with _runtime_lock:
+        cached = _runtime_cache.get(version)
+        if cached is not None:
+            return cached
+
+        path = get_p5_runtime_path(version)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            content = f.read()
+        etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+        _runtime_cache[version] = (content, etag)
+        return content, etag
@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def atomic_write_json(path, data, indent=2):
+    """
+    JSONを一時ファイルに書き出してからリネームで置き換える
+
+    書き込み途中でクラッシュしても元のファイルが壊れないようにする
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # リネーム自体も永続化されるようにディレクトリもfsync（対応していないOSは無視）
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+
+class WriteBehindWriter:
+    """
+    変更されたファイルをバックグラウンドスレッドでまとめて書き出す
+
+    mark_dirty()は印を付けるだけなので呼び出し側はブロックしない。
+    flush_interval秒の間に来た変更は1回の書き込みにまとめられる。
+    """
+
+    def __init__(self, flush_interval=0.5):
+        self.flush_interval = flush_interval
+        self.flush_count = 0
+        self.error_count = 0
+        self.total_flush_ms = 0.0
+        self.last_flush_ms = 0.0
+        self._snapshot_funcs = {}
+        self._write_funcs = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def register(self, path, snapshot_func, write_func=None):
+        """
+        書き出し対象のファイルと、保存する内容を返す関数を登録
+
+        write_funcを指定した場合はJSONファイルの代わりにwrite_func(内容)で保存する
+        """
+        self._snapshot_funcs[path] = snapshot_func
+        if write_func is not None:
+            self._write_funcs[path] = write_func
+
+    def start(self):
+        """バックグラウンドの書き出しスレッドを開始"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, path):
+        """ファイルに変更があったことを記録（実際の書き込みは後で行われる）"""
+        with self._lock:
+            self._dirty.add(path)
+        if self._thread is None or self._closed:
+            # スレッドが動いていない場合はその場で書き出す
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait()
+            if self._closed:
+                break
+            # 短時間に続く変更をまとめるため少し待ってから書き出す
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """dirtyなファイルをすべて書き出す"""
+        with self._flush_lock:
+            with self._lock:
+                paths = list(self._dirty)
+                self._dirty.clear()
+
+            for path in paths:
+                started = time.perf_counter()
+                try:
+                    data = self._snapshot_funcs[path]()
+                    write_func = self._write_funcs.get(path)
+                    if write_func is not None:
+                        write_func(data)
+                    else:
+                        atomic_write_json(path, data)
+                except Exception as e:
+                    print(f"Error saving {path}:", e)
+                    self.error_count += 1
+                    # 次回の書き出しで再試行
+                    with self._lock:
+                        self._dirty.add(path)
+                    self._wakeup.set()
+                    continue
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.flush_count += 1
+                self.total_flush_ms += elapsed_ms
+                self.last_flush_ms = elapsed_ms
+
+    def close(self):
+        """スレッドを止めて残りを書き出す（終了時に呼ぶ）"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        """書き出し回数と所要時間の統計を取得"""
+        with self._lock:
+            pending = len(self._dirty)
+        return {
+            "flush_count": self.flush_count,
+            "error_count": self.error_count,
+            "total_flush_ms": self.total_flush_ms,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": (
+                self.total_flush_ms / self.flush_count if self.flush_count else 0.0
+            ),
+            "pending": pending,
+        }
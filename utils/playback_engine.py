@@ -0,0 +1,326 @@
+import heapq
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+# デッドライン直前はsleepせずに待つ（OSのスリープ粒度による遅れを避ける）
+SPIN_THRESHOLD_NS = 2_000_000
+# stop()で再生エンジンのスレッドが停止を受け付けるまで待つ最大の時間（秒）
+STOP_ACK_TIMEOUT = 1.0
+
+
+def percentile(sorted_values, ratio):
+    """ソート済みの値から指定割合のパーセンタイルを取得"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(ratio * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def build_timeline(lanes, start_indexes=None, prewarm_lead_ms=0, prefetch_horizon_ms=0):
+    """
+    レーンごとのブロック列から再生イベントの一覧を作成
+
+    Args:
+        lanes: レーンごとのブロックのリスト（各ブロックは duration(ms) を持つ）
+        start_indexes: レーンごとの再生開始ブロックのインデックス
+        prewarm_lead_ms: ブロック開始の何ms前に先読みするか（0なら先読みしない）
+        prefetch_horizon_ms: ブロック開始の何ms前にアセットを読み込むか
+            （0ならアセットの読み込み・解放のイベントを作らない）
+
+    Returns:
+        (再生開始からのオフセット(ns), イベント) のリスト
+    """
+    events = []
+    for lane_index, lane_blocks in enumerate(lanes):
+        if not lane_blocks:
+            continue
+        start_index = 0
+        if start_indexes and lane_index < len(start_indexes):
+            candidate = start_indexes[lane_index]
+            if isinstance(candidate, int) and 0 <= candidate < len(lane_blocks):
+                start_index = candidate
+
+        offset_ms = 0
+        previous_offset_ms = 0
+        for block_index in range(start_index, len(lane_blocks)):
+            block = lane_blocks[block_index]
+            if prefetch_horizon_ms > 0:
+                # アセットはiframeの先読みより早く、開始前に余裕をもって読み込む
+                events.append(
+                    (
+                        int(max(0, offset_ms - prefetch_horizon_ms) * 1_000_000),
+                        {
+                            "kind": "prefetch",
+                            "lane_index": lane_index,
+                            "block_index": block_index,
+                            "block": block,
+                        },
+                    )
+                )
+            if prewarm_lead_ms > 0 and block_index > start_index:
+                # 先読みはレーンごとに1つなので、直前のブロックの開始より前にはしない
+                prewarm_ms = max(previous_offset_ms, offset_ms - prewarm_lead_ms)
+                events.append(
+                    (
+                        int(prewarm_ms * 1_000_000),
+                        {
+                            "kind": "prewarm",
+                            "lane_index": lane_index,
+                            "block_index": block_index,
+                            "block": block,
+                        },
+                    )
+                )
+            events.append(
+                (
+                    int(offset_ms * 1_000_000),
+                    {
+                        "kind": "start",
+                        "lane_index": lane_index,
+                        "block_index": block_index,
+                        "block": block,
+                    },
+                )
+            )
+            previous_offset_ms = offset_ms
+            offset_ms += block.get("duration", 0)
+            if prefetch_horizon_ms > 0:
+                # ブロックが終わったらアセットを解放
+                events.append(
+                    (
+                        int(offset_ms * 1_000_000),
+                        {
+                            "kind": "release",
+                            "lane_index": lane_index,
+                            "block_index": block_index,
+                        },
+                    )
+                )
+
+        events.append(
+            (
+                int(offset_ms * 1_000_000),
+                {"kind": "end", "lane_index": lane_index},
+            )
+        )
+    return events
+
+
+class PlaybackEngine:
+    """
+    time.monotonic_ns の絶対時刻でレーンの切り替えを発火する再生エンジン
+
+    タイムラインは再生開始時刻を基準とした絶対デッドラインで保持するので、
+    処理の遅れが後続のイベントに累積しない。同じ時刻に来たイベントはまとめて
+    dispatch_funcに渡され、各イベントの遅れ（lateness）を記録する。
+
+    外部のテンポに合わせる場合はイベントを拍の位置で保持し、デッドラインは
+    毎回拍の時計（TempoFollower）から求める。テンポや位相が補正されたら
+    retime()で待ち時間を計算し直すだけで、タイムラインは作り直さない。
+
+    is_playingはstart()・stop()を呼んだスレッドですぐに変わる。再生ごとの番号
+    （_run_id）が変わったら、エンジンのスレッドは古い再生のイベントを発火しない。
+    """
+
+    def __init__(self, dispatch_func, max_records=100000):
+        self.dispatch = dispatch_func
+        self.records = deque(maxlen=max_records)
+        self.is_playing = False
+        self._commands = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._run_id = 0
+
+    def start(self, timeline, delay_ms=0, requested_ns=None, tempo=None):
+        """
+        タイムラインの再生を開始（delay_ms後に最初のイベント）
+
+        Args:
+            timeline: build_timelineで作成したイベントの一覧
+            delay_ms: 再生開始から最初のイベントまでの時間
+            requested_ns: 再生開始の基準にするtime.monotonic_nsの時刻
+                （トリガーを受けた時刻など。省略時は現在時刻）
+            tempo: 外部のテンポに合わせる場合は (拍の時計, タイムラインの1拍のms,
+                再生開始を揃える拍の数)。拍の時計は beat_to_ns / ns_to_beat と
+                小節の頭の拍 bar_origin を持つ
+        """
+        if requested_ns is None:
+            requested_ns = time.monotonic_ns()
+        self._ensure_thread()
+        with self._lock:
+            self._run_id += 1
+            self.is_playing = bool(timeline)
+            self._commands.put(
+                ("start", self._run_id, timeline, delay_ms, requested_ns, tempo)
+            )
+
+    def retime(self):
+        """拍の時計が補正されたので次のデッドラインを計算し直す（再生中のみ）"""
+        if self.is_playing:
+            self._commands.put(("retime",))
+
+    def stop(self):
+        """
+        再生を停止（未発火のイベントは破棄）
+
+        エンジンのスレッドが停止を受け付けるまで待つので、戻った後に
+        レンダーウィンドウをクリアしても停止前のイベントで描画し直されない
+        """
+        self._ensure_thread()
+        acknowledged = threading.Event()
+        with self._lock:
+            self._run_id += 1
+            self.is_playing = False
+            self._commands.put(("stop", acknowledged))
+        # 発火中のイベントから呼ばれた場合は待たない（待つと自分の処理を待ち続ける）
+        if threading.current_thread() is not self._thread:
+            acknowledged.wait(STOP_ACK_TIMEOUT)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _get_deadline_func(delay_ms, requested_ns, tempo):
+        """タイムライン上のオフセット(ns)からデッドライン(ns)を求める関数を作成"""
+        base_ns = requested_ns + int(delay_ms * 1_000_000)
+        if tempo is None:
+            return lambda offset_ns: base_ns + offset_ns
+
+        clock, beat_ms, quantize_beats = tempo
+        ns_per_beat = beat_ms * 1_000_000
+        start_beat = clock.ns_to_beat(base_ns)
+        if quantize_beats:
+            # 小節の頭（または指定した拍数の区切り）まで待って開始
+            origin = clock.bar_origin
+            start_beat = origin + quantize_beats * math.ceil(
+                (start_beat - origin) / quantize_beats - 1e-6
+            )
+        return lambda offset_ns: clock.beat_to_ns(start_beat + offset_ns / ns_per_beat)
+
+    def _finish_run(self, run_id):
+        """再生が最後まで進んだら停止状態にする（停止・再開始された後ならFalse）"""
+        with self._lock:
+            if run_id != self._run_id or not self.is_playing:
+                return False
+            self.is_playing = False
+            return True
+
+    def _run(self):
+        # (タイムライン上のオフセット(ns), 順番, イベント) のヒープ
+        pending = []
+        sequence = 0
+        deadline_of = None
+        run_id = None
+        while True:
+            # 次のデッドラインの少し前まではコマンドを待ちながらスリープ
+            timeout = None
+            if pending:
+                remaining_ns = deadline_of(pending[0][0]) - time.monotonic_ns()
+                timeout = max(0, remaining_ns - SPIN_THRESHOLD_NS) / 1_000_000_000
+
+            try:
+                command = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                if command[0] == "start":
+                    _, run_id, timeline, delay_ms, requested_ns, tempo = command
+                    try:
+                        deadline_of = self._get_deadline_func(
+                            delay_ms, requested_ns, tempo
+                        )
+                    except Exception as e:
+                        print(f"Tempo sync unavailable, using fixed timing: {e}")
+                        deadline_of = self._get_deadline_func(
+                            delay_ms, requested_ns, None
+                        )
+                    pending = []
+                    for offset_ns, event in timeline:
+                        heapq.heappush(pending, (offset_ns, sequence, event))
+                        sequence += 1
+                    self.records.clear()
+                elif command[0] == "stop":
+                    pending = []
+                    command[1].set()
+                continue
+
+            if not pending:
+                continue
+
+            # 残りはビジーウェイトでデッドラインぴったりまで待つ
+            # （テンポに合わせている場合は待っている間の補正も反映する）
+            # テンポが遅くなってデッドラインが先に延びた場合は、ここで回り続けずに
+            # 最初のデッドラインからSPIN_THRESHOLD_NSまでで切り上げ、コマンドを待つところに戻る
+            now_ns = time.monotonic_ns()
+            deadline_ns = deadline_of(pending[0][0])
+            if deadline_ns - now_ns > SPIN_THRESHOLD_NS:
+                continue
+            spin_until_ns = deadline_ns + SPIN_THRESHOLD_NS
+            while now_ns < deadline_of(pending[0][0]) and now_ns < spin_until_ns:
+                time.sleep(0)
+                now_ns = time.monotonic_ns()
+            if now_ns < deadline_of(pending[0][0]):
+                continue
+
+            # 停止・再開始された後は古い再生のイベントを発火しない
+            # （キューに積まれた停止・開始のコマンドで破棄される）
+            if run_id != self._run_id:
+                continue
+
+            # デッドラインを過ぎたイベントをまとめて1回で発火
+            now_ns = time.monotonic_ns()
+            due = []
+            while pending and deadline_of(pending[0][0]) <= now_ns:
+                offset_ns, _, event = heapq.heappop(pending)
+                due.append((deadline_of(offset_ns), event))
+
+            dispatched_ns = time.monotonic_ns()
+            try:
+                self.dispatch(
+                    [dict(event, deadline_ns=deadline_ns) for deadline_ns, event in due]
+                )
+            except Exception as e:
+                print(f"Error dispatching playback events: {e}")
+            dispatch_ms = (time.monotonic_ns() - dispatched_ns) / 1_000_000
+            for deadline_ns, event in due:
+                self.records.append(
+                    {
+                        "kind": event["kind"],
+                        "lane_index": event["lane_index"],
+                        "block_index": event.get("block_index"),
+                        "lateness_ms": (dispatched_ns - deadline_ns) / 1_000_000,
+                        "dispatch_ms": dispatch_ms,
+                    }
+                )
+
+            if not pending and self._finish_run(run_id):
+                try:
+                    self.dispatch([{"kind": "finished", "lane_index": None}])
+                except Exception as e:
+                    print(f"Error dispatching playback finished: {e}")
+
+    def get_report(self):
+        """イベント種別ごとの遅れ（ms）の集計を取得"""
+        records = list(self.records)
+        report = {"is_playing": self.is_playing, "event_count": len(records)}
+        for kind in ("start", "prewarm", "end"):
+            lateness = sorted(r["lateness_ms"] for r in records if r["kind"] == kind)
+            if not lateness:
+                continue
+            report[kind] = {
+                "count": len(lateness),
+                "mean_ms": sum(lateness) / len(lateness),
+                "p50_ms": percentile(lateness, 0.50),
+                "p95_ms": percentile(lateness, 0.95),
+                "p99_ms": percentile(lateness, 0.99),
+                "max_ms": lateness[-1],
+            }
+        report["events"] = records[-200:]
+        return report
@@ -0,0 +1,144 @@
+from .render_utils import (
+    create_clear_all_lanes_js,
+    create_clear_specific_lane_js,
+    create_clear_single_iframe_js,
+    create_set_frame_budget_js,
+)
+
+
+class RenderTransaction:
+    """
+    レンダーウィンドウへの操作（クリア・レーン切り替え・先読み）をまとめて
+    1つのスクリプトとして1回のevaluate_jsで実行するトランザクション
+
+    同じトランザクション内のレーン切り替えは、全iframeの準備ができてから
+    同じアニメーションフレームで一斉に表示が切り替わる。
+    """
+
+    def __init__(self, render_window, player):
+        self.render_window = render_window
+        self.player = player
+        # (JavaScriptコード, トランザクションの変数を参照するか) のリスト
+        self.fragments = []
+        self.swap_count = 0
+        # 先読みやインスタンスモードで切り替えられなかった場合のための
+        # (コード, 切り替えのID, インスタンスモードを使うか)
+        self.fallback_switches = {}
+        # 所要時間を計測する切り替えのID
+        self.switch_ids = []
+
+    def clear_all_lanes(self):
+        """全レーンのiframeをクリア"""
+        self.fragments.append((create_clear_all_lanes_js(), False))
+        self.player.prewarmed_lanes.clear()
+        return self
+
+    def clear_lane(self, lane_index):
+        """特定のレーンのiframeをクリア"""
+        self.fragments.append((create_clear_specific_lane_js(lane_index), False))
+        self.player.prewarmed_lanes.pop(lane_index, None)
+        return self
+
+    def clear_single_iframe(self):
+        """エディタの単一iframeをクリア"""
+        self.fragments.append((create_clear_single_iframe_js(), False))
+        return self
+
+    def set_frame_budget(self, budget):
+        """同時に存在できるスケッチの上限を変更"""
+        self.fragments.append((create_set_frame_budget_js(budget), False))
+        return self
+
+    def prewarm_lane(self, lane_index, code):
+        """レーンの次のブロックを非表示・停止状態で先読み"""
+        if self.player.can_use_instance_mode(code):
+            script = self.player.compile_instance_prewarm(code, lane_index)
+        else:
+            script = self.player.compile_prewarm(code, lane_index)
+        self.fragments.append((script, False))
+        self.player.prewarmed_lanes[lane_index] = self.player.get_sketch_key(code)
+        return self
+
+    def switch_lane(self, lane_index, code, switch_id=None, allow_instance=True):
+        """
+        レーンのスケッチを切り替え（先読み済みなら表示の切り替えのみ）
+
+        switch_idを指定すると、レンダーウィンドウ側で各段階の時刻を記録する。
+        allow_instanceがFalseならインスタンスモードでもiframeで切り替える
+        """
+        self.swap_count += 1
+        if switch_id is not None:
+            self.switch_ids.append(switch_id)
+            self.fragments.append(
+                (f'window.__p5BeginSwitch({lane_index}, "{switch_id}");', True)
+            )
+        sketch_key = self.player.prewarmed_lanes.pop(lane_index, None)
+        if sketch_key is not None and sketch_key == self.player.get_sketch_key(code):
+            self.fallback_switches[lane_index] = (code, switch_id, allow_instance)
+            self.fragments.append(
+                (
+                    f"""
+        if (!window.activatePrewarmedLane({lane_index}, "{sketch_key}")) {{
+            window.__p5CancelSwap(tx);
+            failedLanes.push({lane_index});
+        }}
+        """,
+                    True,
+                )
+            )
+        elif allow_instance and self.player.can_use_instance_mode(code):
+            # 共有のドキュメントで実行できなかった場合はiframeで再実行する
+            self.fallback_switches[lane_index] = (code, switch_id, False)
+            self.fragments.append(
+                (self.player.compile_instance_lane_switch(code, lane_index), True)
+            )
+        else:
+            self.fragments.append(
+                (self.player.compile_lane_switch(code, lane_index), False)
+            )
+        return self
+
+    def show_single(self, code):
+        """エディタからの単一コード実行用のiframeを表示"""
+        self.fragments.append((self.player.compile_single(code), False))
+        return self
+
+    def build(self) -> str:
+        """まとめたスクリプトを生成（先読みの切り替えに失敗したレーンの配列を返す）"""
+        body = []
+        for fragment, uses_transaction in self.fragments:
+            if uses_transaction:
+                body.append(fragment)
+            else:
+                # 各断片の変数が衝突しないように関数スコープで囲む
+                body.append(f"(function() {{\n{fragment}\n}})();")
+        return (
+            "(function() {\n"
+            f"    const tx = window.__p5BeginTransaction({self.swap_count});\n"
+            "    const failedLanes = [];\n"
+            "    try {\n" + "\n".join(body) + "\n    } finally {\n"
+            "        window.__p5EndTransaction(tx);\n"
+            "    }\n"
+            "    return failedLanes;\n"
+            "})()"
+        )
+
+    def commit(self):
+        """1回のevaluate_jsで実行"""
+        if not self.fragments or not self.render_window:
+            return None
+        script = self.build()
+        for switch_id in self.switch_ids:
+            self.player.switch_latency.mark(switch_id, "eval_start")
+        failed_lanes = self.render_window.evaluate_js(script)
+
+        # 先読み済みのiframeが見つからなかった・インスタンスモードで実行できなかった
+        # レーンは通常の切り替えで再実行
+        if failed_lanes:
+            retry = RenderTransaction(self.render_window, self.player)
+            for lane_index in failed_lanes:
+                fallback = self.fallback_switches.get(lane_index)
+                if fallback is not None:
+                    retry.switch_lane(lane_index, *fallback)
+            retry.commit()
+        return failed_lanes
@@ -1,41 +1,390 @@
-def create_smooth_lane_switch_js(lane_index: int, escaped_code: str) -> str:
+import json
+import re
+
+from .assets import P5_ASSET_LOADERS
+from .instance_mode import P5_SKETCH_HOOKS
+
+# テンプレートを変更したら上げる（コンパイルキャッシュのキーに含まれる）
+TEMPLATE_VERSION = 9
+
+# レンダーウィンドウに同時に存在できるスケッチの要素の数（8レーン × 表示中・表示前・先読み・フェードアウト中）
+DEFAULT_LIVE_FRAME_BUDGET = 32
+
+# loadImage("images/xxx.png") のパス部分（クエリが付いていないもの）
+_IMAGE_PATH_PATTERN = re.compile(r"""loadImage\((["'])images(/[^"'?]*)\1""")
+
+
+def escape_template_literal(text: str) -> str:
+    """JavaScriptのテンプレートリテラルに埋め込めるようにエスケープ"""
+    # バッククォートとバックスラッシュをエスケープ
+    escaped = text.replace("\\", "\\\\")
+    escaped = escaped.replace("`", "\\`")
+    escaped = escaped.replace("$", "\\$")
+    return escaped
+
+
+def escape_sketch_code(code: str, image_server_port: int, image_query: str = "") -> str:
     """
-    レーンのスムーズな切り替えを行うJavaScriptコードを生成
+    p5.jsコードをテンプレートリテラルに埋め込めるようにエスケープ
 
     Args:
-        lane_index: レーンのインデックス
-        escaped_code: エスケープされたp5.jsコード
+        code: p5.jsコード
+        image_server_port: 画像サーバーのポート番号
+        image_query: loadImage("images/...")のURLに付けるクエリ（例: ?w=1000&h=1000）
+
+    Returns:
+        エスケープされたp5.jsコード
+    """
+    escaped_code = escape_template_literal(code)
+    if image_query:
+        # レンダーウィンドウのサイズに合わせた画像を画像サーバーに要求
+        escaped_code = _IMAGE_PATH_PATTERN.sub(
+            lambda match: f"loadImage({match.group(1)}http://localhost:"
+            f"{image_server_port}{match.group(2)}{image_query}{match.group(1)}",
+            escaped_code,
+        )
+    # ダブルクォートとシングルクォートの両方に対応
+    escaped_code = escaped_code.replace(
+        'loadImage("images',
+        f'loadImage("http://localhost:{image_server_port}',
+    )
+    escaped_code = escaped_code.replace(
+        "loadImage('images",
+        f"loadImage('http://localhost:{image_server_port}",
+    )
+    return escaped_code
+
+
+# p5.jsのローダーに渡された相対パスを画像サーバーのURLに変換し、
+# 読み込みにかかった時間を親ウィンドウに報告するスクリプト
+ASSET_RESOLVER_JS = """
+          (function(target) {
+            const baseUrl = __BASE_URL__;
+            const imageQuery = __IMAGE_QUERY__;
+            const sketchKey = __SKETCH_KEY__;
+            const loaders = __LOADERS__;
+            const assetPaths = __ASSET_PATHS__;
+            // 書き出したショーでは、親ウィンドウに埋め込まれたアセット（blob:のURL）を使う
+            let embeddedAssets = null;
+            try {
+              embeddedAssets = window.parent.__p5EmbeddedAssets || null;
+            } catch (e) {
+              embeddedAssets = null;
+            }
+
+            function resolveAssetUrl(path, isImage) {
+              if (typeof path !== "string" || path === "" ||
+                  path.indexOf("//") === 0 || /^[a-z]+:/i.test(path)) {
+                return path;
+              }
+              // 画像サーバーはimages/をルートとして配信する
+              let serverPath = path.replace(/^[.]?[/]/, "");
+              if (serverPath.indexOf("images/") === 0) {
+                serverPath = serverPath.slice("images/".length);
+              }
+              if (embeddedAssets && embeddedAssets[serverPath]) {
+                return embeddedAssets[serverPath];
+              }
+              let url = baseUrl + encodeURI(serverPath);
+              if (isImage && imageQuery && serverPath.indexOf("?") < 0) {
+                url += imageQuery;
+              }
+              return url;
+            }
+            window.__p5ResolveAssetUrl = resolveAssetUrl;
+
+            const timings = [];
+            let flushTimer = null;
+            function recordTiming(loader, url, startedAt, ok) {
+              timings.push({
+                loader: loader,
+                url: String(url),
+                ms: performance.now() - startedAt,
+                ok: ok,
+              });
+              if (flushTimer === null) {
+                flushTimer = setTimeout(function() {
+                  flushTimer = null;
+                  window.parent.postMessage({
+                    source: "p5-player",
+                    type: "asset-timings",
+                    sketchKey: sketchKey,
+                    entries: timings.splice(0),
+                  }, "*");
+                }, 250);
+              }
+            }
+
+            loaders.forEach(function(name) {
+              const original = target[name];
+              if (typeof original !== "function") {
+                return;
+              }
+              target[name] = function() {
+                const args = Array.prototype.slice.call(arguments);
+                args[0] = resolveAssetUrl(args[0], name === "loadImage");
+                if (name === "loadShader") {
+                  args[1] = resolveAssetUrl(args[1], false);
+                }
+                const url = args[0];
+                const startedAt = performance.now();
+                let settled = false;
+                function settle(ok) {
+                  if (!settled) {
+                    settled = true;
+                    recordTiming(name, url, startedAt, ok);
+                  }
+                }
+                function onFailure(error) {
+                  settle(false);
+                  console.error(name + " failed: " + url, error);
+                }
+
+                // 成功/失敗のコールバックを包んで完了時刻を記録（なければ追加）
+                const callbackIndexes = [];
+                args.forEach(function(arg, index) {
+                  if (typeof arg === "function") {
+                    callbackIndexes.push(index);
+                  }
+                });
+                if (callbackIndexes.length === 0) {
+                  args.push(function() { settle(true); }, onFailure);
+                } else {
+                  const success = args[callbackIndexes[0]];
+                  args[callbackIndexes[0]] = function() {
+                    settle(true);
+                    return success.apply(this, arguments);
+                  };
+                  if (callbackIndexes.length > 1) {
+                    const failure = args[callbackIndexes[1]];
+                    args[callbackIndexes[1]] = function() {
+                      settle(false);
+                      return failure.apply(this, arguments);
+                    };
+                  } else {
+                    args.push(onFailure);
+                  }
+                }
+                return original.apply(this, args);
+              };
+            });
+
+            // コードから分かっているアセットは最初にまとめて要求しておく
+            assetPaths.forEach(function(path) {
+              const isImage = /[.](png|jpe?g|webp|gif|bmp)$/i.test(path);
+              fetch(resolveAssetUrl(path, isImage)).catch(function() {});
+            });
+          })(__TARGET__);
+"""
+
+
+def _build_asset_resolver_script(
+    base_url: str, image_query: str, asset_paths, sketch_key: str, target: str
+) -> str:
+    """ASSET_RESOLVER_JSの値を埋め込む（targetはローダーを置き換えるオブジェクトの式）"""
+    return (
+        ASSET_RESOLVER_JS.replace("__BASE_URL__", json.dumps(base_url))
+        .replace("__IMAGE_QUERY__", json.dumps(image_query))
+        .replace("__SKETCH_KEY__", json.dumps(sketch_key))
+        .replace("__LOADERS__", json.dumps(list(P5_ASSET_LOADERS)))
+        .replace("__ASSET_PATHS__", json.dumps(list(asset_paths)))
+        .replace("__TARGET__", target)
+    )
+
+
+def create_asset_resolver_js(
+    image_server_port: int,
+    image_query: str,
+    asset_paths,
+    sketch_key: str,
+    base_url: str = None,
+) -> str:
+    """
+    iframeに埋め込むアセット解決用のスクリプトを生成（テンプレートリテラル用にエスケープ済み）
+
+    Args:
+        image_server_port: 画像サーバーのポート番号
+        image_query: loadImageのURLに付けるクエリ（例: ?w=1000&h=1000）
+        asset_paths: コードから抽出したアセットのパス（先にまとめて要求する）
+        sketch_key: 読み込み時間の報告でスケッチを識別するためのキー
+        base_url: アセットの読み込み元（省略時は画像サーバー）
 
     Returns:
         生成されたJavaScriptコード
     """
-    return f"""
-    // レーン {lane_index} のスムーズな切り替え
-    let currentFrame = document.getElementById("p5-frame-lane-{lane_index}");
-    
-    // 新しいiframeを作成（非表示で）
-    const newFrame = document.createElement("iframe");
-    newFrame.id = "p5-frame-lane-{lane_index}-new";
-    newFrame.style.border = "none";
-    newFrame.style.width = "100vw";
-    newFrame.style.height = "100vh";
-    newFrame.style.position = "absolute";
-    newFrame.style.top = "0";
-    newFrame.style.left = "0";
-    newFrame.style.zIndex = "{lane_index + 1}";
-    newFrame.style.pointerEvents = "none";
-    newFrame.style.opacity = "0";
-    newFrame.style.transition = "opacity 0.15s ease-in-out";
-    document.body.appendChild(newFrame);
+    if base_url is None:
+        base_url = f"http://localhost:{image_server_port}/"
+    return escape_template_literal(
+        _build_asset_resolver_script(
+            base_url, image_query, asset_paths, sketch_key, "p5.prototype"
+        )
+    )
 
-    // 既存のiframeを前面に
-    if (currentFrame) {{
-        currentFrame.style.zIndex = "{lane_index + 1}";
-        currentFrame.style.transition = "opacity 0.15s ease-in-out";
-    }}
 
-    // 新しいiframeにsrcdocを設定
-    newFrame.srcdoc = `
+def create_instance_asset_resolver_js(
+    image_server_port: int, image_query: str, asset_paths, sketch_key: str
+) -> str:
+    """
+    インスタンスモードのスケッチ用のアセット解決のスクリプトを生成
+
+    共有のドキュメントではスケッチごとにクエリや報告先のキーが異なるので、
+    p5.prototypeではなく引数pのp5インスタンスのローダーだけを置き換える
+
+    Returns:
+        p5インスタンスを引数に取る関数の式（エスケープなし）
+    """
+    script = _build_asset_resolver_script(
+        f"http://localhost:{image_server_port}/",
+        image_query,
+        asset_paths,
+        sketch_key,
+        "p",
+    )
+    return f"function(p) {{{script}}}"
+
+
+# 毎フレームのdeltaTimeをリングバッファに記録し、一定間隔でまとめて親ウィンドウに送るスクリプト
+FRAME_TELEMETRY_JS = """
+          (function() {
+            const sketchKey = __SKETCH_KEY__;
+            const capacity = __CAPACITY__;
+            const deltas = new Float32Array(capacity);
+            let writeIndex = 0;
+            let count = 0;
+            let overflowed = 0;
+            let instance = null;
+
+            // 切り替えの所要時間の計測用に、各段階の時刻を親ウィンドウに送る
+            function postStage(stage) {
+              window.parent.postMessage({
+                source: "p5-player",
+                type: "lifecycle",
+                stage: stage,
+                t: performance.timeOrigin + performance.now(),
+              }, "*");
+            }
+            postStage("scripts_ready");
+            // 表示後の最初のdraw()を報告する（先読みでは表示されるまでfalse）
+            window.__p5AwaitFirstDraw = true;
+            window.addEventListener("DOMContentLoaded", function() {
+              const userSetup = window.setup;
+              if (typeof userSetup !== "function") {
+                return;
+              }
+              window.setup = function() {
+                postStage("setup_start");
+                const result = userSetup.apply(this, arguments);
+                if (result && typeof result.then === "function") {
+                  return result.then(function(value) {
+                    postStage("setup_end");
+                    return value;
+                  });
+                }
+                postStage("setup_end");
+                return result;
+              };
+            });
+
+            function onFrame(p) {
+              instance = p;
+              if (window.__p5AwaitFirstDraw) {
+                window.__p5AwaitFirstDraw = false;
+                postStage("first_draw");
+              }
+              // 最初のフレームはsetup()の時間を含むので記録しない
+              if (p.frameCount <= 1) {
+                return;
+              }
+              deltas[writeIndex] = p.deltaTime;
+              writeIndex = (writeIndex + 1) % capacity;
+              if (count < capacity) {
+                count += 1;
+              } else {
+                overflowed += 1;
+              }
+            }
+
+            if (typeof p5.registerAddon === "function") {
+              p5.registerAddon(function(p5, fn, lifecycles) {
+                lifecycles.postdraw = function() {
+                  onFrame(this);
+                };
+              });
+            } else if (typeof p5.prototype.registerMethod === "function") {
+              p5.prototype.registerMethod("post", function() {
+                onFrame(this);
+              });
+            }
+
+            setInterval(function() {
+              if (count === 0 || instance === null) {
+                return;
+              }
+              const samples = [];
+              const start = (writeIndex - count + capacity) % capacity;
+              for (let i = 0; i < count; i++) {
+                samples.push(Math.round(deltas[(start + i) % capacity] * 100) / 100);
+              }
+              count = 0;
+              let targetFps = 60;
+              if (typeof instance.getTargetFrameRate === "function") {
+                targetFps = instance.getTargetFrameRate() || targetFps;
+              }
+              window.parent.postMessage({
+                source: "p5-player",
+                type: "frame-stats",
+                sketchKey: sketchKey,
+                deltas: samples,
+                frameRate: instance.frameRate(),
+                targetFps: targetFps,
+                overflowed: overflowed,
+              }, "*");
+              overflowed = 0;
+            }, __INTERVAL_MS__);
+          })();
+"""
+
+
+def create_frame_telemetry_js(
+    sketch_key: str, interval_ms: int = 1000, capacity: int = 512
+) -> str:
+    """
+    iframeに埋め込むフレーム時間計測用のスクリプトを生成（テンプレートリテラル用にエスケープ済み）
+
+    Args:
+        sketch_key: 報告でスケッチを識別するためのキー
+        interval_ms: 親ウィンドウに送る間隔
+        capacity: 送るまでに保持するフレーム数（超えた分は古いものから上書き）
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    script = (
+        FRAME_TELEMETRY_JS.replace("__SKETCH_KEY__", json.dumps(sketch_key))
+        .replace("__CAPACITY__", str(int(capacity)))
+        .replace("__INTERVAL_MS__", str(int(interval_ms)))
+    )
+    return escape_template_literal(script)
+
+
+def create_sketch_srcdoc(
+    escaped_code: str, p5_url: str, after_code: str = "", asset_prelude: str = ""
+) -> str:
+    """
+    iframeのsrcdocに設定するHTMLを生成（テンプレートリテラル内に埋め込む前提）
+
+    Args:
+        escaped_code: エスケープされたp5.jsコード
+        p5_url: iframeで読み込むp5.jsのURL
+        after_code: ユーザーコードの後に実行するスクリプト（エスケープ済み）
+        asset_prelude: p5.jsの読み込み直後に実行するアセット解決のスクリプト（エスケープ済み）
+
+    Returns:
+        生成されたHTML
+    """
+    after_script = f"<script>{after_code}<\\/script>" if after_code else ""
+    prelude_script = f"<script>{asset_prelude}<\\/script>" if asset_prelude else ""
+    return f"""
       <!DOCTYPE html>
       <html>
       <head>
@@ -52,45 +401,960 @@ def create_smooth_lane_switch_js(lane_index: int, escaped_code: str) -> str:
             background: transparent;
           }}
         </style>
-        <script src="https://cdn.jsdelivr.net/npm/p5@1.9.2/lib/p5.min.js"></script>
+        <script src="{p5_url}"></script>
+        {prelude_script}
       </head>
       <body>
         <script>
           {escaped_code}
-        <\/script>
+        <\\/script>
+        {after_script}
       </body>
       </html>
-    `;
+    """
+
+
+def create_smooth_lane_switch_js(
+    lane_index: int, escaped_code: str, p5_url: str, asset_prelude: str = ""
+) -> str:
+    """
+    レーンのスムーズな切り替えを行うJavaScriptコードを生成
+
+    Args:
+        lane_index: レーンのインデックス
+        escaped_code: エスケープされたp5.jsコード
+        p5_url: iframeで読み込むp5.jsのURL
+        asset_prelude: アセット解決のスクリプト（create_asset_resolver_jsの結果）
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    return f"""
+    // レーン {lane_index} のスムーズな切り替え
+    // （トランザクション内であれば、他のレーンと同じフレームで表示を切り替える）
+    const tx = window.__p5ActiveTx;
+
+    // 前の切り替えでまだ表示されていないiframeは不要になったので破棄
+    const pendingFrame = document.getElementById("p5-frame-lane-{lane_index}-new");
+    if (pendingFrame) {{
+        window.__p5RemoveLaneElement(pendingFrame);
+    }}
+
+    // 新しいiframeを作成（非表示で）
+    const newFrame = document.createElement("iframe");
+    newFrame.id = "p5-frame-lane-{lane_index}-new";
+    newFrame.style.border = "none";
+    newFrame.style.width = "100vw";
+    newFrame.style.height = "100vh";
+    newFrame.style.position = "absolute";
+    newFrame.style.top = "0";
+    newFrame.style.left = "0";
+    newFrame.style.zIndex = "{lane_index + 1}";
+    newFrame.style.pointerEvents = "none";
+    newFrame.style.opacity = "0";
+    newFrame.style.transition = "opacity 0.15s ease-in-out";
+    document.body.appendChild(newFrame);
+    window.__p5TrackFrame(newFrame, {lane_index});
+    window.__p5TakeSwitch({lane_index}, newFrame, false);
+    newFrame.__p5PendingTx = tx;
+
+    // 新しいiframeにsrcdocを設定
+    newFrame.srcdoc = `{create_sketch_srcdoc(escaped_code, p5_url, asset_prelude=asset_prelude)}`;
 
     // 新しいiframeが読み込まれたら切り替え
     newFrame.onload = function() {{
-        // 新しいiframeをフェードイン
-        newFrame.style.opacity = "1";
-        
-        // 古いiframeをフェードアウト
-        if (currentFrame) {{
-            currentFrame.style.opacity = "0";
-        }}
-        
-        // フェード完了後に古いiframeを削除
-        setTimeout(function() {{
-            if (currentFrame) {{
-                currentFrame.remove();
+        newFrame.__p5PendingTx = null;
+        window.__p5CommitSwap(tx, function() {{
+            // 後の切り替えや上限で破棄されていれば何もしない
+            if (!newFrame.isConnected) {{
+                return;
             }}
-            // 新しいiframeのIDを正しいものに変更
+            // 表示中のiframeは切り替えの時点で取得する（先に表示された切り替えがあっても残さない）
+            const currentFrame = document.getElementById("p5-frame-lane-{lane_index}");
             newFrame.id = "p5-frame-lane-{lane_index}";
-            newFrame.style.zIndex = "auto";
-        }}, 150);
+            newFrame.style.opacity = "1";
+            window.__p5MarkSwitch(newFrame, "shown");
+
+            // 古いiframeは停止してフェードアウトし、フェード完了後にp5を破棄して削除
+            if (currentFrame && currentFrame !== newFrame) {{
+                currentFrame.style.zIndex = "{lane_index + 1}";
+                window.__p5RetireLaneElement(currentFrame);
+            }}
+            setTimeout(function() {{
+                newFrame.style.zIndex = "auto";
+            }}, 150);
+        }});
     }};
+    """
+
+
+# 先読みしたスケッチをsetup()直後に停止させ、準備完了を親に通知するスクリプト
+# （setupがPromiseを返す場合は完了するまで待ってから通知する）
+PREWARM_PAUSE_JS = """
+          (function() {
+            const userSetup = window.setup;
+            window.setup = function() {
+              function finish(value) {
+                noLoop();
+                window.__p5AwaitFirstDraw = false;
+                window.parent.postMessage({ source: "p5-player", type: "prewarm-ready" }, "*");
+                return value;
+              }
+              const result = typeof userSetup === "function"
+                ? userSetup.apply(this, arguments)
+                : undefined;
+              if (result && typeof result.then === "function") {
+                return result.then(finish);
+              }
+              return finish(result);
+            };
+          })();
+"""
+
+
+def create_prewarm_lane_js(
+    lane_index: int,
+    escaped_code: str,
+    p5_url: str,
+    sketch_key: str,
+    asset_prelude: str = "",
+) -> str:
+    """
+    レーンの次のブロックを非表示・停止状態で先読みするJavaScriptコードを生成
+
+    Args:
+        lane_index: レーンのインデックス
+        escaped_code: エスケープされたp5.jsコード
+        p5_url: iframeで読み込むp5.jsのURL
+        sketch_key: 切り替え時に先読み済みのスケッチか判定するためのキー
+        asset_prelude: アセット解決のスクリプト（create_asset_resolver_jsの結果）
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    return f"""
+    (function() {{
+        // レーン {lane_index} の次のブロックを先読み
+        const frameId = "p5-frame-lane-{lane_index}-next";
+        const staleFrame = document.getElementById(frameId);
+        if (staleFrame) {{
+            window.__p5RemoveLaneElement(staleFrame);
+        }}
+
+        const nextFrame = document.createElement("iframe");
+        nextFrame.id = frameId;
+        nextFrame.style.border = "none";
+        nextFrame.style.width = "100vw";
+        nextFrame.style.height = "100vh";
+        nextFrame.style.position = "absolute";
+        nextFrame.style.top = "0";
+        nextFrame.style.left = "0";
+        nextFrame.style.zIndex = "{lane_index + 1}";
+        nextFrame.style.pointerEvents = "none";
+        nextFrame.style.opacity = "0";
+        nextFrame.style.visibility = "hidden";
+        nextFrame.style.transition = "opacity 0.15s ease-in-out";
+        document.body.appendChild(nextFrame);
+        window.__p5TrackFrame(nextFrame, {lane_index});
+
+        window.__p5Prewarm[{lane_index}] = {{
+            frame: nextFrame,
+            key: "{sketch_key}",
+            readyAt: null,
+            activationRequestedAt: null,
+            activated: false,
+        }};
+        nextFrame.srcdoc = `{create_sketch_srcdoc(escaped_code, p5_url, PREWARM_PAUSE_JS, asset_prelude)}`;
+    }})();
+    """
+
+
+def _create_instance_sketch_js(
+    sketch_key: str, code: str, p5_url: str, asset_installer: str
+) -> str:
+    """インスタンスモードのスケッチの設定（レンダーウィンドウ側の関数に渡すオブジェクト）"""
+    return f"""{{
+            key: {json.dumps(sketch_key)},
+            code: {json.dumps(code)},
+            p5Url: {json.dumps(p5_url)},
+            installAssets: {asset_installer},
+        }}"""
 
-    // 既存のiframeがない場合は即座に表示
-    if (!currentFrame) {{
-        newFrame.style.opacity = "1";
-        newFrame.id = "p5-frame-lane-{lane_index}";
+
+def create_instance_lane_switch_js(
+    lane_index: int, sketch_key: str, code: str, p5_url: str, asset_installer: str
+) -> str:
+    """
+    レーンのスケッチをインスタンスモードで切り替えるJavaScriptコードを生成
+
+    トランザクションのtxとfailedLanesを参照するので、関数で囲まずに埋め込む。
+    共有のp5.jsを使えない場合や構文エラーの場合はfailedLanesに追加され、iframeで再実行される
+
+    Args:
+        lane_index: レーンのインデックス
+        sketch_key: スケッチを識別するためのキー
+        code: p5.jsコード（エスケープなし）
+        p5_url: 共有のドキュメントに読み込むp5.jsのURL
+        asset_installer: アセット解決の関数（create_instance_asset_resolver_jsの結果）
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    sketch = _create_instance_sketch_js(sketch_key, code, p5_url, asset_installer)
+    return f"""
+    // レーン {lane_index} をインスタンスモードで切り替え
+    if (!window.__p5StartInstanceLane({lane_index}, {sketch}, tx)) {{
+        window.__p5CancelSwap(tx);
+        failedLanes.push({lane_index});
     }}
     """
 
 
+def create_instance_prewarm_lane_js(
+    lane_index: int, sketch_key: str, code: str, p5_url: str, asset_installer: str
+) -> str:
+    """
+    レーンの次のブロックをインスタンスモードで非表示・停止状態で先読みするJavaScriptコードを生成
+
+    先読みできなかった場合は、切り替え時にactivatePrewarmedLaneが失敗して通常の切り替えになる
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    sketch = _create_instance_sketch_js(sketch_key, code, p5_url, asset_installer)
+    return f"""
+    // レーン {lane_index} の次のブロックをインスタンスモードで先読み
+    window.__p5PrewarmInstanceLane({lane_index}, {sketch});
+    """
+
+
+def create_render_runtime_js(frame_budget: int = DEFAULT_LIVE_FRAME_BUDGET) -> str:
+    """
+    レンダーウィンドウ側で先読みiframeとインスタンスモードのスケッチを管理するJavaScriptコードを生成
+
+    Args:
+        frame_budget: 同時に存在できるスケッチの要素（iframe・インスタンスのdiv）の上限
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    return """
+    // レーンごとの先読み状態
+    window.__p5Prewarm = {};
+    // 切り替え要求済みでsetup()の完了待ちの先読み
+    window.__p5Activating = [];
+    // 実行中のトランザクション（スクリプトの同期実行中のみ設定される）
+    window.__p5ActiveTx = null;
+
+    // トランザクションを開始（expectedは表示を切り替えるレーンの数）
+    window.__p5BeginTransaction = function(expected) {
+        const tx = { expected: expected, swaps: [], open: true, flushed: false };
+        window.__p5ActiveTx = tx;
+        if (expected > 0) {
+            // 読み込みに失敗したiframeがあっても他のレーンを待たせ続けない
+            setTimeout(function() {
+                flushTransaction(tx);
+            }, 3000);
+        }
+        return tx;
+    };
+
+    window.__p5EndTransaction = function(tx) {
+        tx.open = false;
+        window.__p5ActiveTx = null;
+        if (tx.swaps.length >= tx.expected) {
+            flushTransaction(tx);
+        }
+    };
+
+    // 表示の切り替えを登録（トランザクションの全レーンが揃ったら同じフレームで実行）
+    window.__p5CommitSwap = function(tx, swap) {
+        if (!tx || tx.flushed) {
+            swap();
+            return;
+        }
+        tx.swaps.push(swap);
+        if (!tx.open && tx.swaps.length >= tx.expected) {
+            flushTransaction(tx);
+        }
+    };
+
+    // 切り替えが行われなくなったレーンの分を待たないようにする
+    window.__p5CancelSwap = function(tx) {
+        tx.expected -= 1;
+        if (!tx.open && tx.swaps.length >= tx.expected) {
+            flushTransaction(tx);
+        }
+    };
+
+    function flushTransaction(tx) {
+        if (tx.flushed) {
+            return;
+        }
+        tx.flushed = true;
+        const swaps = tx.swaps;
+        tx.swaps = [];
+        if (swaps.length === 0) {
+            return;
+        }
+        requestAnimationFrame(function() {
+            swaps.forEach(function(swap) {
+                swap();
+            });
+        });
+    }
+
+    function activatePrewarmedFrame(laneIndex, entry) {
+        if (entry.activated) {
+            return;
+        }
+        entry.activated = true;
+        if (window.__p5Prewarm[laneIndex] === entry) {
+            delete window.__p5Prewarm[laneIndex];
+        }
+        window.__p5Activating = window.__p5Activating.filter(function(e) {
+            return e !== entry;
+        });
+
+        const currentFrame = document.getElementById("p5-frame-lane-" + laneIndex);
+        const nextFrame = entry.frame;
+        try {
+            if (nextFrame.__p5Instance) {
+                nextFrame.__p5Instance.__p5AwaitFirstDraw = true;
+                nextFrame.__p5Instance.loop();
+            } else if (nextFrame.contentWindow && nextFrame.contentWindow.loop) {
+                nextFrame.contentWindow.__p5AwaitFirstDraw = true;
+                nextFrame.contentWindow.loop();
+            }
+        } catch (e) {
+            console.error("Failed to resume prewarmed sketch:", e);
+        }
+
+        // 境界では表示の切り替えのみ
+        nextFrame.id = "p5-frame-lane-" + laneIndex;
+        nextFrame.style.visibility = "visible";
+        nextFrame.style.opacity = "1";
+        window.__p5MarkSwitch(nextFrame, "shown");
+        if (currentFrame && currentFrame !== nextFrame) {
+            window.__p5RetireLaneElement(currentFrame);
+        }
+
+        // 境界の何ms前に準備が終わっていたか（マイナスは境界に間に合わなかった分）
+        const now = performance.now();
+        const leadMs = entry.readyAt !== null && entry.readyAt <= entry.activationRequestedAt
+            ? entry.activationRequestedAt - entry.readyAt
+            : entry.activationRequestedAt - now;
+        if (window.pywebview?.api?.report_prewarm) {
+            window.pywebview.api.report_prewarm(Number(laneIndex), leadMs);
+        }
+    }
+
+    window.activatePrewarmedLane = function(laneIndex, key) {
+        const entry = window.__p5Prewarm[laneIndex];
+        if (!entry || entry.key !== key || !entry.frame.isConnected) {
+            return false;
+        }
+        const tx = window.__p5ActiveTx;
+        window.__p5TakeSwitch(laneIndex, entry.frame, true);
+        entry.activationRequestedAt = performance.now();
+        delete window.__p5Prewarm[laneIndex];
+        if (entry.readyAt !== null) {
+            window.__p5CommitSwap(tx, function() {
+                activatePrewarmedFrame(laneIndex, entry);
+            });
+        } else {
+            // まだsetup()が終わっていなければ完了次第切り替え（念のためタイムアウトも設定）
+            // 次のブロックの先読みに消されないようIDを変えておく
+            entry.frame.id = "p5-frame-lane-" + laneIndex + "-activating";
+            entry.activate = function() {
+                if (entry.activationQueued) {
+                    return;
+                }
+                entry.activationQueued = true;
+                window.__p5CommitSwap(tx, function() {
+                    activatePrewarmedFrame(laneIndex, entry);
+                });
+            };
+            window.__p5Activating.push(entry);
+            setTimeout(entry.activate, 1000);
+        }
+        return true;
+    };
+
+    // 先読みのsetup()が終わった（matchは先読みの要素かどうかを判定する関数）
+    function markPrewarmReady(match) {
+        Object.values(window.__p5Prewarm).forEach(function(entry) {
+            if (match(entry.frame)) {
+                entry.readyAt = performance.now();
+            }
+        });
+        window.__p5Activating.forEach(function(entry) {
+            if (match(entry.frame)) {
+                entry.readyAt = performance.now();
+                entry.activate();
+            }
+        });
+    }
+
+    // レンダーウィンドウにあるスケッチの要素（iframe・インスタンスモードのdiv）
+    // 上限を超えたら古いものから破棄し、一晩中再生してもメモリが増え続けないようにする
+    window.__p5LiveFrames = [];
+    window.__p5FrameBudget = __FRAME_BUDGET__;
+    window.__p5EvictedFrames = 0;
+
+    // スケッチの描画ループを止める
+    function pauseSketch(element) {
+        try {
+            if (element.__p5Instance) {
+                element.__p5Instance.noLoop();
+            } else if (element.contentWindow && typeof element.contentWindow.noLoop === "function") {
+                element.contentWindow.noLoop();
+            }
+        } catch (e) {
+            console.error("Failed to pause sketch:", e);
+        }
+    }
+
+    // p5を破棄する（インスタンスモードはそのインスタンス、iframeはiframe内のグローバルモードのインスタンス）
+    function teardownSketch(element) {
+        try {
+            if (element.__p5Instance) {
+                element.__p5Instance.remove();
+            } else if (element.tagName === "IFRAME" && element.contentWindow) {
+                const frameWindow = element.contentWindow;
+                if (typeof frameWindow.noLoop === "function") {
+                    frameWindow.noLoop();
+                }
+                if (frameWindow.p5 && frameWindow.p5.instance) {
+                    frameWindow.p5.instance.remove();
+                }
+            }
+        } catch (e) {
+            console.error("Failed to tear down sketch:", e);
+        }
+        element.__p5Instance = null;
+    }
+
+    function isShownElement(element) {
+        return /^p5-frame-lane-\\d+$/.test(element.id) || element.id === "single-iframe";
+    }
+
+    // 上限を超えた分を、表示されていないもの（先読み・表示前・フェードアウト中）から古い順に破棄
+    // 表示中のスケッチは破棄しない。上限はレーンごとに表示中と先読みの2つを下回らないようにする
+    function enforceFrameBudget(keep) {
+        const live = window.__p5LiveFrames.filter(function(element) {
+            return element.isConnected;
+        });
+        window.__p5LiveFrames = live;
+        const lanes = new Set(live.map(function(element) {
+            return element.__p5Lane;
+        }));
+        let excess = live.length - Math.max(window.__p5FrameBudget, lanes.size * 2);
+        if (excess <= 0) {
+            return;
+        }
+        const candidates = live.filter(function(element) {
+            return element !== keep && !isShownElement(element);
+        }).sort(function(a, b) {
+            return a.__p5CreatedAt - b.__p5CreatedAt;
+        });
+        for (let i = 0; i < candidates.length && excess > 0; i++, excess--) {
+            console.warn("Live frame budget exceeded, evicting:", candidates[i].id);
+            window.__p5RemoveLaneElement(candidates[i]);
+            window.__p5EvictedFrames += 1;
+        }
+    }
+
+    // スケッチの要素を登録（laneIndexは単一実行のiframeなら-1）
+    window.__p5TrackFrame = function(element, laneIndex) {
+        element.__p5Lane = laneIndex;
+        element.__p5CreatedAt = performance.now();
+        window.__p5LiveFrames.push(element);
+        enforceFrameBudget(element);
+    };
+
+    window.__p5SetFrameBudget = function(budget) {
+        window.__p5FrameBudget = Math.max(2, budget);
+        enforceFrameBudget(null);
+    };
+
+    // 要素を削除（先にp5を破棄して描画ループとイベントリスナーを止める）
+    window.__p5RemoveLaneElement = function(element) {
+        // 読み込み前に破棄した切り替えはトランザクションで待たない
+        if (element.__p5PendingTx) {
+            window.__p5CancelSwap(element.__p5PendingTx);
+            element.__p5PendingTx = null;
+        }
+        teardownSketch(element);
+        element.remove();
+        const index = window.__p5LiveFrames.indexOf(element);
+        if (index >= 0) {
+            window.__p5LiveFrames.splice(index, 1);
+        }
+    };
+
+    // 表示中だった要素を退かせる（すぐに停止してフェードアウトし、フェード完了後に破棄）
+    window.__p5RetireLaneElement = function(element) {
+        element.id = element.id + "-old";
+        pauseSketch(element);
+        element.style.opacity = "0";
+        setTimeout(function() {
+            window.__p5RemoveLaneElement(element);
+        }, 150);
+    };
+
+    // レーンの要素を全て削除（表示中・表示前・先読み・フェードアウト中）
+    window.__p5RemoveLane = function(laneIndex) {
+        window.__p5LiveFrames.filter(function(element) {
+            return element.__p5Lane === laneIndex;
+        }).forEach(window.__p5RemoveLaneElement);
+    };
+
+    // インスタンスモード: スケッチをiframeではなく、このドキュメントで共有するp5.jsの
+    // インスタンスとしてレーンごとのdivに描画する（p5.jsは最初に使う時に1回だけ読み込む）
+    const P5_SKETCH_HOOKS = __P5_SKETCH_HOOKS__;
+    window.__p5Runtime = { url: null, loaded: false, failedUrl: null, callbacks: [] };
+    // スケッチのキー → グローバルモードのコードをインスタンスで実行する関数
+    window.__p5InstanceFactories = {};
+
+    // 共有のp5.jsを使えるか（1つのドキュメントに別のバージョンは読み込めない、
+    // 読み込みに失敗したURLは以降iframeで切り替える）
+    function canUseSharedRuntime(url) {
+        const runtime = window.__p5Runtime;
+        if (runtime.failedUrl === url) {
+            return false;
+        }
+        return runtime.url === null || runtime.url === url;
+    }
+
+    // 共有のp5.jsを読み込んでからcallback(読み込めたか)を呼ぶ
+    function ensureSharedRuntime(url, callback) {
+        const runtime = window.__p5Runtime;
+        if (runtime.loaded) {
+            callback(true);
+            return;
+        }
+        runtime.callbacks.push(callback);
+        if (runtime.url !== null) {
+            return;
+        }
+        runtime.url = url;
+        const script = document.createElement("script");
+        script.src = url;
+        script.onload = function() {
+            runtime.loaded = true;
+            installInstanceTelemetry();
+            runtime.callbacks.splice(0).forEach(function(cb) {
+                cb(true);
+            });
+        };
+        script.onerror = function() {
+            console.error("Failed to load p5.js:", url);
+            script.remove();
+            runtime.url = null;
+            runtime.failedUrl = url;
+            // 待っていたレーンは要素を片付ける（次の切り替えからはiframeになる）
+            runtime.callbacks.splice(0).forEach(function(cb) {
+                cb(false);
+            });
+        };
+        document.head.appendChild(script);
+    }
+
+    // コードをwith(p)の中の関数で実行し、定義されたsetup()などを返す関数を作る
+    // （構文エラーなら null を返し、呼び出し側でiframeに切り替える）
+    function getInstanceFactory(key, code) {
+        let factory = window.__p5InstanceFactories[key];
+        if (factory) {
+            return factory;
+        }
+        const hooks = P5_SKETCH_HOOKS.map(function(name) {
+            return name + ": typeof " + name + ' === "function" ? ' + name + " : undefined";
+        }).join(", ");
+        try {
+            factory = new Function(
+                "p",
+                "with (p) { return (function() {\\n" + code + "\\n;return { " + hooks +
+                    " };\\n}).call(p); }"
+            );
+        } catch (e) {
+            console.error("Sketch cannot run in instance mode:", e);
+            return null;
+        }
+        window.__p5InstanceFactories[key] = factory;
+        return factory;
+    }
+
+    function createLaneContainer(laneIndex, id) {
+        const container = document.createElement("div");
+        container.id = id;
+        container.style.width = "100vw";
+        container.style.height = "100vh";
+        container.style.position = "absolute";
+        container.style.top = "0";
+        container.style.left = "0";
+        container.style.overflow = "hidden";
+        container.style.zIndex = String(laneIndex + 1);
+        container.style.pointerEvents = "none";
+        container.style.opacity = "0";
+        container.style.transition = "opacity 0.15s ease-in-out";
+        document.body.appendChild(container);
+        window.__p5TrackFrame(container, laneIndex);
+        return container;
+    }
+
+    // containerにp5インスタンスを作成（pausedならsetup()の後に停止してonReadyを呼ぶ）
+    function createInstance(container, factory, sketch, paused, onReady) {
+        window.__p5MarkSwitch(container, "scripts_ready");
+        try {
+            container.__p5Instance = new p5(function(p) {
+                p.__p5Container = container;
+                p.__p5AwaitFirstDraw = !paused;
+                p.__p5Telemetry = { sketchKey: sketch.key, deltas: [], overflowed: 0 };
+                sketch.installAssets(p);
+                const hooks = factory(p);
+                P5_SKETCH_HOOKS.forEach(function(name) {
+                    if (hooks[name] && hooks[name] !== p5.prototype[name]) {
+                        p[name] = hooks[name];
+                    }
+                });
+                const userSetup = p.setup;
+                p.setup = function() {
+                    window.__p5MarkSwitch(container, "setup_start");
+                    function finish(value) {
+                        window.__p5MarkSwitch(container, "setup_end");
+                        if (paused) {
+                            p.noLoop();
+                            p.__p5AwaitFirstDraw = false;
+                        }
+                        onReady();
+                        return value;
+                    }
+                    const result = typeof userSetup === "function"
+                        ? userSetup.apply(this, arguments)
+                        : undefined;
+                    if (result && typeof result.then === "function") {
+                        return result.then(finish);
+                    }
+                    return finish(result);
+                };
+            }, container);
+            return true;
+        } catch (e) {
+            console.error("Failed to start p5 instance:", e);
+            return false;
+        }
+    }
+
+    // レーンのスケッチをインスタンスモードで切り替え（使えなければfalseを返し、iframeで切り替える）
+    window.__p5StartInstanceLane = function(laneIndex, sketch, tx) {
+        const factory = getInstanceFactory(sketch.key, sketch.code);
+        if (!factory || !canUseSharedRuntime(sketch.p5Url)) {
+            return false;
+        }
+        const pendingFrame = document.getElementById("p5-frame-lane-" + laneIndex + "-new");
+        if (pendingFrame) {
+            window.__p5RemoveLaneElement(pendingFrame);
+        }
+        const container = createLaneContainer(laneIndex, "p5-frame-lane-" + laneIndex + "-new");
+        window.__p5TakeSwitch(laneIndex, container, false);
+        container.__p5PendingTx = tx;
+        ensureSharedRuntime(sketch.p5Url, function(loaded) {
+            if (!container.isConnected) {
+                return;
+            }
+            if (!loaded) {
+                // 待っている切り替えは取り消され、次の切り替えからはiframeになる
+                window.__p5RemoveLaneElement(container);
+                return;
+            }
+            const started = createInstance(container, factory, sketch, false, function() {
+                container.__p5PendingTx = null;
+                window.__p5CommitSwap(tx, function() {
+                    if (!container.isConnected) {
+                        return;
+                    }
+                    const currentFrame = document.getElementById("p5-frame-lane-" + laneIndex);
+                    container.id = "p5-frame-lane-" + laneIndex;
+                    container.style.opacity = "1";
+                    window.__p5MarkSwitch(container, "shown");
+                    if (currentFrame && currentFrame !== container) {
+                        window.__p5RetireLaneElement(currentFrame);
+                    }
+                });
+            });
+            if (!started) {
+                window.__p5RemoveLaneElement(container);
+            }
+        });
+        return true;
+    };
+
+    // レーンの次のブロックをインスタンスモードで先読み（setup()の後に停止させておく）
+    window.__p5PrewarmInstanceLane = function(laneIndex, sketch) {
+        const factory = getInstanceFactory(sketch.key, sketch.code);
+        if (!factory || !canUseSharedRuntime(sketch.p5Url)) {
+            return false;
+        }
+        const frameId = "p5-frame-lane-" + laneIndex + "-next";
+        const staleFrame = document.getElementById(frameId);
+        if (staleFrame) {
+            window.__p5RemoveLaneElement(staleFrame);
+        }
+        const container = createLaneContainer(laneIndex, frameId);
+        container.style.visibility = "hidden";
+        window.__p5Prewarm[laneIndex] = {
+            frame: container,
+            key: sketch.key,
+            readyAt: null,
+            activationRequestedAt: null,
+            activated: false,
+        };
+        ensureSharedRuntime(sketch.p5Url, function(loaded) {
+            if (!container.isConnected) {
+                return;
+            }
+            if (!loaded) {
+                // 先読みがなくなるので、切り替え時はactivatePrewarmedLaneが失敗してiframeになる
+                window.__p5RemoveLaneElement(container);
+                return;
+            }
+            createInstance(container, factory, sketch, true, function() {
+                markPrewarmReady(function(frame) {
+                    return frame === container;
+                });
+            });
+        });
+        return true;
+    };
+
+    // インスタンスごとのフレーム時間（iframeのFRAME_TELEMETRY_JSと同じ形式で集計する）
+    function recordInstanceFrame(p) {
+        const telemetry = p.__p5Telemetry;
+        if (!telemetry) {
+            return;
+        }
+        if (p.__p5AwaitFirstDraw) {
+            p.__p5AwaitFirstDraw = false;
+            window.__p5MarkSwitch(p.__p5Container, "first_draw");
+        }
+        // 最初のフレームはsetup()の時間を含むので記録しない
+        if (p.frameCount <= 1) {
+            return;
+        }
+        if (telemetry.deltas.length >= 512) {
+            telemetry.deltas.shift();
+            telemetry.overflowed += 1;
+        }
+        telemetry.deltas.push(Math.round(p.deltaTime * 100) / 100);
+    }
+
+    function installInstanceTelemetry() {
+        if (typeof p5.registerAddon === "function") {
+            p5.registerAddon(function(p5, fn, lifecycles) {
+                lifecycles.postdraw = function() {
+                    recordInstanceFrame(this);
+                };
+            });
+        } else if (typeof p5.prototype.registerMethod === "function") {
+            p5.prototype.registerMethod("post", function() {
+                recordInstanceFrame(this);
+            });
+        }
+    }
+
+    function collectInstanceFrameStats() {
+        document.querySelectorAll('[id^="p5-frame-lane-"]').forEach(function(element) {
+            const instance = element.__p5Instance;
+            const match = /^p5-frame-lane-(\\d+)$/.exec(element.id);
+            if (!instance || !match || instance.__p5Telemetry.deltas.length === 0) {
+                return;
+            }
+            const telemetry = instance.__p5Telemetry;
+            let targetFps = 60;
+            if (typeof instance.getTargetFrameRate === "function") {
+                targetFps = instance.getTargetFrameRate() || targetFps;
+            }
+            window.__p5FrameStats.push({
+                lane: Number(match[1]),
+                sketchKey: telemetry.sketchKey,
+                deltas: telemetry.deltas.splice(0),
+                frameRate: instance.frameRate(),
+                targetFps: targetFps,
+                overflowed: telemetry.overflowed,
+            });
+            telemetry.overflowed = 0;
+        });
+    }
+
+    // 存在するスケッチの要素の数とJSヒープの使用量（performance.memoryがあるブラウザのみ）を5秒ごとに報告
+    let healthTick = 0;
+    function reportRenderHealth(api) {
+        healthTick += 1;
+        if (healthTick % 5 !== 0 || !api || !api.report_render_health) {
+            return;
+        }
+        const live = window.__p5LiveFrames.filter(function(element) {
+            return element.isConnected;
+        });
+        const sample = {
+            liveFrames: live.length,
+            iframes: live.filter(function(element) {
+                return element.tagName === "IFRAME";
+            }).length,
+            instances: live.filter(function(element) {
+                return !!element.__p5Instance;
+            }).length,
+            // 登録されずに残ったiframeがないかの確認用
+            domIframes: document.querySelectorAll("iframe").length,
+            budget: window.__p5FrameBudget,
+            evicted: window.__p5EvictedFrames,
+        };
+        if (performance.memory) {
+            sample.usedHeapBytes = performance.memory.usedJSHeapSize;
+            sample.totalHeapBytes = performance.memory.totalJSHeapSize;
+        }
+        api.report_render_health(sample);
+    }
+
+    // 切り替えの所要時間の計測（Python側と同じ時計として performance.timeOrigin 基準の時刻を使う）
+    function sharedNow() {
+        return performance.timeOrigin + performance.now();
+    }
+    // レーンごとの、iframeに割り当てる前の切り替え
+    window.__p5PendingSwitches = {};
+    // 計測が終わった切り替え（1秒ごとにまとめてPython側に送る）
+    window.__p5SwitchTimings = [];
+
+    // 切り替えのスクリプトが実行された時刻を記録（IDはPython側で採番）
+    window.__p5BeginSwitch = function(laneIndex, switchId) {
+        const record = {
+            switchId: switchId,
+            prewarmed: false,
+            mode: null,
+            stages: { eval_received: sharedNow() },
+            finished: false,
+        };
+        window.__p5PendingSwitches[laneIndex] = record;
+        // 最初の描画が報告されない場合も、ある時点で打ち切って送る
+        setTimeout(function() {
+            finishSwitch(record);
+        }, 10000);
+    };
+
+    // 切り替えを表示するiframeに割り当てる
+    window.__p5TakeSwitch = function(laneIndex, frame, prewarmed) {
+        const record = window.__p5PendingSwitches[laneIndex];
+        if (!record) {
+            return;
+        }
+        delete window.__p5PendingSwitches[laneIndex];
+        record.prewarmed = prewarmed;
+        record.mode = frame.tagName === "IFRAME" ? "iframe" : "instance";
+        // 先読み中に届いていた段階も含める（デッドラインより前の分はPython側で除外）
+        Object.assign(record.stages, frame.__p5Lifecycle || {});
+        frame.__p5Switch = record;
+    };
+
+    window.__p5MarkSwitch = function(frame, stage, t) {
+        const record = frame.__p5Switch;
+        if (!record || record.finished) {
+            frame.__p5Lifecycle = frame.__p5Lifecycle || {};
+            frame.__p5Lifecycle[stage] = t === undefined ? sharedNow() : t;
+            return;
+        }
+        record.stages[stage] = t === undefined ? sharedNow() : t;
+        if (record.stages.shown !== undefined && record.stages.first_draw !== undefined) {
+            finishSwitch(record);
+        }
+    };
+
+    function finishSwitch(record) {
+        if (record.finished) {
+            return;
+        }
+        record.finished = true;
+        window.__p5SwitchTimings.push({
+            switchId: record.switchId,
+            prewarmed: record.prewarmed,
+            mode: record.mode,
+            stages: record.stages,
+        });
+    }
+
+    // iframeから届いたフレーム時間と切り替えの計測結果（1秒ごとにまとめてPython側に送る）
+    window.__p5FrameStats = [];
+    setInterval(function() {
+        const api = window.pywebview && window.pywebview.api;
+        collectInstanceFrameStats();
+        reportRenderHealth(api);
+        if (window.__p5FrameStats.length > 0) {
+            const batches = window.__p5FrameStats.splice(0);
+            if (api && api.report_frame_stats) {
+                api.report_frame_stats(batches);
+            }
+        }
+        if (window.__p5SwitchTimings.length > 0) {
+            const timings = window.__p5SwitchTimings.splice(0);
+            if (api && api.report_switch_timings) {
+                api.report_switch_timings(timings);
+            }
+        }
+    }, 1000);
+
+    window.addEventListener("message", function(event) {
+        const data = event.data;
+        if (!data || data.source !== "p5-player") {
+            return;
+        }
+        if (data.type === "prewarm-ready") {
+            markPrewarmReady(function(frame) {
+                return frame.contentWindow === event.source;
+            });
+        } else if (data.type === "lifecycle") {
+            document.querySelectorAll("iframe").forEach(function(frame) {
+                if (frame.contentWindow === event.source) {
+                    window.__p5MarkSwitch(frame, data.stage, data.t);
+                }
+            });
+        } else if (data.type === "frame-stats") {
+            // どのレーンのiframeからの報告かを記録し、まとめてPython側に送る
+            let lane = null;
+            document.querySelectorAll("iframe").forEach(function(frame) {
+                if (frame.contentWindow === event.source) {
+                    const match = /^p5-frame-lane-(\\d+)$/.exec(frame.id);
+                    if (match) {
+                        lane = Number(match[1]);
+                    } else if (frame.id === "single-iframe") {
+                        lane = -1;
+                    }
+                }
+            });
+            if (lane === null) {
+                // 先読み中や削除済みのiframeは集計しない
+                return;
+            }
+            window.__p5FrameStats.push({
+                lane: lane,
+                sketchKey: data.sketchKey,
+                deltas: data.deltas,
+                frameRate: data.frameRate,
+                targetFps: data.targetFps,
+                overflowed: data.overflowed,
+            });
+        } else if (data.type === "asset-timings") {
+            // iframeでのアセットの読み込み時間をPython側に報告
+            if (window.pywebview && window.pywebview.api &&
+                window.pywebview.api.report_asset_timings) {
+                window.pywebview.api.report_asset_timings(data.sketchKey, data.entries);
+            }
+        }
+    });
+    """.replace("__P5_SKETCH_HOOKS__", json.dumps(list(P5_SKETCH_HOOKS))).replace(
+        "__FRAME_BUDGET__", str(max(2, int(frame_budget)))
+    )
+
+
 def create_clear_all_lanes_js() -> str:
     """
     全レーンのiframeをクリアするJavaScriptコードを生成
@@ -99,9 +1363,11 @@ def create_clear_all_lanes_js() -> str:
         生成されたJavaScriptコード
     """
     return """
-    // 全レーンのiframeを削除
+    // 全レーンのiframe・インスタンスモードのスケッチを削除
     const laneFrames = document.querySelectorAll('[id^="p5-frame-lane-"]');
-    laneFrames.forEach(frame => frame.remove());
+    laneFrames.forEach(frame => window.__p5RemoveLaneElement(frame));
+    window.__p5Prewarm = {};
+    window.__p5Activating = [];
     console.log('All lane iframes cleared');
     """
 
@@ -117,12 +1383,10 @@ def create_clear_specific_lane_js(lane_index: int) -> str:
         生成されたJavaScriptコード
     """
     return f"""
-    // 特定のレーンのiframeを削除
-    const laneFrame = document.getElementById("p5-frame-lane-{lane_index}");
-    if (laneFrame) {{
-        laneFrame.remove();
-        console.log('Lane {lane_index + 1} iframe cleared');
-    }}
+    // 特定のレーンのiframeを削除（表示前・先読み・フェードアウト中のものも含む）
+    window.__p5RemoveLane({lane_index});
+    delete window.__p5Prewarm[{lane_index}];
+    console.log('Lane {lane_index + 1} iframe cleared');
     """
 
 
@@ -137,12 +1401,28 @@ def create_clear_single_iframe_js() -> str:
     // エディタの単一iframeを削除
     const singleFrame = document.getElementById('single-iframe');
     if (singleFrame) {
-        singleFrame.remove();
+        window.__p5RemoveLaneElement(singleFrame);
         console.log('Single iframe cleared');
     }
     """
 
 
+def create_set_frame_budget_js(budget: int) -> str:
+    """
+    レンダーウィンドウに同時に存在できるスケッチの上限を変更するJavaScriptコードを生成
+
+    Args:
+        budget: スケッチの要素（iframe・インスタンスのdiv）の上限
+
+    Returns:
+        生成されたJavaScriptコード
+    """
+    return f"""
+    // スケッチの上限を変更（超えた分はすぐに破棄）
+    window.__p5SetFrameBudget({int(budget)});
+    """
+
+
 def create_resize_handler_js() -> str:
     """
     ウィンドウリサイズハンドラーのJavaScriptコードを生成
@@ -168,12 +1448,16 @@ def create_resize_handler_js() -> str:
     """
 
 
-def create_single_iframe_js(escaped_code: str) -> str:
+def create_single_iframe_js(
+    escaped_code: str, p5_url: str, asset_prelude: str = ""
+) -> str:
     """
     エディタからの単一コード実行用のJavaScriptコードを生成
 
     Args:
         escaped_code: エスケープされたp5.jsコード
+        p5_url: iframeで読み込むp5.jsのURL
+        asset_prelude: アセット解決のスクリプト（create_asset_resolver_jsの結果）
 
     Returns:
         生成されたJavaScriptコード
@@ -181,12 +1465,12 @@ def create_single_iframe_js(escaped_code: str) -> str:
     return f"""
     // 全レーンのiframeをクリア
     const laneFrames = document.querySelectorAll('[id^="p5-frame-lane-"]');
-    laneFrames.forEach(frame => frame.remove());
+    laneFrames.forEach(frame => window.__p5RemoveLaneElement(frame));
     
     // 既存の単一iframeがあれば削除
     const existingSingleFrame = document.getElementById('single-iframe');
     if (existingSingleFrame) {{
-        existingSingleFrame.remove();
+        window.__p5RemoveLaneElement(existingSingleFrame);
     }}
     
     // 単一のiframeを作成
@@ -202,44 +1486,36 @@ def create_single_iframe_js(escaped_code: str) -> str:
     iframe.style.pointerEvents = 'none';
     
     document.body.appendChild(iframe);
-    
-    // iframeにコードを注入
-    const iframeDoc = iframe.contentDocument || iframe.contentWindow.document;
-    iframeDoc.open();
-    iframeDoc.write(`
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/p5.js/1.7.0/p5.min.js"></script>
-            <style>
-                body {{ margin: 0; padding: 0; overflow: hidden; background: transparent; }}
-                canvas {{ display: block; background: transparent; }}
-            </style>
-        </head>
-        <body>
-            <script>
-                {escaped_code}
-            </script>
-        </body>
-        </html>
-    `);
-    iframeDoc.close();
-    """
-
-
-def create_base_html() -> str:
+    window.__p5TrackFrame(iframe, -1);
+
+    // iframeにコードを注入（document.writeではなくsrcdocで毎回新しいドキュメントにする）
+    iframe.srcdoc = `{create_sketch_srcdoc(escaped_code, p5_url, asset_prelude=asset_prelude)}`;
+    """
+
+
+def create_base_html(
+    p5_url: str = None, frame_budget: int = DEFAULT_LIVE_FRAME_BUDGET
+) -> str:
     """
     レンダーウィンドウのベースHTMLを生成
 
+    Args:
+        p5_url: 先読みしておくp5.jsのURL（最初の切り替えでの取得待ちを避ける）
+        frame_budget: 同時に存在できるスケッチの要素の上限
+
     Returns:
         生成されたHTMLコード
     """
+    preload_tag = f'<link rel="preload" href="{p5_url}" as="script">' if p5_url else ""
     return (
         """
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="utf-8">
+        """
+        + preload_tag
+        + """
         <style>
             body {
                 margin: 0;
@@ -257,6 +1533,15 @@ def create_base_html() -> str:
         <script>
             """
         + create_resize_handler_js()
+        + create_render_runtime_js(frame_budget)
+        + """
+            // 最初のフレームが描画されたら起動の計測のために通知する
+            window.addEventListener('pywebviewready', () => {
+                requestAnimationFrame(() => {
+                    window.pywebview.api.notify_ready();
+                });
+            });
+            """
         + """
         </script>
     </head>
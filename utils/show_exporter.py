@@ -0,0 +1,371 @@
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+
+from .assets import extract_asset_refs
+from .p5_runtime import (
+    DEFAULT_P5_VERSION,
+    P5_CDN_URL,
+    ensure_p5_runtime,
+    read_p5_runtime,
+)
+from .playback_engine import build_timeline
+from .render_utils import (
+    PREWARM_PAUSE_JS,
+    create_asset_resolver_js,
+    create_sketch_srcdoc,
+    escape_template_literal,
+)
+
+# iframeのsrcdocに入れるp5.jsのURL（読み込み時にblob:のURLに置き換える）
+P5_URL_PLACEHOLDER = "__P5_URL__"
+
+# 書き出したショーの再生スクリプト
+# タイムラインの表をperformance.now()の絶対時刻で順に発火し、同じ時刻の
+# 切り替えは同じアニメーションフレームで表示する（Python側との通信はしない）
+SHOW_PLAYER_JS = """
+(function() {
+  function toBlobUrl(base64, type) {
+    const binary = atob(base64);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+    return URL.createObjectURL(new Blob([bytes], { type: type }));
+  }
+
+  // p5.jsとアセットは1回だけblob:のURLにして全iframeで共有する
+  const p5Url = P5_SOURCE !== null
+    ? URL.createObjectURL(new Blob([P5_SOURCE], { type: "text/javascript" }))
+    : P5_FALLBACK_URL;
+  window.__p5EmbeddedAssets = {};
+  Object.keys(ASSETS).forEach(function(path) {
+    window.__p5EmbeddedAssets[path] = toBlobUrl(ASSETS[path].data, ASSETS[path].type);
+  });
+
+  // レーン → 表示中 / 先読み中のiframe
+  let visible = {};
+  let prewarmed = {};
+  // setup()の完了待ちのiframe
+  let loading = [];
+  let runId = 0;
+
+  function createEntry(lane, key) {
+    const frame = document.createElement("iframe");
+    frame.style.border = "none";
+    frame.style.width = "100vw";
+    frame.style.height = "100vh";
+    frame.style.position = "absolute";
+    frame.style.top = "0";
+    frame.style.left = "0";
+    frame.style.zIndex = String(lane + 1);
+    frame.style.pointerEvents = "none";
+    frame.style.visibility = "hidden";
+    document.body.appendChild(frame);
+    frame.srcdoc = SKETCHES[key].split(P5_URL_PLACEHOLDER).join(p5Url);
+    const entry = { frame: frame, key: key, ready: false, onReady: null };
+    loading.push(entry);
+    return entry;
+  }
+
+  function removeEntry(entry) {
+    if (entry) {
+      entry.frame.remove();
+      loading = loading.filter(function(e) { return e !== entry; });
+    }
+  }
+
+  function show(lane, entry) {
+    try {
+      entry.frame.contentWindow.loop();
+    } catch (e) {
+      console.error("Failed to resume sketch:", e);
+    }
+    entry.frame.style.visibility = "visible";
+    const previous = visible[lane];
+    visible[lane] = entry;
+    if (previous && previous !== entry) {
+      removeEntry(previous);
+    }
+  }
+
+  window.addEventListener("message", function(event) {
+    const data = event.data;
+    if (!data || data.source !== "p5-player" || data.type !== "prewarm-ready") {
+      return;
+    }
+    loading.slice().forEach(function(entry) {
+      if (entry.frame.contentWindow === event.source) {
+        entry.ready = true;
+        loading = loading.filter(function(e) { return e !== entry; });
+        if (entry.onReady) {
+          entry.onReady();
+        }
+      }
+    });
+  });
+
+  function dispatch(event, swaps) {
+    const kind = event[1];
+    const lane = event[2];
+    const key = event[3];
+    if (kind === "prewarm") {
+      removeEntry(prewarmed[lane]);
+      prewarmed[lane] = createEntry(lane, key);
+    } else if (kind === "start") {
+      let entry = prewarmed[lane];
+      delete prewarmed[lane];
+      if (!entry || entry.key !== key) {
+        removeEntry(entry);
+        entry = createEntry(lane, key);
+      }
+      if (entry.ready) {
+        swaps.push(function() { show(lane, entry); });
+      } else {
+        entry.onReady = function() { show(lane, entry); };
+      }
+    } else if (kind === "end") {
+      removeEntry(visible[lane]);
+      removeEntry(prewarmed[lane]);
+      delete visible[lane];
+      delete prewarmed[lane];
+    }
+  }
+
+  function stop() {
+    runId += 1;
+    Object.values(visible).concat(Object.values(prewarmed), loading).forEach(removeEntry);
+    visible = {};
+    prewarmed = {};
+    loading = [];
+  }
+
+  function play() {
+    stop();
+    const id = runId;
+    const base = performance.now() + START_DELAY_MS;
+    let index = 0;
+    function tick() {
+      if (id !== runId) {
+        return;
+      }
+      const now = performance.now();
+      const swaps = [];
+      while (index < TIMELINE.length && base + TIMELINE[index][0] <= now) {
+        dispatch(TIMELINE[index], swaps);
+        index += 1;
+      }
+      if (swaps.length > 0) {
+        requestAnimationFrame(function() {
+          swaps.forEach(function(swap) { swap(); });
+        });
+      }
+      if (index < TIMELINE.length) {
+        const wait = base + TIMELINE[index][0] - performance.now();
+        setTimeout(tick, Math.max(0, wait - 2));
+      } else if (LOOP) {
+        setTimeout(play, 0);
+      }
+    }
+    tick();
+  }
+
+  // Spaceで最初から再生、Escで停止
+  window.addEventListener("keydown", function(event) {
+    if (event.key === " ") {
+      event.preventDefault();
+      play();
+    } else if (event.key === "Escape") {
+      stop();
+    }
+  });
+  play();
+})();
+"""
+
+
+def _escape_inline_script(script: str) -> str:
+    """<script>内に埋め込んでもHTMLとして途中で閉じられないようにする"""
+    return script.replace("</script", "<\\/script").replace("<!--", "<\\!--")
+
+
+def _read_asset(images_dir, path):
+    """images/以下のアセットを読み込み（存在しなければNone）"""
+    words = [
+        word
+        for word in posixpath.normpath(path).split("/")
+        if word and word not in (".", "..")
+    ]
+    file_path = os.path.join(images_dir, *words)
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "rb") as f:
+        content = f.read()
+    content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    return {"type": content_type, "data": base64.b64encode(content).decode("ascii")}
+
+
+def build_show_html(
+    track_blocks,
+    get_code,
+    p5_version=DEFAULT_P5_VERSION,
+    images_dir="images",
+    delay_ms=0,
+    prewarm_lead_ms=1000,
+    loop=False,
+    title="p5er show",
+):
+    """
+    トラックを単体で再生できる1つのHTMLを生成
+
+    Args:
+        track_blocks: レーンごとのトラックブロック（block_id, duration）
+        get_code: block_idからコードを取得する関数（見つからなければNone）
+        p5_version: 埋め込むp5.jsのバージョン
+        images_dir: アセットを読み込むディレクトリ
+        delay_ms: 読み込みから再生開始までの時間
+        prewarm_lead_ms: ブロック開始の何ms前に次のスケッチを読み込んでおくか
+        loop: 最後まで再生したら最初から繰り返すかどうか
+
+    Returns:
+        (HTML, 統計) のタプル
+    """
+    sketches = {}
+    assets = {}
+    missing_blocks = []
+    missing_assets = []
+    lanes = []
+    for lane in track_blocks:
+        resolved_blocks = []
+        for track_block in lane:
+            code = get_code(track_block.get("block_id"))
+            if code is None:
+                missing_blocks.append(track_block.get("block_id"))
+                continue
+            key = hashlib.sha256(code.encode("utf-8")).hexdigest()[:16]
+            if key not in sketches:
+                asset_paths = extract_asset_refs(code)
+                for path in asset_paths:
+                    if path in assets or path in missing_assets:
+                        continue
+                    asset = _read_asset(images_dir, path)
+                    if asset is None:
+                        missing_assets.append(path)
+                    else:
+                        assets[path] = asset
+                # 書き出し時にエスケープ済みのsrcdocを作っておく（実行時はp5.jsのURLのみ置換）
+                prelude = create_asset_resolver_js(
+                    0, "", asset_paths, key, base_url="images/"
+                )
+                sketches[key] = create_sketch_srcdoc(
+                    escape_template_literal(code),
+                    P5_URL_PLACEHOLDER,
+                    PREWARM_PAUSE_JS,
+                    prelude,
+                )
+            resolved_blocks.append(
+                {"sketch_key": key, "duration": track_block.get("duration", 1000)}
+            )
+        lanes.append(resolved_blocks)
+
+    timeline = sorted(
+        (
+            [
+                offset_ns / 1_000_000,
+                event["kind"],
+                event["lane_index"],
+                event["block"]["sketch_key"] if "block" in event else None,
+            ]
+            for offset_ns, event in build_timeline(lanes, None, prewarm_lead_ms)
+        ),
+        key=lambda event: event[0],
+    )
+
+    # p5.jsは埋め込む（ローカルになければ一度だけ取得し、それも失敗したらCDNを参照）
+    runtime = read_p5_runtime(p5_version)
+    if runtime is None and ensure_p5_runtime(p5_version):
+        runtime = read_p5_runtime(p5_version)
+    p5_source = runtime[0].decode("utf-8") if runtime is not None else None
+
+    sketch_entries = ",\n".join(
+        f"  {json.dumps(key)}: `{srcdoc}`" for key, srcdoc in sketches.items()
+    )
+    data_script = (
+        f"const P5_SOURCE = {json.dumps(p5_source)};\n"
+        f"const P5_FALLBACK_URL = {json.dumps(P5_CDN_URL.format(version=p5_version))};\n"
+        f"const P5_URL_PLACEHOLDER = {json.dumps(P5_URL_PLACEHOLDER)};\n"
+        f"const ASSETS = {json.dumps(assets)};\n"
+        f"const SKETCHES = {{\n{sketch_entries}\n}};\n"
+        f"const TIMELINE = {json.dumps(timeline)};\n"
+        f"const START_DELAY_MS = {json.dumps(delay_ms)};\n"
+        f"const LOOP = {json.dumps(bool(loop))};\n"
+    )
+    html = f"""<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8" />
+  <title>{title}</title>
+  <style>
+    html, body {{
+      margin: 0;
+      padding: 0;
+      width: 100%;
+      height: 100%;
+      overflow: hidden;
+      background: transparent;
+    }}
+  </style>
+</head>
+<body>
+  <script>
+{_escape_inline_script(data_script)}
+  </script>
+  <script>
+{_escape_inline_script(SHOW_PLAYER_JS)}
+  </script>
+</body>
+</html>
+"""
+    stats = {
+        "lanes": len(lanes),
+        "sketches": len(sketches),
+        "assets": len(assets),
+        "timeline_events": len(timeline),
+        "p5_embedded": p5_source is not None,
+        "missing_blocks": missing_blocks,
+        "missing_assets": missing_assets,
+        "bytes": len(html.encode("utf-8")),
+    }
+    return html, stats
+
+
+def export_show(output_path, track_data, get_code, images_dir="images", loop=False):
+    """
+    トラックデータから単体で再生できるHTMLを書き出す
+
+    Args:
+        output_path: 書き出すHTMLのパス
+        track_data: track_data.jsonと同じ形式のデータ
+        get_code: block_idからコードを取得する関数（見つからなければNone）
+
+    Returns:
+        書き出した内容の統計
+    """
+    html, stats = build_show_html(
+        track_data.get("track_blocks", []),
+        get_code,
+        p5_version=track_data.get("p5_version", DEFAULT_P5_VERSION),
+        images_dir=images_dir,
+        delay_ms=track_data.get("delay", 0),
+        prewarm_lead_ms=track_data.get("prewarm_lead_ms", 1000),
+        loop=loop,
+    )
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    return dict(stats, path=output_path)
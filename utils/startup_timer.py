@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 起動からレンダーウィンドウの最初の描画までの目標（ms）
+TIME_TO_FIRST_RENDER_TARGET_MS = 1500
+
+
+class StartupTimer:
+    """
+    起動の段階ごとの所要時間の記録
+
+    段階は別スレッド（データの読み込みなど）で並行して進むことがあるので、
+    開始時刻と所要時間をそれぞれ記録する。mark()は一度だけ起きる出来事
+    （最初の描画など）の時刻を記録する。時刻はすべて起動からの経過時間（ms）。
+    """
+
+    def __init__(self, started_at=None, target_ms=TIME_TO_FIRST_RENDER_TARGET_MS):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.target_ms = target_ms
+        self._phases = []
+        self._marks = {}
+        # ウィンドウ名 → 操作できるようになるまでの時間とUIのアセットの読み込み元
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self, at):
+        return (at - self.started_at) * 1000
+
+    def add_phase(self, name, started_at, ended_at):
+        """perf_counterの開始・終了時刻を指定して段階を記録"""
+        with self._lock:
+            self._phases.append(
+                {
+                    "name": name,
+                    "start_ms": self._elapsed_ms(started_at),
+                    "ms": (ended_at - started_at) * 1000,
+                    "thread": threading.current_thread().name,
+                }
+            )
+
+    @contextmanager
+    def phase(self, name):
+        """withで囲んだ処理を段階として記録"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, started_at, time.perf_counter())
+
+    def mark(self, name):
+        """出来事の時刻を記録（2回目以降は無視）"""
+        with self._lock:
+            if name not in self._marks:
+                self._marks[name] = self._elapsed_ms(time.perf_counter())
+
+    def record_window_ready(self, window, interactive_ms, asset_source):
+        """
+        ウィンドウが操作できるようになったことを記録
+
+        Args:
+            window: ウィンドウ名（"editor" / "track"）
+            interactive_ms: ページの読み込み開始から操作できるようになるまでの時間
+            asset_source: UIのアセットの読み込み元（"local" / "cdn"）
+        """
+        self.mark(f"{window}_interactive")
+        with self._lock:
+            self._windows[window] = {
+                "interactive_ms": interactive_ms,
+                "asset_source": asset_source,
+            }
+
+    def get_report(self):
+        """段階ごとの所要時間と、最初の描画までの時間が目標以内だったかを取得"""
+        with self._lock:
+            phases = sorted(self._phases, key=lambda phase: phase["start_ms"])
+            marks = dict(self._marks)
+            windows = {name: dict(entry) for name, entry in self._windows.items()}
+        first_render_ms = marks.get("first_render")
+        return {
+            "phases": phases,
+            "marks": marks,
+            "windows": windows,
+            "time_to_first_render_ms": first_render_ms,
+            "target_ms": self.target_ms,
+            "met_target": (
+                first_render_ms <= self.target_ms
+                if first_render_ms is not None
+                else None
+            ),
+        }
+
+    def format_report(self) -> str:
+        """コンソールに表示する形式の集計"""
+        report = self.get_report()
+        lines = ["Startup timings:"]
+        for phase in report["phases"]:
+            lines.append(
+                f"  {phase['name']:<24} {phase['start_ms']:>8.1f}ms "
+                f"+{phase['ms']:>8.1f}ms  ({phase['thread']})"
+            )
+        for name, at in sorted(report["marks"].items(), key=lambda item: item[1]):
+            lines.append(f"  {name:<24} {at:>8.1f}ms")
+        for name, entry in report["windows"].items():
+            lines.append(
+                f"  {name} window interactive after {entry['interactive_ms']:.1f}ms "
+                f"of page load ({entry['asset_source']} assets)"
+            )
+        if report["time_to_first_render_ms"] is not None:
+            status = "OK" if report["met_target"] else "over target"
+            lines.append(
+                f"  time to first render: {report['time_to_first_render_ms']:.1f}ms "
+                f"(target {report['target_ms']}ms, {status})"
+            )
+        return "\n".join(lines)
+
+    def append_to(self, path):
+        """
+        集計をJSON Linesのファイルに追記（リリースごとの起動時間の比較用）
+
+        Args:
+            path: 追記するファイルのパス
+        """
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            line = dict(self.get_report(), time=time.time())
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line) + "\n")
+        except OSError as e:
+            print(f"Failed to write startup timings: {e}")
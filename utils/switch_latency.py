@@ -0,0 +1,232 @@
+import csv
+import io
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from .playback_engine import percentile
+
+# 共有の時計（ms）の基準。Python側はtime.monotonic_nsをこの基準で換算し、
+# JavaScript側は performance.timeOrigin + performance.now() を使う
+_ANCHOR_MONOTONIC_NS = time.monotonic_ns()
+_ANCHOR_WALL_MS = time.time_ns() / 1_000_000
+
+# 切り替えの各段階（記録される順番はスケッチや先読みの有無で前後する）
+SWITCH_STAGES = (
+    "deadline",  # 再生エンジン上の切り替え時刻
+    "dispatch",  # エンジンからTrackAPIに届いた
+    "eval_start",  # evaluate_jsを呼んだ
+    "eval_received",  # レンダーウィンドウでスクリプトが実行された
+    "scripts_ready",  # iframeでp5.jsの読み込みが終わった
+    "setup_start",  # アセットの読み込み（preload）が終わりsetup()を開始
+    "setup_end",  # setup()が終わった
+    "shown",  # iframeが表示された
+    "first_draw",  # 表示後の最初のdraw()が終わった
+)
+
+
+def monotonic_to_shared_ms(monotonic_ns):
+    """time.monotonic_nsの値を共有の時計（ms）に換算"""
+    return _ANCHOR_WALL_MS + (monotonic_ns - _ANCHOR_MONOTONIC_NS) / 1_000_000
+
+
+def shared_clock_ms():
+    """共有の時計の現在時刻（ms）"""
+    return monotonic_to_shared_ms(time.monotonic_ns())
+
+
+class SwitchLatencyTracker:
+    """
+    レーン切り替えごとに、デッドラインから最初の描画までの各段階の時刻を記録
+
+    段階は時刻順に並べ、各段階までにかかった時間をその段階の所要時間とする。
+    先読み済みのiframeではp5.jsの読み込みやsetup()が切り替え前に終わっているので、
+    デッドラインより前の段階は所要時間に含めない。
+    """
+
+    def __init__(self, max_switches=2000):
+        self.max_switches = max_switches
+        self._switches = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def begin(self, lane_index, block_id=None, name="", deadline_ms=None):
+        """
+        切り替えを開始し、IDを返す
+
+        Args:
+            lane_index: 切り替えるレーン
+            block_id: 切り替え先のブロックのID
+            name: 切り替え先のブロック名
+            deadline_ms: 共有の時計での切り替え時刻（省略時は現在時刻）
+        """
+        now_ms = shared_clock_ms()
+        with self._lock:
+            switch_id = f"sw{next(self._ids)}"
+            self._switches[switch_id] = {
+                "switch_id": switch_id,
+                "lane_index": lane_index,
+                "block_id": block_id,
+                "name": name,
+                "prewarmed": False,
+                # "iframe" または "instance"（インスタンスモード）
+                "mode": None,
+                "stages": {
+                    "deadline": deadline_ms if deadline_ms is not None else now_ms,
+                    "dispatch": now_ms,
+                },
+            }
+            while len(self._switches) > self.max_switches:
+                self._switches.popitem(last=False)
+        return switch_id
+
+    def mark(self, switch_id, stage, t_ms=None):
+        """切り替えの段階の時刻を記録（省略時は現在時刻）"""
+        with self._lock:
+            switch = self._switches.get(switch_id)
+            if switch is not None:
+                switch["stages"][stage] = (
+                    t_ms if t_ms is not None else shared_clock_ms()
+                )
+
+    def record(self, timings):
+        """
+        レンダーウィンドウで記録された段階の時刻を追加
+
+        Args:
+            timings: {switchId, prewarmed, mode, stages: {段階: 時刻(ms)}} のリスト
+        """
+        with self._lock:
+            for timing in timings or []:
+                switch = self._switches.get(timing.get("switchId"))
+                if switch is None:
+                    continue
+                switch["prewarmed"] = bool(timing.get("prewarmed"))
+                if timing.get("mode"):
+                    switch["mode"] = timing.get("mode")
+                for stage, t_ms in (timing.get("stages") or {}).items():
+                    if stage in SWITCH_STAGES and t_ms is not None:
+                        switch["stages"][stage] = float(t_ms)
+
+    def get_stages(self, switch_id):
+        """切り替えの段階ごとの時刻（ms）を取得（記録がなければNone）"""
+        with self._lock:
+            switch = self._switches.get(switch_id)
+            return dict(switch["stages"]) if switch is not None else None
+
+    @staticmethod
+    def _breakdown(switch):
+        """段階を時刻順に並べ、各段階までの所要時間（ms）を計算"""
+        stages = switch["stages"]
+        deadline = stages["deadline"]
+        ordered = sorted(
+            (t_ms, SWITCH_STAGES.index(stage), stage)
+            for stage, t_ms in stages.items()
+            if t_ms >= deadline
+        )
+        durations = {}
+        previous = deadline
+        for t_ms, _, stage in ordered:
+            if stage != "deadline":
+                durations[stage] = t_ms - previous
+            previous = t_ms
+        durations["total"] = previous - deadline
+        if "setup_start" in stages and "setup_end" in stages:
+            durations["setup_duration"] = stages["setup_end"] - stages["setup_start"]
+        return durations
+
+    @staticmethod
+    def _summarize(values):
+        values.sort()
+        return {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values),
+            "p50_ms": percentile(values, 0.50),
+            "p95_ms": percentile(values, 0.95),
+            "max_ms": values[-1],
+        }
+
+    def get_report(self):
+        """ブロックごと・レンダーモードごとの各段階の所要時間の集計を取得"""
+        with self._lock:
+            switches = [
+                dict(switch, stages=dict(switch["stages"]))
+                for switch in self._switches.values()
+            ]
+
+        blocks = {}
+        mode_totals = {}
+        for switch in switches:
+            block = blocks.setdefault(
+                switch["block_id"],
+                {
+                    "block_id": switch["block_id"],
+                    "name": switch["name"],
+                    "count": 0,
+                    "prewarmed": 0,
+                    "modes": {},
+                    "durations": {},
+                },
+            )
+            block["count"] += 1
+            if switch["prewarmed"]:
+                block["prewarmed"] += 1
+            mode = switch["mode"] or "unknown"
+            block["modes"][mode] = block["modes"].get(mode, 0) + 1
+            durations = self._breakdown(switch)
+            for stage, duration in durations.items():
+                block["durations"].setdefault(stage, []).append(duration)
+            # iframeとインスタンスモードの切り替えにかかる時間を比較できるようにする
+            mode_totals.setdefault(mode, []).append(durations["total"])
+
+        for block in blocks.values():
+            block["stages"] = {}
+            for stage, values in block.pop("durations").items():
+                block["stages"][stage] = self._summarize(values)
+        result = sorted(
+            blocks.values(),
+            key=lambda block: block["stages"].get("total", {}).get("p95_ms", 0),
+            reverse=True,
+        )
+        return {
+            "switch_count": len(switches),
+            "modes": {
+                mode: self._summarize(totals) for mode, totals in mode_totals.items()
+            },
+            "blocks": result,
+        }
+
+    def to_csv(self):
+        """切り替えごとに各段階の所要時間を並べたCSVを生成"""
+        with self._lock:
+            switches = [
+                dict(switch, stages=dict(switch["stages"]))
+                for switch in self._switches.values()
+            ]
+
+        columns = [stage for stage in SWITCH_STAGES if stage != "deadline"]
+        columns += ["setup_duration", "total"]
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(
+            ["switch_id", "lane_index", "block_id", "name", "prewarmed", "mode"]
+            + columns
+        )
+        for switch in switches:
+            durations = self._breakdown(switch)
+            writer.writerow(
+                [
+                    switch["switch_id"],
+                    switch["lane_index"],
+                    switch["block_id"],
+                    switch["name"],
+                    int(switch["prewarmed"]),
+                    switch["mode"] or "",
+                ]
+                + [
+                    f"{durations[column]:.2f}" if column in durations else ""
+                    for column in columns
+                ]
+            )
+        return output.getvalue()
@@ -0,0 +1,321 @@
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+from .osc import DEFAULT_OSC_HOST, DEFAULT_OSC_PORT, build_osc_message
+from .playback_engine import percentile
+from .switch_latency import monotonic_to_shared_ms
+
+# 拍（引数は省略可能な小節内の拍の番号、1が小節の頭）とテンポ（引数はBPM）のOSCのアドレス
+TEMPO_OSC_ADDRESSES = ("/p5/beat", "/p5/tempo")
+# 追従するテンポの範囲（BPM）
+MIN_FOLLOW_BPM = 40
+MAX_FOLLOW_BPM = 300
+# 予測した拍の時刻から1拍の何割以上ずれた拍は外れ値として補正に使わない
+OUTLIER_RATIO = 0.25
+# 外れ値が続いたら位相と周期を測り直す
+RESYNC_AFTER_OUTLIERS = 3
+
+DEFAULT_TEMPO_SYNC_CONFIG = {
+    # 再生エンジンのスケジュールを外部のテンポに合わせるか
+    "enabled": False,
+    # 再生開始を何拍単位に揃えるか（4なら小節の頭、0なら揃えない）
+    "quantize_beats": 4,
+}
+
+
+def normalize_tempo_sync_config(config):
+    """
+    テンポ同期の設定を検証して既定値で補う
+
+    Returns:
+        全てのキーを持つ新しい辞書（不正な値があればValueErrorを送出）
+    """
+    unknown = set(config) - DEFAULT_TEMPO_SYNC_CONFIG.keys()
+    if unknown:
+        raise ValueError(f"Unknown tempo sync settings: {sorted(unknown)}")
+    normalized = dict(DEFAULT_TEMPO_SYNC_CONFIG, **config)
+    normalized["enabled"] = bool(normalized["enabled"])
+    quantize_beats = normalized["quantize_beats"]
+    if not isinstance(quantize_beats, int) or not 0 <= quantize_beats <= 64:
+        raise ValueError("quantize_beats must be between 0 and 64")
+    return normalized
+
+
+def _bpm_to_period_ns(bpm):
+    return 60_000_000_000 / bpm
+
+
+def _is_followable_period(period_ns):
+    return (
+        _bpm_to_period_ns(MAX_FOLLOW_BPM)
+        <= period_ns
+        <= _bpm_to_period_ns(MIN_FOLLOW_BPM)
+    )
+
+
+class TempoFollower:
+    """
+    OSCで届く拍（/p5/beat）とテンポ（/p5/tempo）に位相を合わせる拍の時計
+
+    拍の到着時刻は送信側やネットワークの揺れを含むので、予測した拍の時刻との差
+    （位相の誤差）を2次のPLLで平滑化し、位相と周期を少しずつ補正する。
+    beat_to_ns / ns_to_beat で拍の位置とtime.monotonic_nsの時刻を相互に変換でき、
+    再生エンジンはデッドラインを毎回この時計から求めるので、テンポが変わっても
+    スケジュールを作り直さずに追従する。
+    """
+
+    def __init__(
+        self, config=None, bpm=120, phase_gain=0.2, period_gain=0.02, max_history=2000
+    ):
+        self.config = normalize_tempo_sync_config(config or {})
+        self.phase_gain = phase_gain
+        self.period_gain = period_gain
+        # (基準の時刻ns, 基準の拍, 1拍のns) をまとめて置き換える（変換はロックなしで読む）
+        self._state = (None, 0.0, _bpm_to_period_ns(bpm))
+        # 小節の頭の拍（/p5/beat の拍の番号から求める）
+        self.bar_origin = 0
+        self.beat_count = 0
+        self.tempo_count = 0
+        self.outlier_count = 0
+        self.resync_count = 0
+        self.last_beat_ns = None
+        # 位相を拍に合わせたか（テンポだけの場合は最初の拍で合わせる）
+        self._beat_phase = False
+        # 次の拍の間隔で周期を測り直すか（テンポを受け取るまでと、測り直しの後）
+        self._measure_period = True
+        self._consecutive_outliers = 0
+        self._history = deque(maxlen=max_history)
+        # 時計が補正された時に呼ぶ関数（再生エンジンのデッドラインの再計算など）
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """
+        設定を変更（指定したキーだけを現在の設定に上書きする）
+
+        Returns:
+            変更後の設定
+        """
+        self.config = normalize_tempo_sync_config(dict(self.config, **config))
+        return self.config
+
+    def add_listener(self, listener):
+        """時計が補正された時に呼ぶ関数を登録"""
+        self._listeners.append(listener)
+
+    @property
+    def has_phase(self):
+        """拍かテンポを受け取って時計が動いているか"""
+        return self._state[0] is not None
+
+    @property
+    def bpm(self):
+        return 60_000_000_000 / self._state[2]
+
+    def is_locked(self, now_ns=None):
+        """直近の拍に追従できているか（4拍分の間、拍が届かなければ外れたとみなす）"""
+        if not self._beat_phase or self._measure_period:
+            return False
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        return now_ns - self.last_beat_ns < 4 * self._state[2]
+
+    def beat_to_ns(self, beat):
+        """拍の位置をtime.monotonic_nsの時刻に変換"""
+        anchor_ns, anchor_beat, period_ns = self._state
+        if anchor_ns is None:
+            raise RuntimeError("Tempo follower has not received a beat or tempo")
+        return anchor_ns + (beat - anchor_beat) * period_ns
+
+    def ns_to_beat(self, t_ns):
+        """time.monotonic_nsの時刻を拍の位置に変換"""
+        anchor_ns, anchor_beat, period_ns = self._state
+        if anchor_ns is None:
+            raise RuntimeError("Tempo follower has not received a beat or tempo")
+        return anchor_beat + (t_ns - anchor_ns) / period_ns
+
+    def on_beat(self, received_ns, position=None):
+        """
+        拍を受け取って位相と周期を補正
+
+        Args:
+            received_ns: 拍を受信したtime.monotonic_nsの時刻
+            position: 小節内の拍の番号（1が小節の頭、不明ならNone）
+        """
+        with self._lock:
+            anchor_ns, anchor_beat, period_ns = self._state
+            self.beat_count += 1
+            self.last_beat_ns = received_ns
+            error_ns = 0.0
+            outlier = False
+            if not self._beat_phase:
+                # 最初の拍で位相を合わせる（周期は次の拍かテンポで決まる）
+                beat = 0
+                if anchor_ns is not None:
+                    beat = round(anchor_beat + (received_ns - anchor_ns) / period_ns)
+                self._state = (received_ns, float(beat), period_ns)
+                self._beat_phase = True
+            elif self._measure_period:
+                # 拍の間隔から周期を測る（テンポが大きく違っても1拍で追従する）
+                interval_ns = received_ns - anchor_ns
+                beat = int(anchor_beat) + 1
+                if _is_followable_period(interval_ns):
+                    period_ns = interval_ns
+                    self._measure_period = False
+                self._state = (received_ns, float(beat), period_ns)
+            else:
+                beat = round(anchor_beat + (received_ns - anchor_ns) / period_ns)
+                predicted_ns = anchor_ns + (beat - anchor_beat) * period_ns
+                error_ns = received_ns - predicted_ns
+                if abs(error_ns) > period_ns * OUTLIER_RATIO:
+                    outlier = True
+                    self.outlier_count += 1
+                    self._consecutive_outliers += 1
+                    if self._consecutive_outliers >= RESYNC_AFTER_OUTLIERS:
+                        # テンポが変わったか拍を取り違えているので測り直す
+                        self.resync_count += 1
+                        self._consecutive_outliers = 0
+                        self._measure_period = True
+                        self._state = (received_ns, float(beat), period_ns)
+                else:
+                    self._consecutive_outliers = 0
+                    corrected_ns = period_ns + self.period_gain * error_ns
+                    if _is_followable_period(corrected_ns):
+                        period_ns = corrected_ns
+                    self._state = (
+                        predicted_ns + self.phase_gain * error_ns,
+                        float(beat),
+                        period_ns,
+                    )
+            if position is not None:
+                self.bar_origin = beat - (position - 1)
+            self._history.append(
+                {
+                    "t_ms": monotonic_to_shared_ms(received_ns),
+                    "beat": beat,
+                    "error_ms": error_ns / 1_000_000,
+                    "bpm": 60_000_000_000 / self._state[2],
+                    "outlier": outlier,
+                }
+            )
+        self._notify()
+
+    def on_tempo(self, bpm, received_ns):
+        """
+        テンポ（BPM）を受け取って周期を変更（現在の拍の位置は保つ）
+
+        Args:
+            bpm: テンポ
+            received_ns: 受信したtime.monotonic_nsの時刻
+        """
+        if not MIN_FOLLOW_BPM <= bpm <= MAX_FOLLOW_BPM:
+            print(
+                f"Ignoring tempo outside {MIN_FOLLOW_BPM}-{MAX_FOLLOW_BPM} BPM: {bpm}"
+            )
+            return
+        with self._lock:
+            self.tempo_count += 1
+            beat = self.ns_to_beat(received_ns) if self.has_phase else 0.0
+            self._state = (received_ns, beat, _bpm_to_period_ns(bpm))
+            self._measure_period = False
+        self._notify()
+
+    def _notify(self):
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Error notifying tempo change: {e}")
+
+    def handle_osc(self, address, args, received_ns):
+        """
+        OSCのメッセージを拍・テンポとして受け付ける（OscListenerのhandler）
+
+        Returns:
+            拍・テンポのアドレスだったか
+        """
+        if address == "/p5/beat":
+            position = None
+            if args and isinstance(args[0], int) and not isinstance(args[0], bool):
+                position = args[0] if args[0] >= 1 else None
+            self.on_beat(received_ns, position)
+            return True
+        if address == "/p5/tempo":
+            if args and isinstance(args[0], (int, float)):
+                self.on_tempo(float(args[0]), received_ns)
+            return True
+        return False
+
+    def get_report(self, history_limit=200):
+        """推定したテンポと、拍ごとの位相の誤差の推移を取得"""
+        with self._lock:
+            history = list(self._history)
+            report = {
+                "enabled": self.config["enabled"],
+                "has_phase": self.has_phase,
+                "locked": self.is_locked(),
+                "bpm": self.bpm,
+                "beats": self.beat_count,
+                "tempo_messages": self.tempo_count,
+                "outliers": self.outlier_count,
+                "resyncs": self.resync_count,
+            }
+        errors = sorted(
+            abs(entry["error_ms"])
+            for entry in history
+            if not entry["outlier"] and entry["error_ms"]
+        )
+        report["phase_error_ms"] = {
+            "count": len(errors),
+            "p50": percentile(errors, 0.50),
+            "p95": percentile(errors, 0.95),
+            "max": errors[-1] if errors else None,
+        }
+        report["history"] = history[-history_limit:]
+        return report
+
+
+def send_loopback_beats(
+    bpm,
+    count,
+    port=DEFAULT_OSC_PORT,
+    host=DEFAULT_OSC_HOST,
+    beats_per_bar=4,
+    jitter_ms=0.0,
+    send_tempo=False,
+    stop_event=None,
+):
+    """
+    一定のテンポで /p5/beat を送信（TempoFollowerの動作確認用）
+
+    送信時刻は開始時刻からの絶対時刻で決めるので、揺れ（jitter_ms）を加えても
+    テンポはずれない
+
+    Args:
+        bpm: 送信するテンポ
+        count: 送信する拍の数
+        port: 送信先のポート
+        host: 送信先のアドレス
+        beats_per_bar: 1小節の拍の数（拍の番号として送る）
+        jitter_ms: 各拍の送信時刻に加える揺れの最大値（ms、一様分布）
+        send_tempo: 小節の頭で /p5/tempo も送るか
+        stop_event: 設定されたら途中で止めるthreading.Event
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+    period_ns = _bpm_to_period_ns(bpm)
+    started_ns = time.monotonic_ns()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for index in range(count):
+            jitter_ns = random.uniform(-jitter_ms, jitter_ms) * 1_000_000
+            send_at_ns = started_ns + index * period_ns + jitter_ns
+            wait_s = (send_at_ns - time.monotonic_ns()) / 1_000_000_000
+            if stop_event.wait(max(0, wait_s)):
+                return
+            position = index % beats_per_bar + 1
+            if send_tempo and position == 1:
+                sock.sendto(build_osc_message("/p5/tempo", float(bpm)), (host, port))
+            sock.sendto(build_osc_message("/p5/beat", position), (host, port))
@@ -0,0 +1,309 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from .osc import DEFAULT_OSC_PORT
+from .playback_engine import percentile
+from .switch_latency import monotonic_to_shared_ms
+
+# トリガーで行う操作（"toggle"は再生中なら停止、停止中なら開始）
+TRIGGER_ACTIONS = ("toggle", "start", "stop")
+# OSCのアドレス → 操作
+TRIGGER_OSC_ADDRESSES = {
+    "/p5/play": "toggle",
+    "/p5/start": "start",
+    "/p5/stop": "stop",
+}
+# トリガーからの時間を集計する切り替えの段階（SWITCH_STAGESの一部）
+TRIGGER_LATENCY_STAGES = ("dispatch", "shown", "first_draw")
+
+DEFAULT_TRIGGER_CONFIG = {
+    # 直前に受け付けたトリガーから何ms以内のトリガーを無視するか（入力元をまたいで共通）
+    "debounce_ms": 250,
+    # クリック再生に使うマウスボタン（pynputのボタン名）
+    "buttons": ["left"],
+    # クリックを受け付ける画面の範囲 [x, y, 幅, 高さ]（Noneなら画面全体）
+    "region": None,
+    # 再生・停止を切り替えるキー（pynputのキー名か文字、例: "f9"。空なら使わない）
+    "hotkey": "",
+    # OSCのトリガーをローカルのUDPポートで受け付けるか
+    "osc_enabled": False,
+    "osc_port": DEFAULT_OSC_PORT,
+}
+
+
+def normalize_trigger_config(config):
+    """
+    トリガーの設定を検証して既定値で補う
+
+    Args:
+        config: DEFAULT_TRIGGER_CONFIGのキーを持つ辞書（一部のみでもよい）
+
+    Returns:
+        全てのキーを持つ新しい辞書（不正な値があればValueErrorを送出）
+    """
+    unknown = set(config) - DEFAULT_TRIGGER_CONFIG.keys()
+    if unknown:
+        raise ValueError(f"Unknown trigger settings: {sorted(unknown)}")
+    normalized = dict(DEFAULT_TRIGGER_CONFIG, **config)
+
+    debounce_ms = normalized["debounce_ms"]
+    if not isinstance(debounce_ms, (int, float)) or not 0 <= debounce_ms <= 10000:
+        raise ValueError("debounce_ms must be between 0 and 10000")
+
+    buttons = normalized["buttons"]
+    if not isinstance(buttons, list) or not all(isinstance(b, str) for b in buttons):
+        raise ValueError("buttons must be a list of button names")
+    normalized["buttons"] = list(buttons)
+
+    region = normalized["region"]
+    if region is not None:
+        if (
+            not isinstance(region, list)
+            or len(region) != 4
+            or not all(isinstance(v, (int, float)) for v in region)
+            or region[2] <= 0
+            or region[3] <= 0
+        ):
+            raise ValueError("region must be [x, y, width, height] or null")
+        normalized["region"] = list(region)
+
+    if not isinstance(normalized["hotkey"], str):
+        raise ValueError("hotkey must be a key name")
+    normalized["hotkey"] = normalized["hotkey"].strip().lower()
+
+    normalized["osc_enabled"] = bool(normalized["osc_enabled"])
+    osc_port = normalized["osc_port"]
+    if not isinstance(osc_port, int) or not 1024 <= osc_port <= 65535:
+        raise ValueError("osc_port must be between 1024 and 65535")
+    return normalized
+
+
+class TriggerHub:
+    """
+    クリック・ホットキー・OSCのトリガーを再生エンジンに渡す
+
+    入力のスレッド（pynputやOSCの受信）はoffer()で受けた時刻とともにトリガーを
+    SimpleQueueに積むだけで、ロックも待ちもしない。1つのスレッドがキューから
+    取り出し、ボタン・画面の範囲で絞り込んでデバウンスしてからhandlerを呼ぶ。
+    再生はトリガーを受けた時刻を基準に始めるので、キューやhandlerの処理時間は
+    最初の切り替えの遅れとして現れる（record_switchで切り替えと対応付けて集計する）。
+    """
+
+    def __init__(self, config=None, switch_latency=None, max_records=500):
+        self.config = normalize_trigger_config(config or {})
+        self.switch_latency = switch_latency
+        # handler(トリガー) → 実際に行った操作（"start" / "stop" / None）
+        self.handler = None
+        self.max_records = max_records
+        self.counts = {"offered": 0, "filtered": 0, "debounced": 0, "accepted": 0}
+        self._queue = queue.SimpleQueue()
+        self._ids = itertools.count(1)
+        self._records = OrderedDict()
+        self._last_accepted_ns = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, config):
+        """
+        設定を変更（指定したキーだけを現在の設定に上書きする）
+
+        Returns:
+            変更後の設定
+        """
+        # 入力のスレッドは self.config を読むだけなので、辞書ごと置き換える
+        self.config = normalize_trigger_config(dict(self.config, **config))
+        return self.config
+
+    def matches_hotkey(self, key_name):
+        """キーが再生・停止のホットキーか（入力のスレッドから呼ばれる）"""
+        hotkey = self.config["hotkey"]
+        return bool(hotkey) and str(key_name).lower() == hotkey
+
+    def offer(self, source, action="toggle", t_ns=None, **detail):
+        """
+        トリガーをキューに積む（入力のスレッドから呼ばれ、すぐに戻る）
+
+        Args:
+            source: 入力元（"click" / "hotkey" / "osc"）
+            action: TRIGGER_ACTIONSの操作
+            t_ns: トリガーを受けたtime.monotonic_nsの時刻（省略時は現在時刻）
+            **detail: クリックの座標・ボタンやOSCのアドレスなど
+        """
+        if t_ns is None:
+            t_ns = time.monotonic_ns()
+        self._queue.put((source, action, t_ns, detail))
+
+    def handle_osc(self, address, args, received_ns):
+        """
+        OSCのメッセージをトリガーとして受け付ける（OscListenerのhandler）
+
+        引数の先頭が0やFalseのメッセージ（コントローラーのボタンを離した時など）は無視する
+
+        Returns:
+            トリガーのアドレスだったか
+        """
+        action = TRIGGER_OSC_ADDRESSES.get(address)
+        if action is None:
+            return False
+        if not self.config["osc_enabled"]:
+            # テンポ同期のためにOSCのリスナーだけ動いている
+            return True
+        if args and isinstance(args[0], (int, float)) and not args[0]:
+            return True
+        self.offer("osc", action, received_ns, address=address)
+        return True
+
+    def start(self, handler):
+        """キューからトリガーを取り出すスレッドを開始"""
+        self.handler = handler
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="TriggerHub", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._process(*item)
+            except Exception as e:
+                print(f"Error handling trigger: {e}")
+
+    def _filter(self, source, detail, config):
+        """トリガーを無視する理由（受け付ける場合はNone）"""
+        if source != "click":
+            return None
+        if detail.get("button") not in config["buttons"]:
+            return "button"
+        region = config["region"]
+        if region is not None:
+            x, y = detail.get("x"), detail.get("y")
+            left, top, width, height = region
+            if not (left <= x < left + width and top <= y < top + height):
+                return "region"
+        return None
+
+    def _process(self, source, action, t_ns, detail):
+        config = self.config
+        with self._lock:
+            self.counts["offered"] += 1
+            if self._filter(source, detail, config) is not None:
+                self.counts["filtered"] += 1
+                return
+            debounce_ns = int(config["debounce_ms"] * 1_000_000)
+            if (
+                self._last_accepted_ns is not None
+                and t_ns - self._last_accepted_ns < debounce_ns
+            ):
+                self.counts["debounced"] += 1
+                return
+            self._last_accepted_ns = t_ns
+            self.counts["accepted"] += 1
+
+            trigger_id = f"tr{next(self._ids)}"
+            handled_ns = time.monotonic_ns()
+            # handlerの中で再生エンジンが切り替えを発火することがあるので先に登録する
+            record = {
+                "trigger_id": trigger_id,
+                "source": source,
+                "action": action,
+                "performed": None,
+                "t_ns": t_ns,
+                "queue_ms": (handled_ns - t_ns) / 1_000_000,
+                "handler_ms": None,
+                "switch_id": None,
+                "delay_ms": None,
+            }
+            self._records[trigger_id] = record
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+
+        trigger = dict(detail, trigger_id=trigger_id, source=source, action=action)
+        trigger["t_ns"] = t_ns
+        performed = None
+        if self.handler is not None:
+            try:
+                performed = self.handler(trigger)
+            except Exception as e:
+                print(f"Error handling {source} trigger: {e}")
+        with self._lock:
+            record["performed"] = performed
+            record["handler_ms"] = (time.monotonic_ns() - handled_ns) / 1_000_000
+
+    def record_switch(self, trigger_id, switch_id, delay_ms=0):
+        """
+        トリガーで開始した再生の最初の切り替えを記録
+
+        Args:
+            trigger_id: handlerに渡したトリガーのID
+            switch_id: SwitchLatencyTracker.beginで取得したID
+            delay_ms: 再生開始から最初の切り替えまでの設定上のディレイ
+        """
+        with self._lock:
+            record = self._records.get(trigger_id)
+            if record is not None:
+                record["switch_id"] = switch_id
+                record["delay_ms"] = delay_ms
+
+    def _latencies(self, record):
+        """トリガーから切り替えの各段階までの時間（ms、設定上のディレイを除く）"""
+        if record["switch_id"] is None or self.switch_latency is None:
+            return {}
+        stages = self.switch_latency.get_stages(record["switch_id"])
+        if not stages:
+            return {}
+        trigger_ms = monotonic_to_shared_ms(record["t_ns"])
+        return {
+            stage: stages[stage] - trigger_ms - (record["delay_ms"] or 0)
+            for stage in TRIGGER_LATENCY_STAGES
+            if stage in stages
+        }
+
+    @staticmethod
+    def _summarize(values):
+        """値の件数とパーセンタイル（値がなければNone）"""
+        values = sorted(values)
+        if not values:
+            return None
+        return {
+            "count": len(values),
+            "p50_ms": percentile(values, 0.50),
+            "p95_ms": percentile(values, 0.95),
+            "max_ms": values[-1],
+        }
+
+    def get_report(self):
+        """トリガーの件数と、トリガーから切り替えまでの時間の集計を取得"""
+        with self._lock:
+            counts = dict(self.counts)
+            records = [dict(record) for record in self._records.values()]
+
+        triggers = []
+        for record in records:
+            record["latency_ms"] = self._latencies(record)
+            del record["t_ns"]
+            triggers.append(record)
+        return {
+            "counts": counts,
+            "queue_ms": self._summarize(r["queue_ms"] for r in triggers),
+            "latency_ms": {
+                stage: self._summarize(
+                    r["latency_ms"][stage] for r in triggers if stage in r["latency_ms"]
+                )
+                for stage in TRIGGER_LATENCY_STAGES
+            },
+            "triggers": triggers[-100:],
+        }
+
+    def close(self):
+        """スレッドを止める（キューに残ったトリガーを処理してから終了する）"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=1.0)
+            self._thread = None
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+
+# エディタ・トラックウィンドウのUIで使うライブラリ（view/assets.jsのCDNのURLと合わせる）
+MONACO_VERSION = "0.52.2"
+DAISYUI_VERSION = "4.7.2"
+TAILWIND_VERSION = "3.4.17"
+MONACO_TARBALL_URL = (
+    "https://registry.npmjs.org/monaco-editor/-/monaco-editor-{version}.tgz"
+)
+DAISYUI_CSS_URL = "https://cdn.jsdelivr.net/npm/daisyui@{version}/dist/full.min.css"
+
+# ビルドしたアセットの置き場所と、画像サーバーで配信するURLのパス
+UI_ASSETS_DIR = "vendor/ui"
+UI_ASSETS_ROUTE = "/ui/"
+VIEW_DIR = "view"
+VIEW_ROUTE = "/view/"
+UI_MANIFEST_FILE = "manifest.js"
+
+# Tailwindのクラスを探すファイル（CDNのJITと同じく、スクリプトで組み立てるHTMLも含める）
+TAILWIND_CONTENT = ["view/**/*.html", "view/**/*.js"]
+TAILWIND_INPUT_CSS = "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n"
+
+
+def get_ui_asset_cache_control(relative_path: str) -> str:
+    """
+    /ui/以下のファイルに付けるCache-Controlヘッダー
+
+    バージョンや内容のハッシュのディレクトリ以下のファイルは内容が変わらないので
+    長期キャッシュさせ、manifest.jsのような直下のファイルは毎回ETagで確認させる
+    """
+    if "/" in relative_path.strip("/"):
+        return "public, max-age=31536000, immutable"
+    return "no-cache"
+
+
+def _download(url, path):
+    """URLの内容をファイルに保存（途中で失敗しても壊れたファイルを残さない）"""
+    # ビルドの時だけ使うので、起動時にはsslなどを読み込まない
+    import urllib.request
+
+    print(f"Downloading {url}...")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(url, timeout=60) as response:
+        content = response.read()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _build_monaco(output_dir, version):
+    """npmのパッケージからMonacoのmin/vsを展開"""
+    relative_dir = f"monaco/{version}/vs"
+    target_dir = os.path.join(output_dir, relative_dir)
+    if os.path.exists(os.path.join(target_dir, "loader.js")):
+        return relative_dir
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tarball = os.path.join(tmp_dir, "monaco.tgz")
+        _download(MONACO_TARBALL_URL.format(version=version), tarball)
+        prefix = "package/min/vs/"
+        staging_dir = os.path.join(tmp_dir, "vs")
+        with tarfile.open(tarball, "r:gz") as archive:
+            for member in archive.getmembers():
+                name = member.name
+                if not member.isfile() or not name.startswith(prefix):
+                    continue
+                parts = name[len(prefix) :].split("/")
+                if ".." in parts:
+                    continue
+                path = os.path.join(staging_dir, *parts)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with archive.extractfile(member) as src, open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+        if os.path.exists(target_dir):
+            shutil.rmtree(target_dir)
+        os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+        shutil.move(staging_dir, target_dir)
+    return relative_dir
+
+
+def _build_daisyui(output_dir, version):
+    relative_path = f"daisyui/{version}/full.min.css"
+    path = os.path.join(output_dir, relative_path)
+    if not os.path.exists(path):
+        _download(DAISYUI_CSS_URL.format(version=version), path)
+    return relative_path
+
+
+def find_tailwind_command():
+    """
+    TailwindのCLIのコマンドを取得
+
+    スタンドアロン版（tailwindcss）があればそれを、なければnpxで取得して使う
+
+    Returns:
+        コマンドのリスト（見つからない場合は None）
+    """
+    standalone = shutil.which("tailwindcss")
+    if standalone:
+        return [standalone]
+    npx = shutil.which("npx")
+    if npx:
+        return [npx, "--yes", f"tailwindcss@{TAILWIND_VERSION}"]
+    return None
+
+
+def _build_tailwind(output_dir, tailwind_command):
+    """viewで使っているクラスだけのCSSを生成（内容のハッシュをファイル名にする）"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = os.path.join(tmp_dir, "tailwind.config.js")
+        input_path = os.path.join(tmp_dir, "input.css")
+        output_path = os.path.join(tmp_dir, "tailwind.css")
+        content = [os.path.abspath(pattern) for pattern in TAILWIND_CONTENT]
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write(f"module.exports = {{ content: {json.dumps(content)} }};\n")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(TAILWIND_INPUT_CSS)
+        subprocess.run(
+            tailwind_command
+            + ["-c", config_path, "-i", input_path, "-o", output_path, "--minify"],
+            check=True,
+        )
+        with open(output_path, "rb") as f:
+            css = f.read()
+
+    digest = hashlib.sha256(css).hexdigest()[:16]
+    relative_path = f"tailwind/{digest}/tailwind.min.css"
+    path = os.path.join(output_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(css)
+    return relative_path
+
+
+def build_ui_assets(output_dir=UI_ASSETS_DIR, tailwind_command=None):
+    """
+    エディタ・トラックウィンドウのUIのアセットをローカルに用意
+
+    Monacoとdaisyuiは取得済みならそのまま使い、TailwindのCSSは毎回生成し直す
+    （viewのクラスが変わるため）。最後にview/assets.jsが読むmanifest.jsを書き出す。
+
+    Args:
+        output_dir: 書き出すディレクトリ
+        tailwind_command: TailwindのCLIのコマンド（省略時は自動で探す）
+
+    Returns:
+        書き出したマニフェストの内容
+    """
+    if tailwind_command is None:
+        tailwind_command = find_tailwind_command()
+    if tailwind_command is None:
+        raise RuntimeError(
+            "Tailwind CLI not found (install the standalone tailwindcss or Node.js)"
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        "monaco": _build_monaco(output_dir, MONACO_VERSION),
+        "daisyui": _build_daisyui(output_dir, DAISYUI_VERSION),
+        "tailwind": _build_tailwind(output_dir, tailwind_command),
+        "built_at": time.time(),
+    }
+    manifest_path = os.path.join(output_dir, UI_MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"window.__p5UiManifest = {json.dumps(manifest, indent=2)};\n")
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def get_view_url(page: str, image_server_port: int = None) -> str:
+    """
+    ウィンドウで開くページのURL
+
+    Args:
+        page: view以下のパス（例: "editor/index.html"）
+        image_server_port: 画像サーバーのポート（起動していなければ None）
+
+    Returns:
+        画像サーバーが起動していればそこから配信するURL、なければファイルのパス
+    """
+    if image_server_port is None:
+        return f"{VIEW_DIR}/{page}"
+    return f"http://localhost:{image_server_port}{VIEW_ROUTE}{page}"
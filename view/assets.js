@@ -0,0 +1,60 @@
+// UIのライブラリ（Tailwind・daisyui・Monaco）を読み込む
+// build_ui_assets.pyでビルドしたアセット（manifest.js）があればローカルから、
+// なければCDNから読み込む。headの中で同期的に読み込むこと（document.writeでタグを追加する）
+(function () {
+  const script = document.currentScript;
+  // 画像サーバーからは /ui/、ファイルのパスで開いた場合はビルド先の vendor/ui/ を参照する
+  const base = new URL(
+    location.protocol === "file:" ? "../vendor/ui/" : "../ui/",
+    script.src
+  ).href;
+
+  // manifest.jsを読み込んでから続きを実行する
+  window.__p5LoadUiAssets = function () {
+    delete window.__p5LoadUiAssets;
+    loadUiAssets();
+  };
+  document.write(
+    '<script src="' + base + 'manifest.js"><\/script>' +
+      "<script>window.__p5LoadUiAssets();<\/script>"
+  );
+
+  function loadUiAssets() {
+    const manifest = window.__p5UiManifest;
+    const assets = { source: manifest ? "local" : "cdn" };
+    if (!manifest && location.protocol === "file:") {
+      console.info("Built UI assets not found in " + base + ", loading from CDN");
+    }
+
+    if (manifest) {
+      assets.monacoBase = base + manifest.monaco;
+      document.write(
+        '<link rel="stylesheet" href="' + base + manifest.daisyui + '" />' +
+          '<link rel="stylesheet" href="' + base + manifest.tailwind + '" />'
+      );
+    } else {
+      assets.monacoBase = "https://cdn.jsdelivr.net/npm/monaco-editor@0.52.2/min/vs";
+      document.write(
+        '<link rel="stylesheet" type="text/css" href="https://cdn.jsdelivr.net/npm/daisyui@4.7.2/dist/full.min.css" />' +
+          '<script src="https://cdn.tailwindcss.com"><\/script>' +
+          '<script>tailwind.config = { daisyui: { themes: ["night"] } };<\/script>'
+      );
+    }
+    if (script.dataset.monaco) {
+      document.write('<script src="' + assets.monacoBase + '/loader.js"><\/script>');
+    }
+    window.__p5UiAssets = assets;
+
+    // ウィンドウが操作できるようになった時刻（ページの読み込み開始からのms）を1回だけ報告
+    let reported = false;
+    window.__p5ReportInteractive = function () {
+      if (reported || !window.pywebview || !window.pywebview.api) {
+        return;
+      }
+      reported = true;
+      requestAnimationFrame(function () {
+        window.pywebview.api.report_ui_ready(performance.now(), assets.source);
+      });
+    };
+  }
+})();
@@ -643,7 +643,8 @@ function deleteBlock(index) {
 function initializeEditor() {
   require.config({
     paths: {
-      vs: "https://cdn.jsdelivr.net/npm/monaco-editor@0.52.2/min/vs",
+      // ローカルにビルドしたMonaco（なければCDN）
+      vs: window.__p5UiAssets.monacoBase,
     },
   });
   require(["vs/editor/editor.main"], function () {
@@ -777,7 +778,10 @@ function initializeEditor() {
             selectedCodeId = res.selected_code_id;
             editor.setValue(res.code);
             refreshBlockList();
+            window.__p5ReportInteractive();
           });
+        } else {
+          window.__p5ReportInteractive();
         }
       });
     });
@@ -0,0 +1,26 @@
+// Python側のEventBus（utils/event_bus.py）から届くイベントの受け取り
+// window.__p5Events.on(トピック, ハンドラー) でハンドラーを登録する
+(function () {
+  const handlers = {};
+
+  window.__p5Events = {
+    on: function (topic, handler) {
+      (handlers[topic] = handlers[topic] || []).push(handler);
+    },
+
+    // 1回の配信でまとめて届いたイベントを順に処理し、各イベントの配信の遅延（ms）を返す
+    dispatch: function (events) {
+      const receivedAt = performance.timeOrigin + performance.now();
+      return events.map(function (event) {
+        (handlers[event.topic] || []).forEach(function (handler) {
+          try {
+            handler(event.payload);
+          } catch (error) {
+            console.error("Error handling event " + event.topic + ":", error);
+          }
+        });
+        return receivedAt - event.sentAt;
+      });
+    },
+  };
+})();
@@ -5,13 +5,15 @@ let currentRenderWidth = 1000;
 let currentRenderHeight = 1000;
 let isPlaying = false;
 let currentPlayingIndexes = []; // 各レーンの現在再生中のブロックインデックス
-let playIntervals = []; // 各レーンの再生タイマー
 let draggedTrackIndex = null;
 let selectedTrackIndexes = []; // 各レーンの選択されたブロックインデックス
 let playingTrackIndexes = []; // 各レーンの現在再生中のブロックインデックス
 let clickToPlayEnabled = false;
 let lanes = []; // レーンの情報を格納
 let baseBlockWidthFor8Bars = null; // 8bars時の基準横幅（CSSの現在幅を採用）
+let trackVersion = 0; // 適用済みの変更のバージョン（Python側のChangeLogと対応）
+let isSyncingTrackChanges = false;
+let hasPendingTrackChanges = false; // 取得中に届いたパッチがある
 
 // 初期化
 document.addEventListener("DOMContentLoaded", function () {
@@ -29,24 +31,29 @@ window.addEventListener("pywebviewready", function () {
   console.log("Track window ready");
   loadTrackBlocks();
   loadClickToPlayState();
-
-  // 定期的にrender windowのサイズを確認（手動リサイズの検出）
-  setInterval(checkRenderWindowSize, 1000);
 });
 
-function clearAllPlayIntervals() {
-  playIntervals.forEach((intervalArray, laneIndex) => {
-    if (Array.isArray(intervalArray)) {
-      intervalArray.forEach((interval) => {
-        if (interval) {
-          clearTimeout(interval);
-        }
-      });
-    } else if (intervalArray) {
-      clearTimeout(intervalArray);
-    }
-  });
-}
+// Python側のEventBusから届くイベント（レンダーウィンドウのサイズはポーリングせずに受け取る）
+window.__p5Events.on("render_size", (size) => updateRenderSizeInputs(size));
+window.__p5Events.on("track_patch", (patch) => window.applyTrackPatch(patch));
+window.__p5Events.on("track_block_added", (event) =>
+  window.addTrackBlock(event.block, event.lane_index)
+);
+window.__p5Events.on("engine_block_started", (event) =>
+  window.onEngineBlockStarted(event.lane_index, event.block_index)
+);
+window.__p5Events.on("engine_lane_finished", (event) =>
+  window.onEngineLaneFinished(event.lane_index)
+);
+window.__p5Events.on("engine_finished", () => window.onEnginePlaybackFinished());
+window.__p5Events.on("play_current_track", () => window.playCurrentTrack());
+window.__p5Events.on("playback_stop", () => stopPlayback());
+// トリガー（クリック・ホットキー・OSC）で再生エンジンが直接開始・停止した場合は表示だけ更新する
+window.__p5Events.on("playback_started", () => setPlaybackState(true));
+window.__p5Events.on("playback_stopped", () => {
+  setPlaybackState(false);
+  renderTrackBlocks();
+});
 
 function initializeControls() {
   const playButton = document.getElementById("play-button");
@@ -109,7 +116,6 @@ function addLane() {
     selectedTrackIndexes[laneId] = null;
     currentPlayingIndexes[laneId] = 0;
     playingTrackIndexes[laneId] = null;
-    playIntervals[laneId] = null;
     saveTrackBlocks();
   } catch (error) {
     console.error("Error adding lane:", error);
@@ -188,6 +194,7 @@ function loadTrackBlocks() {
       .then((data) => {
         try {
           console.log("Received track data:", data);
+          trackVersion = data.version || 0;
           trackBlocks = data.track_blocks || [[]]; // デフォルトで1つのレーン
           currentBpm = data.bpm || 120;
           // delayの値が設定されている場合のみ更新（ユーザーが変更した値を保持）
@@ -202,7 +209,6 @@ function loadTrackBlocks() {
           selectedTrackIndexes = []; // 選択状態をリセット
           currentPlayingIndexes = []; // 再生状態をリセット
           playingTrackIndexes = []; // 再生中状態をリセット
-          playIntervals = []; // タイマーをリセット
           for (let i = 0; i < trackBlocks.length; i++) {
             lanes.push({
               id: i,
@@ -211,7 +217,6 @@ function loadTrackBlocks() {
             selectedTrackIndexes[i] = null; // 各レーンの選択状態を初期化
             currentPlayingIndexes[i] = 0; // 各レーンの再生状態を初期化
             playingTrackIndexes[i] = null; // 各レーンの再生中状態を初期化
-            playIntervals[i] = null; // 各レーンのタイマーを初期化
           }
 
           // 既存のレーン要素をすべて削除
@@ -248,6 +253,7 @@ function loadTrackBlocks() {
           }
 
           renderTrackBlocks();
+          window.__p5ReportInteractive();
         } catch (error) {
           console.error("Error processing track data:", error);
           // エラーが発生した場合はデフォルト値を使用
@@ -256,7 +262,6 @@ function loadTrackBlocks() {
           selectedTrackIndexes = [null]; // 選択状態を初期化
           currentPlayingIndexes = [0]; // 再生状態を初期化
           playingTrackIndexes = [null]; // 再生中状態を初期化
-          playIntervals = [null]; // タイマーを初期化
           renderTrackBlocks();
         }
       })
@@ -268,7 +273,6 @@ function loadTrackBlocks() {
         selectedTrackIndexes = [null]; // 選択状態を初期化
         currentPlayingIndexes = [0]; // 再生状態を初期化
         playingTrackIndexes = [null]; // 再生中状態を初期化
-        playIntervals = [null]; // タイマーを初期化
         renderTrackBlocks();
       });
   } else {
@@ -279,11 +283,97 @@ function loadTrackBlocks() {
     selectedTrackIndexes = [null]; // 選択状態を初期化
     currentPlayingIndexes = [0]; // 再生状態を初期化
     playingTrackIndexes = [null]; // 再生中状態を初期化
-    playIntervals = [null]; // タイマーを初期化
     renderTrackBlocks();
   }
 }
 
+/**
+ * Python側から送られた変更（パッチ）を適用する
+ * バージョンが連続していない場合は不足分を取得し、取得できなければ全体を読み込み直す
+ * @param {Object} patch - {version, op, block_id, fields}
+ */
+window.applyTrackPatch = function (patch) {
+  if (patch.version <= trackVersion) {
+    return; // 適用済み
+  }
+  if (isSyncingTrackChanges) {
+    hasPendingTrackChanges = true;
+    return;
+  }
+  if (patch.version !== trackVersion + 1) {
+    syncTrackChanges();
+    return;
+  }
+  applyTrackPatchInternal(patch);
+};
+
+function syncTrackChanges() {
+  if (isSyncingTrackChanges) {
+    return;
+  }
+  isSyncingTrackChanges = true;
+  window.pywebview.api
+    .get_track_changes(trackVersion)
+    .then((result) => {
+      isSyncingTrackChanges = false;
+      if (result.resync) {
+        loadTrackBlocks();
+        return;
+      }
+      result.patches.forEach((patch) => {
+        if (patch.version === trackVersion + 1) {
+          applyTrackPatchInternal(patch);
+        }
+      });
+      if (trackVersion !== result.version) {
+        loadTrackBlocks();
+      } else if (hasPendingTrackChanges) {
+        hasPendingTrackChanges = false;
+        syncTrackChanges();
+      }
+    })
+    .catch((error) => {
+      isSyncingTrackChanges = false;
+      hasPendingTrackChanges = false;
+      console.error("Error calling get_track_changes:", error);
+      loadTrackBlocks();
+    });
+}
+
+function applyTrackPatchInternal(patch) {
+  // 影響のあるレーンだけを描画し直す
+  const touchedLanes = [];
+  trackBlocks.forEach((laneBlocks, laneIndex) => {
+    if (patch.op === "update_block") {
+      let touched = false;
+      laneBlocks.forEach((block) => {
+        if (block.block_id === patch.block_id) {
+          Object.assign(block, patch.fields);
+          touched = true;
+        }
+      });
+      // コードだけの変更は表示に影響しない
+      if (touched && "name" in patch.fields) {
+        touchedLanes.push(laneIndex);
+      }
+    } else if (patch.op === "remove_block") {
+      const kept = laneBlocks.filter(
+        (block) => block.block_id !== patch.block_id
+      );
+      if (kept.length !== laneBlocks.length) {
+        trackBlocks[laneIndex] = kept;
+        if (lanes[laneIndex]) {
+          lanes[laneIndex].blocks = kept;
+        }
+        selectedTrackIndexes[laneIndex] = null;
+        touchedLanes.push(laneIndex);
+      }
+    }
+  });
+  trackVersion = patch.version;
+  touchedLanes.forEach((laneIndex) => renderLaneBlocks(laneIndex));
+}
+
 function saveTrackBlocks() {
   // Python側にトラックブロックを保存（参照データのみ）
   if (window.pywebview && window.pywebview.api) {
@@ -306,11 +396,31 @@ function renderTrackBlocks() {
     lanes.forEach((lane, laneIndex) => {
       renderLaneBlocks(laneIndex);
     });
+    reportSelectedTrackIndexes();
   } catch (error) {
     console.error("Error rendering track blocks:", error);
   }
 }
 
+// 選択中のブロックをPython側に伝える（トリガーで再生を開始する位置になる）
+let reportedSelection = null;
+function reportSelectedTrackIndexes() {
+  const selection = JSON.stringify(selectedTrackIndexes);
+  if (
+    selection === reportedSelection ||
+    !window.pywebview ||
+    !window.pywebview.api
+  ) {
+    return;
+  }
+  reportedSelection = selection;
+  window.pywebview.api
+    .update_selected_track_indexes(JSON.parse(selection))
+    .catch((error) => {
+      console.error("Error reporting selected blocks:", error);
+    });
+}
+
 function renderLaneBlocks(laneIndex) {
   try {
     const laneElement = document.getElementById(`track-lane-${laneIndex}`);
@@ -536,7 +646,6 @@ function addTrackBlockInternal(blockData, laneIndex = 0) {
   const trackBlock = {
     block_id: blockData.id,
     name: blockData.name,
-    code: blockData.code,
     duration: duration,
     bars: bars,
   };
@@ -578,10 +687,7 @@ function startPlayback() {
     return;
   }
 
-  // 既存のタイマーをすべてクリア
-  clearAllPlayIntervals();
-
-  isPlaying = true;
+  setPlaybackState(true);
 
   // エディタの単一iframeをクリア
   if (window.pywebview && window.pywebview.api) {
@@ -590,130 +696,54 @@ function startPlayback() {
     });
   }
 
-  // 各レーンの再生状態を初期化
-  currentPlayingIndexes = [];
-  playIntervals = [];
-
-  const playButton = document.getElementById("play-button");
-  const stopButton = document.getElementById("stop-button");
-
-  playButton.disabled = true;
-  stopButton.disabled = false;
-
-  // delayがある場合は、delay後に各レーンの再生を開始
-  if (currentDelay > 0) {
-    setTimeout(() => {
-      if (isPlaying) {
-        startAllLanes();
-      }
-    }, currentDelay);
-  } else {
-    startAllLanes();
-  }
-}
-
-function scheduleLanePlayback(laneIndex) {
-  const laneBlocks = trackBlocks[laneIndex];
-  if (!laneBlocks || laneBlocks.length === 0) {
-    return;
-  }
-
-  // 選択されたブロックがある場合はそこから開始、なければ最初から
-  let startIndex = 0;
-  if (
-    selectedTrackIndexes[laneIndex] !== null &&
-    selectedTrackIndexes[laneIndex] < laneBlocks.length
-  ) {
-    startIndex = selectedTrackIndexes[laneIndex];
-  }
-
-  // 各ブロックの開始時刻を計算
-  let currentTime = 0;
-  for (
-    let blockIndex = startIndex;
-    blockIndex < laneBlocks.length;
-    blockIndex++
-  ) {
-    const block = laneBlocks[blockIndex];
-
-    // このブロックの開始タイマーを設定
-    const timeoutId = setTimeout(() => {
-      if (isPlaying) {
-        // 現在再生中のブロックインデックスを更新
-        playingTrackIndexes[laneIndex] = blockIndex;
-
-        // このレーンのiframeのみを更新
-        if (window.pywebview && window.pywebview.api) {
-          updateSingleLane(laneIndex, block);
+  // 再生タイミング（delayを含む）はPython側の再生エンジンが管理する
+  // 選択されたブロックがあるレーンはそこから開始
+  if (window.pywebview && window.pywebview.api) {
+    const startIndexes = trackBlocks.map((laneBlocks, laneIndex) =>
+      selectedTrackIndexes[laneIndex] !== null &&
+      selectedTrackIndexes[laneIndex] !== undefined &&
+      selectedTrackIndexes[laneIndex] < laneBlocks.length
+        ? selectedTrackIndexes[laneIndex]
+        : 0
+    );
+    window.pywebview.api
+      .start_track_playback(startIndexes)
+      .then((result) => {
+        if (result.status !== "success") {
+          console.error("Failed to start playback:", result.message);
+          stopPlayback();
         }
-
-        // このレーンのみ再描画して再生状態を更新
-        renderLaneBlocks(laneIndex);
-      }
-    }, currentTime);
-
-    // タイマーIDを保存
-    if (!playIntervals[laneIndex]) {
-      playIntervals[laneIndex] = [];
-    }
-    playIntervals[laneIndex].push(timeoutId);
-
-    // 次のブロックの開始時刻を計算
-    currentTime += block.duration;
-  }
-
-  // レーン終了時のタイマーを設定
-  const endTimeoutId = setTimeout(() => {
-    if (isPlaying) {
-      // このレーンの再生が終了
-      playingTrackIndexes[laneIndex] = null;
-
-      // このレーンのiframeをクリア
-      if (window.pywebview && window.pywebview.api) {
-        window.pywebview.api.clear_specific_lane(laneIndex).catch((error) => {
-          console.error(`Error clearing lane ${laneIndex + 1}:`, error);
-        });
-      }
-
-      renderLaneBlocks(laneIndex);
-
-      // 全レーンの再生が終了したかチェック
-      checkAllLanesFinished();
-    }
-  }, currentTime);
-
-  // 終了タイマーも保存
-  if (!playIntervals[laneIndex]) {
-    playIntervals[laneIndex] = [];
+      })
+      .catch((error) => {
+        console.error("Error calling start_track_playback:", error);
+        stopPlayback();
+      });
   }
-  playIntervals[laneIndex].push(endTimeoutId);
-}
-
-function startAllLanes() {
-  trackBlocks.forEach((laneBlocks, laneIndex) => {
-    if (laneBlocks.length > 0) {
-      scheduleLanePlayback(laneIndex);
-    }
-  });
 }
 
-function stopPlayback() {
-  isPlaying = false;
+// 再生状態とボタンの表示を切り替え、各レーンの再生状態を初期化
+function setPlaybackState(playing) {
+  isPlaying = playing;
   currentPlayingIndexes = [];
   playingTrackIndexes = [];
 
   const playButton = document.getElementById("play-button");
   const stopButton = document.getElementById("stop-button");
 
-  playButton.disabled = false;
-  stopButton.disabled = true;
+  playButton.disabled = playing;
+  stopButton.disabled = !playing;
+}
 
-  // 各レーンのタイマーをクリア
-  clearAllPlayIntervals();
-  playIntervals = [];
+function stopPlayback() {
+  setPlaybackState(false);
 
-  // 全レーンのiframeをクリア
   if (window.pywebview && window.pywebview.api) {
+    // 再生エンジンを停止
+    window.pywebview.api.stop_track_playback().catch((error) => {
+      console.error("Error calling stop_track_playback:", error);
+    });
+
+    // 全レーンのiframeをクリア
     window.pywebview.api.clear_all_lanes().catch((error) => {
       console.error("Error calling clear_all_lanes:", error);
     });
@@ -723,32 +753,32 @@ function stopPlayback() {
   renderTrackBlocks();
 }
 
-function updateSingleLane(laneIndex, block) {
-  if (window.pywebview && window.pywebview.api) {
-    // このレーンのiframeのみを更新（他のレーンに影響しない）
-    window.pywebview.api
-      .update_single_lane(laneIndex, block.code)
-      .catch((error) => {
-        console.error(
-          `Lane ${laneIndex + 1}: Error calling update_single_lane:`,
-          error
-        );
-      });
+// 再生エンジンからの通知：レーンのブロックが切り替わった
+window.onEngineBlockStarted = function (laneIndex, blockIndex) {
+  if (!isPlaying) {
+    return;
   }
-}
+  playingTrackIndexes[laneIndex] = blockIndex;
+  // このレーンのみ再描画して再生状態を更新
+  renderLaneBlocks(laneIndex);
+};
 
-function checkAllLanesFinished() {
-  // 全レーンの再生が終了したかチェック
-  const allFinished = trackBlocks.every((laneBlocks, laneIndex) => {
-    const currentIndex = currentPlayingIndexes[laneIndex];
-    return !laneBlocks || currentIndex >= laneBlocks.length;
-  });
+// 再生エンジンからの通知：レーンの再生が終了した
+window.onEngineLaneFinished = function (laneIndex) {
+  if (!isPlaying) {
+    return;
+  }
+  playingTrackIndexes[laneIndex] = null;
+  renderLaneBlocks(laneIndex);
+};
 
-  if (allFinished) {
+// 再生エンジンからの通知：全レーンの再生が終了した
+window.onEnginePlaybackFinished = function () {
+  if (isPlaying) {
     console.log("All lanes finished playing");
     stopPlayback();
   }
-}
+};
 
 function updateBpm() {
   const bpm = parseInt(document.getElementById("bpm-input").value) || 120;
@@ -850,24 +880,13 @@ function applyRenderSize() {
   }
 }
 
-function checkRenderWindowSize() {
-  if (window.pywebview?.api) {
-    window.pywebview.api
-      .get_render_size()
-      .then((data) => {
-        if (
-          data.width !== currentRenderWidth ||
-          data.height !== currentRenderHeight
-        ) {
-          currentRenderWidth = data.width;
-          currentRenderHeight = data.height;
-          document.getElementById("render-width").value = data.width;
-          document.getElementById("render-height").value = data.height;
-        }
-      })
-      .catch((error) => {
-        console.error("Error checking render size:", error);
-      });
+// レンダーウィンドウが手動でリサイズされた時にサイズの入力欄を更新
+function updateRenderSizeInputs(size) {
+  if (size.width !== currentRenderWidth || size.height !== currentRenderHeight) {
+    currentRenderWidth = size.width;
+    currentRenderHeight = size.height;
+    document.getElementById("render-width").value = size.width;
+    document.getElementById("render-height").value = size.height;
   }
 }
 
@@ -954,7 +973,6 @@ window.addTrackBlock = function (blockData, laneIndex = 0) {
     const trackBlock = {
       id: blockData.id,
       name: blockData.name,
-      code: blockData.code,
       duration: duration,
       bars: bars,
     };